@@ -0,0 +1,313 @@
+"""
+Acompanhamento de negociações ao longo de várias reuniões.
+
+Cada conta/negociação guarda a lista de reuniões analisadas e um registro
+(ledger) de itens em aberto - acordos, tasks e entregáveis. A cada nova
+análise os itens extraídos são comparados localmente com o registro, sem
+nova chamada ao LLM, e os status são atualizados.
+"""
+import datetime
+import json
+import os
+import re
+import threading
+import unicodedata
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+DIRETORIO_NEGOCIACOES = os.getenv('NEGOCIACOES_DIR', os.path.join('dados', 'negociacoes'))
+
+# Campos do JSON de outputs que viram itens acompanhados
+TIPOS_ITENS = {
+    "acordos_combinados": "acordo",
+    "tasks": "task",
+    "entregaveis": "entregavel",
+}
+
+STATUS_ABERTOS = ("pendente", "em_andamento")
+STATUS_VALIDOS = ("pendente", "em_andamento", "concluido", "cancelado")
+
+# Similaridade mínima para considerar que dois itens são o mesmo compromisso
+LIMIAR_SIMILARIDADE = 0.45
+
+# Formas concluídas que, na evidência, indicam que o item foi cumprido
+_PISTAS_CONCLUSAO = re.compile(
+    r"\b(?:ja (?:enviei|mandei|enviamos|mandamos|entreguei|entregamos|fiz|fizemos|recebi|recebemos|assinamos)"
+    r"|(?:enviei|mandei|entreguei|finalizei|assinei|entregamos|enviamos|mandamos|finalizamos|assinamos)"
+    r"|(?:ja )?(?:foi|foram|esta|estao|ficou|ficaram) (?:ja )?"
+    r"(?:enviad|entregu|feit|concluid|assinad|aprovad|finalizad|pront)(?:[oa]s?|es?))\b"
+)
+
+# Negação, futuro, obrigação ou condição logo antes da pista ("será entregue",
+# "precisa estar pronto", "não foi enviado") ou prazo futuro logo depois
+# ("entregamos amanhã") indicam que o item ainda não foi cumprido
+_CONTEXTO_ANTES = re.compile(
+    r"\b(?:nao|nunca|vai|vao|vamos|vou|sera|serao|seria|precisa|precisam|precisamos|preciso|deve|devem|"
+    r"devemos|devo|tem que|temos que|tenho que|pode|podem|podemos|quando|assim que|se|caso|espero|esperamos)\b"
+)
+_CONTEXTO_DEPOIS = re.compile(r"^(?:\w+ ){0,2}(?:amanha|depois|proxima|proximo|ate)\b")
+
+_STOPWORDS = {
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "no", "na",
+    "nos", "nas", "um", "uma", "uns", "umas", "para", "pra", "por", "com", "que",
+    "se", "ao", "aos", "ate", "sobre", "sua", "seu", "suas", "seus", "the", "of",
+}
+
+_lock = threading.Lock()
+
+
+def normalizar_texto(texto: str) -> str:
+    """Remove acentos, pontuação e caixa para comparação de textos"""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r'[^\w\s]', ' ', texto.lower())
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+def _texto_item(tipo: str, item: Dict) -> str:
+    """Monta o texto usado para comparar um item com o registro"""
+    if tipo == "entregavel":
+        return f"{item.get('nome', '')} {item.get('descricao', '')}".strip()
+    if tipo == "task":
+        return f"{item.get('descricao', '')} {item.get('entrega_final', '')}".strip()
+    return (item.get('descricao') or '').strip()
+
+
+def _assinatura(texto: str) -> Set[str]:
+    """Conjunto de termos e trigramas de caracteres que representa o item"""
+    palavras = [p for p in normalizar_texto(texto).split() if p not in _STOPWORDS]
+    termos = set(palavras)
+    for palavra in palavras:
+        marcada = f"#{palavra}#"
+        termos.update(marcada[i:i + 3] for i in range(len(marcada) - 2))
+    return termos
+
+
+def similaridade(a: Set[str], b: Set[str]) -> float:
+    """Coeficiente de Dice entre duas assinaturas"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class RegistroItens:
+    """Índice invertido em memória sobre os itens de uma negociação"""
+
+    def __init__(self, itens: List[Dict]):
+        self.itens = {item["id"]: item for item in itens}
+        self._assinaturas: Dict[str, Set[str]] = {}
+        self._indice: Dict[str, Set[str]] = defaultdict(set)
+        for item in itens:
+            self.indexar(item)
+
+    def indexar(self, item: Dict):
+        assinatura = _assinatura(item["texto"])
+        self.itens[item["id"]] = item
+        self._assinaturas[item["id"]] = assinatura
+        for termo in assinatura:
+            self._indice[termo].add(item["id"])
+
+    def melhor_correspondencia(self, tipo: str, texto: str,
+                               ignorar: Set[str] = frozenset()) -> Tuple[Optional[Dict], float]:
+        """Retorna o item em aberto do mesmo tipo mais parecido com o texto"""
+        assinatura = _assinatura(texto)
+        candidatos: Dict[str, int] = defaultdict(int)
+        for termo in assinatura:
+            for item_id in self._indice.get(termo, ()):
+                candidatos[item_id] += 1
+
+        melhor, melhor_score = None, 0.0
+        for item_id, comuns in candidatos.items():
+            item = self.itens[item_id]
+            if item_id in ignorar or item["tipo"] != tipo or item["status"] not in STATUS_ABERTOS:
+                continue
+            # Limite superior do Dice: descarta candidatos sem chance antes do cálculo exato
+            if 2 * comuns / (len(assinatura) + len(self._assinaturas[item_id])) <= melhor_score:
+                continue
+            score = similaridade(assinatura, self._assinaturas[item_id])
+            if score > melhor_score:
+                melhor, melhor_score = item, score
+        return melhor, melhor_score
+
+
+def _slug(nome: str) -> str:
+    slug = re.sub(r'[^a-z0-9]+', '-', normalizar_texto(nome)).strip('-')
+    return slug or "sem-nome"
+
+
+def _caminho(negociacao_id: str) -> str:
+    return os.path.join(DIRETORIO_NEGOCIACOES, f"{negociacao_id}.json")
+
+
+def listar_negociacoes() -> List[Dict]:
+    """Lista as negociações salvas (id, nome e número de reuniões)"""
+    if not os.path.isdir(DIRETORIO_NEGOCIACOES):
+        return []
+    negociacoes = []
+    for arquivo in sorted(os.listdir(DIRETORIO_NEGOCIACOES)):
+        if not arquivo.endswith('.json'):
+            continue
+        negociacao = carregar_negociacao(arquivo[:-5])
+        if negociacao:
+            negociacoes.append({
+                "id": negociacao["id"],
+                "nome": negociacao["nome"],
+                "reunioes": len(negociacao["reunioes"]),
+            })
+    return negociacoes
+
+
+def carregar_negociacao(negociacao_id: str) -> Optional[Dict]:
+    """Carrega uma negociação do disco, ou None se não existir"""
+    try:
+        with open(_caminho(negociacao_id), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def salvar_negociacao(negociacao: Dict):
+    """Grava a negociação de forma atômica"""
+    os.makedirs(DIRETORIO_NEGOCIACOES, exist_ok=True)
+    caminho = _caminho(negociacao["id"])
+    temporario = f"{caminho}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(negociacao, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def obter_ou_criar_negociacao(nome: str) -> Dict:
+    """Retorna a negociação da conta informada, criando-a se necessário"""
+    negociacao_id = _slug(nome)
+    negociacao = carregar_negociacao(negociacao_id)
+    if negociacao is None:
+        negociacao = {
+            "id": negociacao_id,
+            "nome": nome.strip(),
+            "criada_em": datetime.datetime.now().isoformat(timespec='seconds'),
+            "reunioes": [],
+            "itens": [],
+        }
+    return negociacao
+
+
+def _indica_conclusao(evidencia: str) -> bool:
+    """A evidência relata o item como já cumprido (forma concluída, sem contexto futuro ou modal)"""
+    texto = normalizar_texto(evidencia)
+    for pista in _PISTAS_CONCLUSAO.finditer(texto):
+        antes = ' '.join(texto[:pista.start()].split()[-3:])
+        depois = texto[pista.end():].strip()
+        if not _CONTEXTO_ANTES.search(antes) and not _CONTEXTO_DEPOIS.match(depois):
+            return True
+    return False
+
+
+def _novo_status(item: Dict) -> str:
+    """Status sugerido pela nova reunião para um item já registrado"""
+    status = (item.get("status") or "").lower()
+    if status in ("concluido", "cancelado"):
+        return status
+    if _indica_conclusao(item.get("evidencia_transcricao") or ""):
+        return "concluido"
+    return "em_andamento"
+
+
+def registrar_reuniao(nome_negociacao: str, outputs_json: Dict,
+                      data: Optional[str] = None) -> Dict:
+    """
+    Vincula uma nova análise à negociação e reconcilia seus itens com o registro.
+
+    Retorna um resumo com os itens novos, os atualizados e os que seguem em aberto.
+    """
+    with _lock:
+        negociacao = obter_ou_criar_negociacao(nome_negociacao)
+        reuniao_id = uuid.uuid4().hex[:8]
+        data = data or datetime.datetime.now().isoformat(timespec='seconds')
+        registro = RegistroItens(negociacao["itens"])
+
+        novos, atualizados = [], []
+        reconciliados: Set[str] = set()
+
+        for campo, tipo in TIPOS_ITENS.items():
+            for item in outputs_json.get(campo, []) or []:
+                if not isinstance(item, dict):
+                    continue
+                texto = _texto_item(tipo, item)
+                if not normalizar_texto(texto):
+                    continue
+
+                existente, score = registro.melhor_correspondencia(tipo, texto, reconciliados)
+                if existente and score >= LIMIAR_SIMILARIDADE:
+                    status_anterior = existente["status"]
+                    existente["status"] = _novo_status(item)
+                    existente["dados"] = item
+                    existente["ultima_reuniao"] = reuniao_id
+                    existente["historico"].append({
+                        "reuniao": reuniao_id,
+                        "data": data,
+                        "de": status_anterior,
+                        "para": existente["status"],
+                        "similaridade": round(score, 3),
+                    })
+                    reconciliados.add(existente["id"])
+                    atualizados.append(existente)
+                else:
+                    status = (item.get("status") or "pendente").lower()
+                    novo = {
+                        "id": uuid.uuid4().hex[:8],
+                        "tipo": tipo,
+                        "texto": texto,
+                        "status": status if status in STATUS_VALIDOS else "pendente",
+                        "reuniao_origem": reuniao_id,
+                        "ultima_reuniao": reuniao_id,
+                        "dados": item,
+                        "historico": [],
+                    }
+                    registro.indexar(novo)
+                    negociacao["itens"].append(novo)
+                    reconciliados.add(novo["id"])
+                    novos.append(novo)
+
+        negociacao["reunioes"].append({
+            "id": reuniao_id,
+            "data": data,
+            "itens_novos": len(novos),
+            "itens_atualizados": len(atualizados),
+        })
+        salvar_negociacao(negociacao)
+
+    em_aberto = [
+        item for item in negociacao["itens"]
+        if item["status"] in STATUS_ABERTOS and item["id"] not in reconciliados
+    ]
+    return {
+        "negociacao": negociacao,
+        "reuniao_id": reuniao_id,
+        "novos": novos,
+        "atualizados": atualizados,
+        "sem_mencao": em_aberto,
+    }
+
+
+def atualizar_status(negociacao_id: str, item_id: str, status: str) -> bool:
+    """Altera manualmente o status de um item do registro"""
+    if status not in STATUS_VALIDOS:
+        raise ValueError(f"Status inválido: {status}")
+    with _lock:
+        negociacao = carregar_negociacao(negociacao_id)
+        if negociacao is None:
+            return False
+        for item in negociacao["itens"]:
+            if item["id"] == item_id:
+                item["historico"].append({
+                    "reuniao": None,
+                    "data": datetime.datetime.now().isoformat(timespec='seconds'),
+                    "de": item["status"],
+                    "para": status,
+                    "similaridade": None,
+                })
+                item["status"] = status
+                salvar_negociacao(negociacao)
+                return True
+    return False
@@ -0,0 +1,155 @@
+"""
+Acesso à base de conhecimento: embeddings da OpenAI e busca vetorial no AstraDB,
+com o índice local (embeddings_locais) como alternativa em modo degradado.
+"""
+import base64
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import openai
+import requests
+
+import cache_recuperacao
+import embeddings_locais
+import gravacao
+import limitador
+
+# Configurações das credenciais
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+ASTRA_DB_API_ENDPOINT = os.getenv('ASTRA_DB_API_ENDPOINT')
+ASTRA_DB_APPLICATION_TOKEN = os.getenv('ASTRA_DB_APPLICATION_TOKEN')
+ASTRA_DB_NAMESPACE = os.getenv('ASTRA_DB_NAMESPACE')
+ASTRA_DB_COLLECTION = os.getenv('ASTRA_DB_COLLECTION')
+
+MODELO_EMBEDDING = "text-embedding-3-small"
+
+# Dimensão pedida à OpenAI (parâmetro `dimensions`); vazio usa a dimensão nativa do
+# modelo. Deve ser a mesma dimensão com que a coleção do AstraDB foi indexada.
+DIMENSAO_EMBEDDING = int(os.getenv('DIMENSAO_EMBEDDING', '0')) or None
+
+# Envia o vetor da busca como float32 em base64 ($binary) em vez de uma lista JSON de floats
+ASTRA_VETOR_BINARIO = os.getenv('ASTRA_VETOR_BINARIO', '1') in ('1', 'true', 'True')
+
+# Força o uso do índice local (modo offline e testes)
+EMBEDDINGS_LOCAIS = os.getenv('EMBEDDINGS_LOCAIS', '0') in ('1', 'true', 'True')
+
+
+class ErroBaseConhecimento(Exception):
+    """Falha ao consultar a API de embeddings ou o AstraDB"""
+
+
+def vetor_astra(vector: List[float], binario: bool = ASTRA_VETOR_BINARIO):
+    """Vetor no formato da Data API: lista de floats ou {"$binary": float32 big-endian em base64}"""
+    if not binario:
+        return vector
+    return {"$binary": base64.b64encode(np.asarray(vector, dtype='>f4').tobytes()).decode('ascii')}
+
+
+class AstraDBClient:
+    def __init__(self):
+        self.base_url = f"{ASTRA_DB_API_ENDPOINT}/api/json/v1/{ASTRA_DB_NAMESPACE}"
+        self.headers = {
+            "Content-Type": "application/json",
+            "x-cassandra-token": ASTRA_DB_APPLICATION_TOKEN,
+            "Accept": "application/json"
+        }
+
+    def vector_search(self, collection: str, vector: List[float], limit: int = 6) -> List[Dict]:
+        """Realiza busca por similaridade vetorial"""
+        url = f"{self.base_url}/{collection}"
+        payload = {
+            "find": {
+                "sort": {"$vector": vetor_astra(vector)},
+                "options": {"limit": limit}
+            }
+        }
+
+        def requisitar():
+            response = requests.post(url, json=payload, headers=self.headers, timeout=30)
+            response.raise_for_status()
+            return response.json()
+
+        def executar():
+            try:
+                data = limitador.chamar_com_limite("astra", 0, requisitar)
+                return data.get("data", {}).get("documents", [])
+            except (requests.RequestException, ValueError) as e:
+                raise ErroBaseConhecimento(f"Busca vetorial falhou: {e}") from e
+
+        return gravacao.chamar(
+            "astra.vector_search",
+            {"collection": collection, "vector": vector, "limit": limit},
+            executar
+        )
+
+    def listar_documentos(self, collection: str, incluir_vetor: bool = False) -> List[Dict]:
+        """Percorre todas as páginas da coleção (usado para montar o índice local)"""
+        url = f"{self.base_url}/{collection}"
+        documentos, pagina = [], None
+        while True:
+            options = {"pageState": pagina} if pagina else {}
+            payload = {"find": {"options": options}}
+            if incluir_vetor:
+                payload["find"]["projection"] = {"*": 1}
+            response = requests.post(url, json=payload, headers=self.headers, timeout=60)
+            response.raise_for_status()
+            data = response.json().get("data", {})
+            documentos.extend(data.get("documents", []))
+            pagina = data.get("nextPageState")
+            if not pagina:
+                return documentos
+
+
+def embeddings_openai(textos: List[str], dimensoes: Optional[int] = DIMENSAO_EMBEDDING) -> List[List[float]]:
+    """Obtém os embeddings de vários textos em uma única chamada à OpenAI"""
+    parametros = {"model": MODELO_EMBEDDING, "input": textos}
+    if dimensoes:
+        parametros["dimensions"] = dimensoes
+
+    def executar():
+        # Sem repetições do SDK: o limitador repete 429, 5xx e erros de conexão e contabiliza cada tentativa
+        client = openai.OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+        response = limitador.chamar_com_limite(
+            "openai.embeddings", limitador.estimar_tokens(*textos),
+            lambda: client.embeddings.create(**parametros)
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    return gravacao.chamar("openai.embeddings", parametros, executar)
+
+
+def get_embedding(texto: str) -> List[float]:
+    """Obtém embedding do texto usando OpenAI"""
+    return embeddings_openai([texto])[0]
+
+
+def buscar_por_vetor(astra_client: AstraDBClient, embedding: List[float], limit: int) -> List[Dict]:
+    """Busca vetorial na coleção, reaproveitando resultados de consultas semelhantes em cache"""
+    # Gravando ou reproduzindo, toda busca vai ao cassete: um acerto do cache
+    # deixaria a busca fora da gravação e mudaria o contexto na reprodução
+    cache = cache_recuperacao.obter_cache() if gravacao.modo() == "desligado" else None
+    documentos = cache.buscar(embedding, ASTRA_DB_COLLECTION, limit) if cache else None
+    if documentos is None:
+        documentos = astra_client.vector_search(ASTRA_DB_COLLECTION, embedding, limit=limit)
+        if cache:
+            cache.guardar(embedding, ASTRA_DB_COLLECTION, limit, documentos)
+    return documentos
+
+
+def buscar_conhecimento(astra_client: AstraDBClient, texto: str, limit: int) -> Tuple[List[Dict], str]:
+    """
+    Busca os documentos relevantes para o texto. Retorna os documentos e o modo
+    usado: "openai" (embedding OpenAI + AstraDB), "local" (índice local) ou
+    "indisponivel".
+    """
+    if not EMBEDDINGS_LOCAIS:
+        try:
+            return buscar_por_vetor(astra_client, get_embedding(texto), limit), "openai"
+        except Exception:
+            pass
+
+    indice = embeddings_locais.obter_indice_local()
+    if indice is None:
+        return [], "indisponivel"
+    return indice.buscar(texto, limit=limit), "local"
@@ -0,0 +1,147 @@
+"""
+Cache de contexto do Gemini para os system prompts fixos.
+
+Os prompts de sistema são enviados como `system_instruction` de um
+CachedContent criado uma única vez por processo e renovado antes de expirar.
+Quando o cache explícito não está disponível (prompt abaixo do mínimo de
+tokens, modelo sem suporte, erro da API), o modelo é criado com o mesmo
+`system_instruction` sem cache, e a análise segue normalmente. Prompts abaixo
+do mínimo do modelo nem chegam a chamar a API, e a criação/renovação do cache
+roda fora do lock, por uma única thread de cada vez.
+"""
+import datetime
+import hashlib
+import threading
+import time
+from typing import Dict, Optional
+
+import google.generativeai as genai
+from google.generativeai import caching
+
+import limitador
+
+# Tempo de vida do cache e antecedência com que ele é renovado
+TTL_CACHE = datetime.timedelta(hours=1)
+MARGEM_RENOVACAO = datetime.timedelta(minutes=5)
+
+# Intervalo antes de tentar criar o cache novamente após uma falha
+ESPERA_APOS_FALHA = 600
+
+# Mínimo de tokens do conteúdo para o cache explícito, por modelo; modelos
+# não listados usam o mínimo mais conservador
+MINIMO_TOKENS_CACHE = {
+    "gemini-2.5-flash-lite": 1024,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+MINIMO_TOKENS_CACHE_PADRAO = 32768
+
+# Fração do preço de entrada economizada em tokens servidos pelo cache
+DESCONTO_TOKENS_CACHE = 0.75
+
+
+class PromptEmCache:
+    """Mantém um CachedContent com um system prompt e entrega o modelo correspondente"""
+
+    def __init__(self, modelo: str, system_instruction: str, nome: str):
+        self.modelo_nome = modelo
+        self.system_instruction = system_instruction
+        self.nome = nome
+        self._cache: Optional[caching.CachedContent] = None
+        self._modelo_cache: Optional[genai.GenerativeModel] = None
+        self._modelo_sem_cache = genai.GenerativeModel(modelo, system_instruction=system_instruction)
+        self._ultima_falha = 0.0
+        self.erro: Optional[str] = None
+        self._lock = threading.Lock()
+        # Criação ou renovação em andamento (só uma thread faz a chamada à API)
+        self._em_andamento = False
+
+        minimo = MINIMO_TOKENS_CACHE.get(modelo, MINIMO_TOKENS_CACHE_PADRAO)
+        tokens = limitador.estimar_tokens(system_instruction)
+        self.elegivel = tokens >= minimo
+        if not self.elegivel:
+            self.erro = f"Prompt com ~{tokens} tokens, abaixo do mínimo de {minimo} do cache explícito de {modelo}"
+
+    @property
+    def ativo(self) -> bool:
+        return self._cache is not None
+
+    def _criar(self) -> caching.CachedContent:
+        return caching.CachedContent.create(
+            model=f"models/{self.modelo_nome}",
+            display_name=self.nome,
+            system_instruction=self.system_instruction,
+            ttl=TTL_CACHE,
+        )
+
+    def _renovar(self, cache: caching.CachedContent) -> caching.CachedContent:
+        try:
+            cache.update(ttl=TTL_CACHE)
+            return cache
+        except Exception:
+            # O cache pode já ter expirado no servidor: recria
+            return self._criar()
+
+    def modelo(self) -> genai.GenerativeModel:
+        """Modelo servido pelo cache, ou o modelo com system_instruction sem cache"""
+        with self._lock:
+            if not self.elegivel:
+                return self._modelo_sem_cache
+            if self._cache is not None:
+                agora = datetime.datetime.now(datetime.timezone.utc)
+                if self._cache.expire_time - agora > MARGEM_RENOVACAO:
+                    return self._modelo_cache
+            elif self._ultima_falha and time.monotonic() - self._ultima_falha < ESPERA_APOS_FALHA:
+                return self._modelo_sem_cache
+            if self._em_andamento:
+                # Outra thread já está criando/renovando: usa o que houver até lá
+                return self._modelo_cache or self._modelo_sem_cache
+            self._em_andamento = True
+            cache_atual = self._cache
+
+        try:
+            cache = self._renovar(cache_atual) if cache_atual is not None else self._criar()
+            modelo_cache = genai.GenerativeModel.from_cached_content(cached_content=cache)
+        except Exception as e:
+            with self._lock:
+                self._cache = None
+                self._modelo_cache = None
+                self._ultima_falha = time.monotonic()
+                self.erro = str(e)
+                self._em_andamento = False
+            return self._modelo_sem_cache
+
+        with self._lock:
+            self._cache = cache
+            self._modelo_cache = modelo_cache
+            self.erro = None
+            self._em_andamento = False
+        return modelo_cache
+
+
+_prompts: Dict[str, PromptEmCache] = {}
+_prompts_lock = threading.Lock()
+
+
+def obter_prompt_em_cache(modelo: str, system_instruction: str, nome: str) -> PromptEmCache:
+    """Retorna o PromptEmCache do processo para o par modelo/prompt, criando-o se preciso"""
+    chave = hashlib.sha256(f"{modelo}\n{system_instruction}".encode()).hexdigest()
+    with _prompts_lock:
+        if chave not in _prompts:
+            _prompts[chave] = PromptEmCache(modelo, system_instruction, nome)
+        return _prompts[chave]
+
+
+def uso_tokens(response, etapa: str) -> Dict:
+    """Extrai o consumo de tokens de uma resposta do Gemini"""
+    uso = getattr(response, "usage_metadata", None)
+    entrada = getattr(uso, "prompt_token_count", 0) or 0
+    em_cache = getattr(uso, "cached_content_token_count", 0) or 0
+    return {
+        "etapa": etapa,
+        "tokens_entrada": entrada,
+        "tokens_em_cache": em_cache,
+        "tokens_saida": getattr(uso, "candidates_token_count", 0) or 0,
+        "tokens_total": getattr(uso, "total_token_count", 0) or 0,
+        "economia_tokens_equivalentes": round(em_cache * DESCONTO_TOKENS_CACHE),
+    }
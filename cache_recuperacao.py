@@ -0,0 +1,184 @@
+"""
+Cache semântico dos resultados da busca vetorial (RAG).
+
+Cada entrada guarda o embedding normalizado da consulta e os documentos
+retornados pelo AstraDB. Uma nova consulta cujo embedding tenha similaridade
+de cosseno acima do limiar com alguma consulta em cache reaproveita o
+resultado, sem ida ao AstraDB. A procura é um único produto matriz-vetor em
+numpy sobre uma matriz pré-alocada de tamanho fixo; quando ela enche, a
+entrada usada há mais tempo é substituída (LRU).
+
+O cache é descartado quando a coleção é reingerida: o processo de ingestão
+(ou `python embeddings_locais.py indexar`) chama `marcar_reingestao`, que
+atualiza um arquivo de versão verificado a cada consulta. Entradas também
+expiram após CACHE_RAG_TTL segundos; as expiradas encontradas numa consulta
+são removidas e suas linhas da matriz voltam a ficar livres.
+
+Variáveis de ambiente:
+    CACHE_RAG=0                 # desliga o cache
+    CACHE_RAG_LIMIAR=0.95
+    CACHE_RAG_MAX=512
+    CACHE_RAG_TTL=3600
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+CACHE_RAG = os.getenv('CACHE_RAG', '1') not in ('0', 'false', 'False')
+LIMIAR_SIMILARIDADE = float(os.getenv('CACHE_RAG_LIMIAR', '0.95'))
+MAX_ENTRADAS = int(os.getenv('CACHE_RAG_MAX', '512'))
+TTL_SEGUNDOS = float(os.getenv('CACHE_RAG_TTL', '3600'))
+CAMINHO_VERSAO = os.getenv('CACHE_RAG_VERSAO_PATH', os.path.join('dados', 'versao_colecao'))
+
+
+def marcar_reingestao(caminho: str = CAMINHO_VERSAO):
+    """Sinaliza a todos os processos que a coleção foi reingerida"""
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write(str(time.time()))
+
+
+def _versao_colecao(caminho: str = CAMINHO_VERSAO) -> float:
+    try:
+        return os.stat(caminho).st_mtime
+    except OSError:
+        return 0.0
+
+
+class CacheSemantico:
+    """Cache de resultados por similaridade de embedding, com LRU e métricas"""
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS, limiar: float = LIMIAR_SIMILARIDADE,
+                 ttl: float = TTL_SEGUNDOS, caminho_versao: str = CAMINHO_VERSAO):
+        self.max_entradas = max_entradas
+        self.limiar = limiar
+        self.ttl = ttl
+        self.caminho_versao = caminho_versao
+        self._matriz: Optional[np.ndarray] = None
+        # slot -> entrada; a ordem é a de uso (a primeira é a menos recente)
+        self._entradas: "OrderedDict[int, Dict]" = OrderedDict()
+        # Linhas liberadas por expiração e o limite das linhas já usadas da matriz
+        self._livres: List[int] = []
+        self._topo = 0
+        self._versao = _versao_colecao(caminho_versao)
+        self._lock = threading.Lock()
+        self._consultas = 0
+        self._acertos = 0
+        self._invalidacoes = 0
+        self._expiradas = 0
+        self._similaridades: List[float] = []
+
+    def _limpar(self):
+        self._matriz = None
+        self._entradas.clear()
+        self._livres.clear()
+        self._topo = 0
+        self._invalidacoes += 1
+
+    def _remover(self, slot: int):
+        """Libera a linha de uma entrada expirada (zerada, não passa mais no limiar)"""
+        del self._entradas[slot]
+        self._matriz[slot] = 0
+        self._livres.append(slot)
+        self._expiradas += 1
+
+    def invalidar(self):
+        with self._lock:
+            self._limpar()
+
+    def _verificar_versao(self):
+        versao = _versao_colecao(self.caminho_versao)
+        if versao != self._versao:
+            self._versao = versao
+            self._limpar()
+
+    def buscar(self, vetor: List[float], colecao: str, limit: int) -> Optional[List[Dict]]:
+        """Resultado de uma consulta semanticamente equivalente, se houver"""
+        consulta = np.asarray(vetor, dtype=np.float32)
+        norma = np.linalg.norm(consulta)
+        with self._lock:
+            self._consultas += 1
+            self._verificar_versao()
+            if self._matriz is None or not self._entradas or not norma or consulta.shape[0] != self._matriz.shape[1]:
+                return None
+            # Só as linhas até o topo já foram usadas; as livres estão zeradas
+            scores = self._matriz[:self._topo] @ (consulta / norma)
+            agora = time.monotonic()
+            # Percorre os candidatos acima do limiar do mais similar ao menos similar
+            candidatos = np.flatnonzero(scores >= self.limiar)
+            for slot in candidatos[np.argsort(-scores[candidatos])]:
+                entrada = self._entradas.get(int(slot))
+                if entrada is None:
+                    continue
+                if agora - entrada["criado"] > self.ttl:
+                    self._remover(int(slot))
+                    continue
+                if entrada["colecao"] == colecao and entrada["limit"] >= limit:
+                    self._entradas.move_to_end(int(slot))
+                    self._acertos += 1
+                    self._similaridades.append(float(scores[slot]))
+                    del self._similaridades[:-200]
+                    return [dict(doc) for doc in entrada["documentos"][:limit]]
+            return None
+
+    def guardar(self, vetor: List[float], colecao: str, limit: int, documentos: List[Dict]):
+        consulta = np.asarray(vetor, dtype=np.float32)
+        norma = np.linalg.norm(consulta)
+        if not norma:
+            return
+        with self._lock:
+            self._verificar_versao()
+            if self._matriz is None or self._matriz.shape[1] != consulta.shape[0]:
+                # Primeira entrada (ou mudança de dimensão dos embeddings): aloca a matriz
+                self._matriz = np.zeros((self.max_entradas, consulta.shape[0]), dtype=np.float32)
+                self._entradas.clear()
+                self._livres.clear()
+                self._topo = 0
+            if self._livres:
+                slot = self._livres.pop()
+            elif self._topo < self.max_entradas:
+                slot = self._topo
+                self._topo += 1
+            else:
+                slot, _ = self._entradas.popitem(last=False)
+            self._matriz[slot] = consulta / norma
+            self._entradas[slot] = {
+                "colecao": colecao,
+                "limit": limit,
+                # Sem o vetor dos documentos: só ids, textos e metadados
+                "documentos": [{k: v for k, v in doc.items() if k != '$vector'} for doc in documentos],
+                "criado": time.monotonic(),
+            }
+
+    def estatisticas(self) -> Dict:
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "capacidade": self.max_entradas,
+                "consultas": self._consultas,
+                "acertos": self._acertos,
+                "taxa_acerto": self._acertos / self._consultas if self._consultas else 0.0,
+                "similaridade_media": float(np.mean(self._similaridades)) if self._similaridades else None,
+                "invalidacoes": self._invalidacoes,
+                "expiradas": self._expiradas,
+                "limiar": self.limiar,
+            }
+
+
+_cache: Optional[CacheSemantico] = None
+_cache_lock = threading.Lock()
+
+
+def obter_cache() -> Optional[CacheSemantico]:
+    """Cache compartilhado pelo processo, ou None se desligado"""
+    global _cache
+    if not CACHE_RAG:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = CacheSemantico()
+        return _cache
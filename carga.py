@@ -0,0 +1,456 @@
+"""
+Teste de carga com sessões concorrentes do app Streamlit.
+
+Sobe o servidor Streamlit de verdade (headless) com os backends substituídos
+por stubs de latência configurável e conecta N sessões simultâneas pelo
+websocket do Streamlit, como faria o navegador. Cada sessão percorre:
+carregar → colar transcrição → analisar → baixar. As abas são trocadas no
+cliente, sem ida ao servidor, e por isso não entram na medição.
+
+Ao final são relatados vazão, percentis de latência por etapa, número de
+threads e crescimento de memória (RSS) do processo do servidor por sessão.
+
+Uso:
+    python carga.py --sessoes 20 --latencia-llm 2.0 --latencia-rag 0.3
+
+Quando o Streamlit executa este arquivo com CARGA_APP=1, ele funciona como o
+script do app: aplica os stubs e executa o main.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import runpy
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+TRANSCRICAO_EXEMPLO = """[00:00:05] Vendedor: Bom dia, Carla! Obrigado pelo tempo. Como está a operação este trimestre?
+[00:00:14] Carla (Diretora de Operações): Corrida. Temos problemas de produtividade na equipe de campo.
+[00:00:31] Vendedor: Entendi. O que acontece hoje quando uma ordem de serviço atrasa?
+[00:00:40] Carla (Diretora de Operações): O cliente liga, a equipe refaz a rota na mão e perdemos quase um dia.
+[00:01:02] Vendedor: E quanto isso custa por mês, considerando as multas contratuais?
+[00:01:15] Carla (Diretora de Operações): Algo perto de 80 mil reais. Mas o preço da ferramenta me preocupa.
+[00:01:30] Vendedor: Faz sentido. Vou enviar a proposta comercial com o cálculo de ROI até sexta-feira.
+[00:01:42] Carla (Diretora de Operações): Combinado. Inclua o termo de POC, preciso levar ao CFO.
+"""
+
+OUTPUTS_EXEMPLO = {
+    "acordos_combinados": [{
+        "descricao": "Enviar proposta com ROI até sexta-feira",
+        "partes_envolvidas": ["Vendedor", "Carla (Diretora de Operações)"],
+        "condicoes": "Levar ao CFO",
+        "status": "pendente",
+        "evidencia_transcricao": "Vou enviar a proposta comercial com o cálculo de ROI até sexta-feira",
+    }],
+    "tasks": [{
+        "responsavel": {"nome": "Vendedor", "cargo": "Account Executive", "contato": ""},
+        "descricao": "Enviar proposta comercial com cálculo de ROI",
+        "prazo": "sexta-feira",
+        "ferramentas_necessarias": ["planilha de ROI"],
+        "entrega_final": "Proposta em PDF",
+        "reportar_para": {"nome": "Carla", "cargo": "Diretora de Operações"},
+        "prioridade": "alta",
+        "dependencias": [""],
+        "status": "pendente",
+        "evidencia_transcricao": "Vou enviar a proposta comercial com o cálculo de ROI até sexta-feira",
+    }],
+    "entregaveis": [{
+        "nome": "Termo de POC",
+        "descricao": "Termo para prova de conceito",
+        "responsavel_entrega": "Vendedor",
+        "formato_esperado": "PDF",
+        "prazo": "sexta-feira",
+        "destinatario": "Carla (Diretora de Operações)",
+        "status": "pendente",
+        "evidencia_transcricao": "Inclua o termo de POC, preciso levar ao CFO",
+    }],
+    "proximos_passos": {
+        "acoes_imediatas": ["Enviar proposta"],
+        "preparativos_proxima_reuniao": ["Validar números com o CFO"],
+        "agenda_sugerida": ["Revisar ROI", "Definir escopo da POC"],
+        "objetivos_proxima_reuniao": ["Aprovar POC"],
+        "data_sugerida": "próxima semana",
+        "participantes_necessarios": ["Carla", "CFO"],
+    },
+    "analise_quantitativa": {
+        "participantes": [
+            {
+                "nome": nome,
+                "papel": papel,
+                "metricas": {
+                    "tempo_fala_segundos": 60, "numero_falas": 4, "palavras_por_fala": 15,
+                    "perguntas_feitas": 2, "objeções_levantadas": 1 if papel == "cliente" else 0,
+                    "acordos_propostos": 1,
+                },
+                "qualidade_performance": {
+                    "clareza_comunicacao": 8, "escuta_ativa": 7, "persuasao": 7,
+                    "dominio_conteudo": 8, "gestao_objeções": 6, "fechamento": 7,
+                },
+            }
+            for nome, papel in (("Vendedor", "vendedor"), ("Carla", "cliente"))
+        ],
+        "estatisticas_gerais": {
+            "duracao_total_segundos": 102, "total_falas": 8, "equilibrio_participacao": 0.45,
+            "indice_colaboracao": 0.7, "densidade_informacao": 4.2,
+        },
+    },
+}
+
+
+# --- Lado do servidor: stubs aplicados dentro do processo do Streamlit ---
+
+def _aplicar_stubs():
+    """Substitui LLMs e base de conhecimento por stubs com a latência configurada"""
+    import base_conhecimento
+    import provedores
+
+    if getattr(provedores, "_stubs_carga", False):
+        return
+    latencia_llm = float(os.getenv('CARGA_LATENCIA_LLM', '2.0'))
+    latencia_rag = float(os.getenv('CARGA_LATENCIA_RAG', '0.3'))
+    jitter = float(os.getenv('CARGA_JITTER', '0.2'))
+
+    def com_jitter(base):
+        return lambda: max(0.0, random.gauss(base, base * jitter))
+
+    provedores._roteador = provedores.RoteadorLLM([
+        provedores.ProvedorStub(
+            "stub",
+            com_jitter(latencia_llm),
+            texto={"analise": "## Resumo executivo\nAnálise simulada para teste de carga.",
+                   "outputs": json.dumps(OUTPUTS_EXEMPLO, ensure_ascii=False)},
+            timeout=latencia_llm * 10 + 5,
+            prazo_hedge_padrao=latencia_llm * 10,
+        )
+    ], hedge=False, max_workers=64)
+
+    rag = com_jitter(latencia_rag)
+
+    # Metade da latência no pedido de embeddings, metade em cada busca vetorial (em paralelo)
+    def embeddings_openai(textos, dimensoes=None):
+        time.sleep(rag() / 2)
+        return [[random.random() for _ in range(8)] for _ in textos]
+
+    def buscar_por_vetor(astra_client, embedding, limit):
+        time.sleep(rag() / 2)
+        ids = random.sample(range(limit * 3), limit)
+        return [{"_id": str(i), "content": f"Trecho {i} do playbook de vendas"} for i in ids]
+
+    base_conhecimento.embeddings_openai = embeddings_openai
+    base_conhecimento.buscar_por_vetor = buscar_por_vetor
+    provedores._stubs_carga = True
+
+
+# --- Lado do cliente: sessões pelo websocket do Streamlit ---
+
+class SessaoStreamlit:
+    """Cliente mínimo do protocolo do Streamlit (BackMsg/ForwardMsg via websocket)"""
+
+    def __init__(self, porta: int):
+        self.porta = porta
+        self.ws = None
+        self.widgets: Dict[str, object] = {}
+        self.valores: Dict[str, object] = {}
+
+    async def conectar(self):
+        from tornado.websocket import websocket_connect
+        self.ws = await websocket_connect(
+            f"ws://127.0.0.1:{self.porta}/_stcore/stream",
+            subprotocols=["streamlit"],
+            max_message_size=256 * 1024 * 1024,
+        )
+
+    def _estado_widgets(self, gatilho: Optional[str] = None):
+        from streamlit.proto.WidgetStates_pb2 import WidgetStates
+        estados = WidgetStates()
+        for widget_id, valor in self.valores.items():
+            estado = estados.widgets.add()
+            estado.id = widget_id
+            if isinstance(valor, str):
+                estado.string_value = valor
+            else:
+                estado.int_value = valor
+        if gatilho:
+            estado = estados.widgets.add()
+            estado.id = gatilho
+            estado.trigger_value = True
+        return estados
+
+    async def rerun(self, gatilho: Optional[str] = None) -> float:
+        """Pede uma execução do script e espera o fim; retorna a latência em segundos"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        msg.rerun_script.widget_states.CopyFrom(self._estado_widgets(gatilho))
+        inicio = time.perf_counter()
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+
+        self.widgets = {}
+        while True:
+            dados = await self.ws.read_message()
+            if dados is None:
+                raise ConnectionError("Websocket fechado pelo servidor")
+            fmsg = ForwardMsg()
+            fmsg.ParseFromString(dados)
+            tipo = fmsg.WhichOneof("type")
+            if tipo == "delta" and fmsg.delta.WhichOneof("type") == "new_element":
+                elemento = fmsg.delta.new_element
+                nome = elemento.WhichOneof("type")
+                if nome in ("text_area", "text_input", "radio", "button", "download_button"):
+                    widget = getattr(elemento, nome)
+                    self.widgets[f"{nome}:{widget.label}"] = widget
+            elif tipo == "script_finished":
+                if fmsg.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                return time.perf_counter() - inicio
+
+    def widget(self, tipo: str, prefixo_rotulo: str = ""):
+        for chave, widget in self.widgets.items():
+            if chave.startswith(f"{tipo}:{prefixo_rotulo}"):
+                return widget
+        return None
+
+    async def baixar(self, widget) -> float:
+        """Clica no botão de download e busca o arquivo, como o navegador"""
+        from tornado.httpclient import AsyncHTTPClient
+        inicio = time.perf_counter()
+        url = widget.url
+        if widget.deferred_file_id:
+            url = await self._gerar_arquivo(widget.deferred_file_id)
+        if url:
+            await AsyncHTTPClient().fetch(f"http://127.0.0.1:{self.porta}{url}")
+        if not widget.ignore_rerun:
+            await self.rerun(gatilho=widget.id)
+        return time.perf_counter() - inicio
+
+    async def _gerar_arquivo(self, file_id: str) -> str:
+        """Pede a geração de um download sob demanda e espera a URL do arquivo"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.deferred_file_request.file_id = file_id
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        while True:
+            dados = await self.ws.read_message()
+            if dados is None:
+                raise ConnectionError("Websocket fechado pelo servidor")
+            fmsg = ForwardMsg()
+            fmsg.ParseFromString(dados)
+            if fmsg.WhichOneof("type") == "deferred_file_response" and fmsg.deferred_file_response.file_id == file_id:
+                if fmsg.deferred_file_response.error_msg:
+                    raise RuntimeError(fmsg.deferred_file_response.error_msg)
+                return fmsg.deferred_file_response.url
+
+    def fechar(self):
+        if self.ws is not None:
+            self.ws.close()
+
+
+async def _percorrer_sessao(porta: int, perfil: str, medidas: Dict[str, List[float]],
+                            erros: List[str], abertas: List[SessaoStreamlit]):
+    sessao = SessaoStreamlit(porta)
+    inicio = time.perf_counter()
+    try:
+        await sessao.conectar()
+        abertas.append(sessao)
+        medidas["carregar"].append(await sessao.rerun())
+
+        area = sessao.widget("text_area")
+        radio = sessao.widget("radio")
+        sessao.valores[area.id] = TRANSCRICAO_EXEMPLO
+        if radio is not None:
+            import perfis
+            nome = perfis.PERFIS.get(perfil, {}).get("nome")
+            opcoes = list(radio.options)
+            sessao.valores[radio.id] = opcoes.index(nome) if nome in opcoes else radio.default
+        medidas["colar"].append(await sessao.rerun())
+
+        botao = sessao.widget("button", "🔍")
+        medidas["analisar"].append(await sessao.rerun(gatilho=botao.id))
+
+        downloads = [w for chave, w in sessao.widgets.items() if chave.startswith("download_button:")]
+        for download in downloads:
+            medidas["baixar"].append(await sessao.baixar(download))
+        medidas["sessao"].append(time.perf_counter() - inicio)
+    except Exception as e:
+        erros.append(f"{type(e).__name__}: {e}")
+
+
+def _metricas_processo(pid: int) -> Dict[str, int]:
+    """Threads e RSS (KiB) do processo, lidos de /proc (Linux)"""
+    metricas = {}
+    with open(f"/proc/{pid}/status") as f:
+        for linha in f:
+            if linha.startswith("Threads:"):
+                metricas["threads"] = int(linha.split()[1])
+            elif linha.startswith("VmRSS:"):
+                metricas["rss_kib"] = int(linha.split()[1])
+    return metricas
+
+
+class Monitor(threading.Thread):
+    """Amostra periodicamente threads e memória do servidor"""
+
+    def __init__(self, pid: int, intervalo: float = 0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.intervalo = intervalo
+        self.amostras: List[Dict[str, int]] = []
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            try:
+                self.amostras.append(_metricas_processo(self.pid))
+            except OSError:
+                return
+            self._parar.wait(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _iniciar_servidor(porta: int, args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        CARGA_APP="1",
+        CARGA_LATENCIA_LLM=str(args.latencia_llm),
+        CARGA_LATENCIA_RAG=str(args.latencia_rag),
+        CARGA_JITTER=str(args.jitter),
+        GEM_API_KEY=os.getenv("GEM_API_KEY", "carga"),
+        NEGOCIACOES_DIR=os.path.join(DIRETORIO, "dados", "carga"),
+    )
+    comando = [
+        sys.executable, "-m", "streamlit", "run", os.path.abspath(__file__),
+        "--server.headless", "true",
+        "--server.port", str(porta),
+        "--server.address", "127.0.0.1",
+        "--server.fileWatcherType", "none",
+        "--browser.gatherUsageStats", "false",
+    ]
+    servidor = subprocess.Popen(comando, env=env, cwd=DIRETORIO,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        try:
+            with socket.create_connection(("127.0.0.1", porta), timeout=1):
+                return servidor
+        except OSError:
+            if servidor.poll() is not None:
+                raise RuntimeError("O servidor Streamlit encerrou durante a inicialização")
+            time.sleep(0.2)
+    servidor.kill()
+    raise RuntimeError("O servidor Streamlit não respondeu em 60s")
+
+
+def _percentis(valores: List[float]) -> str:
+    if not valores:
+        return "-"
+    ordenados = sorted(valores)
+
+    def p(q):
+        return ordenados[min(len(ordenados) - 1, int(round(q * (len(ordenados) - 1))))]
+    return f"p50 {statistics.median(ordenados):6.2f}s  p95 {p(0.95):6.2f}s  p99 {p(0.99):6.2f}s  (n={len(ordenados)})"
+
+
+async def _executar_carga(porta: int, args, monitor: Monitor) -> Dict:
+    medidas: Dict[str, List[float]] = {e: [] for e in ("carregar", "colar", "analisar", "baixar", "sessao")}
+    erros: List[str] = []
+    abertas: List[SessaoStreamlit] = []
+
+    # Aquecimento: a primeira execução importa módulos e não deve contar na medição
+    aquecimento = SessaoStreamlit(porta)
+    await aquecimento.conectar()
+    await aquecimento.rerun()
+    aquecimento.fechar()
+    await asyncio.sleep(1)
+    base = _metricas_processo(monitor.pid)
+
+    inicio = time.perf_counter()
+    tarefas = []
+    for _ in range(args.sessoes):
+        tarefas.append(asyncio.ensure_future(_percorrer_sessao(porta, args.perfil, medidas, erros, abertas)))
+        if args.rampa:
+            await asyncio.sleep(args.rampa / args.sessoes)
+    await asyncio.gather(*tarefas)
+    duracao = time.perf_counter() - inicio
+
+    # Memória medida com as sessões ainda conectadas (estado de sessão retido)
+    await asyncio.sleep(1)
+    pico_sessoes = _metricas_processo(monitor.pid)
+    for sessao in abertas:
+        sessao.fechar()
+    return {"medidas": medidas, "erros": erros, "duracao": duracao, "base": base, "final": pico_sessoes}
+
+
+def main_carga():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessoes", type=int, default=10, help="sessões simultâneas")
+    parser.add_argument("--rampa", type=float, default=0.0, help="segundos para abrir todas as sessões")
+    parser.add_argument("--latencia-llm", type=float, default=2.0, help="latência média de cada geração (s)")
+    parser.add_argument("--latencia-rag", type=float, default=0.3, help="latência média da busca RAG (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="desvio relativo das latências")
+    parser.add_argument("--perfil", default="equilibrado", help="perfil de análise selecionado")
+    args = parser.parse_args()
+
+    porta = _porta_livre()
+    servidor = _iniciar_servidor(porta, args)
+    monitor = Monitor(servidor.pid)
+    monitor.start()
+    try:
+        resultado = asyncio.run(_executar_carga(porta, args, monitor))
+    finally:
+        monitor.parar()
+        servidor.terminate()
+        servidor.wait(timeout=30)
+
+    medidas = resultado["medidas"]
+    concluidas = len(medidas["sessao"])
+    threads = [a["threads"] for a in monitor.amostras if "threads" in a]
+    rss = [a["rss_kib"] for a in monitor.amostras if "rss_kib" in a]
+    crescimento = resultado["final"]["rss_kib"] - resultado["base"]["rss_kib"]
+
+    print(f"\nSessões: {args.sessoes} simultâneas • LLM ~{args.latencia_llm}s • RAG ~{args.latencia_rag}s • perfil {args.perfil}")
+    print(f"Concluídas: {concluidas}/{args.sessoes} em {resultado['duracao']:.1f}s "
+          f"→ vazão {concluidas / resultado['duracao']:.2f} sessões/s "
+          f"({len(medidas['analisar']) * 60 / resultado['duracao']:.1f} análises/min)")
+    for etapa in ("carregar", "colar", "analisar", "baixar", "sessao"):
+        print(f"  {etapa:<9} {_percentis(medidas[etapa])}")
+    if threads:
+        print(f"Threads do servidor: base {resultado['base']['threads']}, máx {max(threads)}")
+    if rss:
+        print(f"RSS do servidor: base {resultado['base']['rss_kib'] / 1024:.1f} MiB, "
+              f"pico {max(rss) / 1024:.1f} MiB, com sessões abertas {resultado['final']['rss_kib'] / 1024:.1f} MiB "
+              f"→ {crescimento / max(args.sessoes, 1):.0f} KiB por sessão")
+    if resultado["erros"]:
+        print(f"Erros ({len(resultado['erros'])}):")
+        for erro in sorted(set(resultado["erros"]))[:10]:
+            print(f"  - {erro}")
+
+
+if os.getenv("CARGA_APP") == "1":
+    # Executado pelo `streamlit run`: script do app com stubs
+    sys.path.insert(0, DIRETORIO)
+    _aplicar_stubs()
+    runpy.run_path(os.path.join(DIRETORIO, "main.py"), run_name="__main__")
+elif __name__ == "__main__":
+    main_carga()
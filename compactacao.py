@@ -0,0 +1,269 @@
+"""
+Compactação da transcrição antes dos prompts.
+
+Transcrições de ASR chegam com marcações de tempo, muletas de fala ("é...",
+"tipo", "né"), linhas repetidas e mensagens do sistema de reunião, e tudo isso
+vai duas vezes para o LLM (análise e extração). A compactação:
+
+- descarta mensagens do sistema (entradas/saídas, gravação, cues de VTT,
+  linhas só com marcações como [música]) e marcações (risos) no meio da fala;
+- normaliza os falantes ("VENDEDOR", "vendedor (João)" → um só rótulo);
+- remove muletas de fala ("tipo" só quando abre a oração) e palavras
+  repetidas em sequência sem pontuação ("eu eu"), exceto negações;
+- descarta a linha que repete exatamente a linha anterior do mesmo falante
+  (eco do ASR); respostas repetidas depois de outra fala são mantidas;
+- une turnos consecutivos do mesmo falante, mantendo o primeiro timestamp
+  (nunca por cima de uma linha descartada).
+
+Cada caractere do texto compactado guarda o offset correspondente na
+transcrição original, de modo que as citações em "evidencia_transcricao"
+sejam localizadas e exibidas no texto original (evidencias.IndiceTranscricao).
+
+Variáveis de ambiente:
+    COMPACTAR_TRANSCRICAO=0            # envia a transcrição original
+    PREFILL_TOKENS_POR_SEGUNDO=4000    # para estimar a latência economizada
+
+Uso:
+    python compactacao.py <transcricao.txt> [saida.txt]   # redução de tokens e tempo de compactação
+"""
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import evidencias
+import limitador
+
+COMPACTAR_TRANSCRICAO = os.getenv('COMPACTAR_TRANSCRICAO', '1') not in ('0', 'false', 'False')
+PREFILL_TOKENS_POR_SEGUNDO = float(os.getenv('PREFILL_TOKENS_POR_SEGUNDO', '4000'))
+
+PREENCHIMENTOS = frozenset({
+    "né", "ahn", "ah", "hã", "han", "hum", "humm", "hmm", "hm", "uhm", "uh", "eh", "éé", "ééé", "eee",
+})
+
+_PONTUACAO = ".,;:!?…"
+# Repetições que mudam o sentido e nunca são colapsadas ("não, não")
+NEGACOES = frozenset({"não", "nao", "nunca", "nem"})
+# "tipo de/do ..." é substantivo, não muleta
+_APOS_TIPO_SUBSTANTIVO = frozenset({"de", "do", "da", "dos", "das"})
+
+_RE_ALONGADO = re.compile(r"^(?:é{2,}|e{3,}|a{3,}|h+u*m+|u+h+m*)$")
+_RE_MARCACAO = re.compile(
+    r"^[\[(](?:música|musica|risos?|inaudível|inaudivel|silêncio|silencio|ruído|ruido|aplausos|pausa|"
+    r"crosstalk|music|laughter|inaudible|silence|noise)[\])][.,]?$",
+    re.IGNORECASE,
+)
+# Linhas que não são fala: cabeçalho e cues de VTT, timestamps soltos, marcações entre colchetes
+_RE_SISTEMA = re.compile(
+    r"^\s*(?:WEBVTT\b.*|NOTE\b.*|\d+|\d{1,2}:\d{2}(?::\d{2})?[.,]\d{1,3}\s*-->.*"
+    r"|[\[(][^\])]*[\])]|\*{2,}.*\*{2,})\s*$"
+)
+# Eventos da plataforma de reunião em linha própria
+_RE_EVENTO = re.compile(
+    r"(?:[^.!?]{0,60} (?:entrou|saiu) (?:na|da) (?:reunião|chamada|sala)"
+    r"|[^.!?]{0,60} (?:joined|left) the (?:meeting|call)"
+    r"|(?:gravação|transcrição|recording|transcription) (?:iniciada|encerrada|interrompida|pausada|started|stopped)"
+    r"[^.!?]{0,40})\.?",
+    re.IGNORECASE,
+)
+FALANTES_SISTEMA = frozenset({"sistema", "system", "zoom", "teams", "meet", "google meet", "bot"})
+_RE_PALAVRA = re.compile(r"\S+")
+
+
+class TranscricaoCompacta:
+    """Texto compactado, mapa de offsets para o original e estatísticas da compactação"""
+
+    def __init__(self, original: str, texto: str, mapa: List[int], estatisticas: Dict):
+        self.original = original
+        self.texto = texto
+        self.mapa = mapa
+        self.estatisticas = estatisticas
+
+    def indice(self) -> evidencias.IndiceTranscricao:
+        """Índice de citações sobre o texto compactado que responde em offsets do original"""
+        return evidencias.IndiceTranscricao(self.texto, original=self.original, mapa_original=self.mapa)
+
+
+def _chave_falante(falante: str) -> str:
+    return evidencias.normalizar(re.sub(r"\(.*?\)", "", falante)) or evidencias.normalizar(falante)
+
+
+def _rotulo_falante(falante: str) -> str:
+    falante = ' '.join(falante.split())
+    return falante.title() if falante.isupper() else falante
+
+
+def _nucleo(palavra: str) -> str:
+    return palavra.strip(_PONTUACAO + "\"'").lower()
+
+
+def _limpar_fala(transcricao: str, inicio: int, fim: int, contagem: Dict[str, int]) -> List[Tuple[str, Sequence[int]]]:
+    """Palavras da fala sem muletas e repetições, cada uma com os offsets originais de seus caracteres"""
+    palavras: List[Tuple[str, Sequence[int]]] = []
+    matches = list(_RE_PALAVRA.finditer(transcricao, inicio, fim))
+    nucleo_anterior = ""
+    i = 0
+    while i < len(matches):
+        match = matches[i]
+        palavra = match.group()
+        nucleo = _nucleo(palavra)
+
+        removidas = 0
+        if not nucleo or (palavra[0] in "[(" and _RE_MARCACAO.match(palavra)):
+            removidas = 1
+        elif nucleo in PREENCHIMENTOS or _RE_ALONGADO.match(nucleo):
+            removidas = 1
+        elif nucleo == "é" and palavra.endswith(("...", "…")):
+            removidas = 1
+        elif nucleo == "tipo" and i + 1 < len(matches) and _nucleo(matches[i + 1].group()) == "assim":
+            removidas = 2
+        elif (nucleo == "tipo" and (not palavras or palavras[-1][0][-1] in _PONTUACAO)
+              and (i + 1 == len(matches) or _nucleo(matches[i + 1].group()) not in _APOS_TIPO_SUBSTANTIVO)):
+            # "tipo" abrindo a oração ("É, tipo, a gente..."); "qual o tipo de contrato" fica
+            removidas = 1
+        elif (nucleo == nucleo_anterior and nucleo.isalpha() and nucleo not in NEGACOES
+              and palavra[-1] not in _PONTUACAO and palavras[-1][0][-1] not in _PONTUACAO):
+            # Repetição em sequência sem pontuação em nenhuma das cópias ("eu eu vou")
+            removidas = 1
+
+        if not removidas:
+            palavras.append((palavra, range(match.start(), match.end())))
+            nucleo_anterior = nucleo
+            i += 1
+            continue
+
+        ultima = matches[i + removidas - 1]
+        final = ultima.group()
+        pontuacao = final[len(final.rstrip(_PONTUACAO)):]
+        contagem["preenchimentos"] += removidas
+        # "..., né?" → a pontuação final da muleta passa para a palavra anterior
+        if palavras and any(c in ".?!" for c in pontuacao) and not pontuacao.endswith(("..", "…")):
+            texto_anterior, offsets = palavras[-1]
+            base = texto_anterior.rstrip(",;:")
+            fim_pontuacao = ultima.end() - len(pontuacao)
+            palavras[-1] = (
+                base + pontuacao,
+                list(offsets[:len(base)]) + list(range(fim_pontuacao, ultima.end())),
+            )
+        i += removidas
+    return palavras
+
+
+def compactar(transcricao: str) -> TranscricaoCompacta:
+    """Compacta a transcrição preservando o mapa de offsets para o original"""
+    inicio_compactacao = time.perf_counter()
+    contagem = {"sistema": 0, "preenchimentos": 0, "duplicadas": 0, "turnos_unidos": 0}
+    turnos_por_linha = {t["inicio"]: t for t in evidencias.turnos(transcricao)}
+
+    rotulos: Dict[str, str] = {}
+    # Falante e fala da última linha, para descartar só a repetição imediata
+    linha_anterior: Optional[Tuple[Optional[str], str]] = None
+    # Depois de uma linha descartada, o próximo turno não é unido ao bloco anterior
+    quebra = False
+    # Blocos de fala: chave do falante, rótulo, timestamp, offset do turno e palavras
+    blocos: List[Dict] = []
+
+    for linha in re.finditer(r"[^\n]+", transcricao):
+        if not linha.group().strip():
+            continue
+        turno = turnos_por_linha.get(linha.start())
+        chave = _chave_falante(turno["falante"]) if turno else None
+        fala_linha = transcricao[turno["inicio_fala"]:linha.end()] if turno else linha.group()
+        if (_RE_SISTEMA.match(linha.group()) or chave in FALANTES_SISTEMA
+                or (not turno and _RE_EVENTO.fullmatch(fala_linha.strip()))):
+            contagem["sistema"] += 1
+            linha_anterior = None
+            quebra = True
+            continue
+
+        if turno:
+            rotulos.setdefault(chave, _rotulo_falante(turno["falante"]))
+            inicio_fala = turno["inicio_fala"]
+        else:
+            # Linha sem rótulo continua a fala do turno anterior
+            chave = blocos[-1]["chave"] if blocos else None
+            inicio_fala = linha.start()
+
+        palavras = _limpar_fala(transcricao, inicio_fala, linha.end(), contagem)
+        if not palavras:
+            continue
+        fala = ' '.join(_nucleo(p) for p, _ in palavras)
+        if linha_anterior == (chave, fala):
+            contagem["duplicadas"] += 1
+            quebra = True
+            continue
+        linha_anterior = (chave, fala)
+
+        if blocos and chave is not None and blocos[-1]["chave"] == chave and not quebra:
+            if turno:
+                contagem["turnos_unidos"] += 1
+            blocos[-1]["palavras"].extend(palavras)
+        else:
+            blocos.append({
+                "chave": chave,
+                "rotulo": rotulos.get(chave),
+                "timestamp": turno["timestamp"] if turno else None,
+                "inicio": linha.start(),
+                "palavras": palavras,
+            })
+        quebra = False
+
+    partes: List[str] = []
+    mapa: List[int] = []
+    for bloco in blocos:
+        if partes:
+            partes.append("\n")
+            mapa.append(mapa[-1])
+        if bloco["rotulo"]:
+            rotulo = (f"[{bloco['timestamp']}] " if bloco["timestamp"] else "") + bloco["rotulo"] + ": "
+            partes.append(rotulo)
+            mapa.extend([bloco["inicio"]] * len(rotulo))
+        for j, (palavra, offsets) in enumerate(bloco["palavras"]):
+            if j:
+                partes.append(" ")
+                mapa.append(mapa[-1])
+            partes.append(palavra)
+            mapa.extend(offsets)
+    texto = ''.join(partes)
+
+    tokens_original = limitador.estimar_tokens(transcricao)
+    tokens_compacto = limitador.estimar_tokens(texto)
+    estatisticas = {
+        **contagem,
+        "caracteres_original": len(transcricao),
+        "caracteres_compacto": len(texto),
+        "tokens_original": tokens_original,
+        "tokens_compacto": tokens_compacto,
+        "reducao": 1 - tokens_compacto / tokens_original if tokens_original else 0.0,
+        "tempo_ms": (time.perf_counter() - inicio_compactacao) * 1000,
+    }
+    return TranscricaoCompacta(transcricao, texto, mapa, estatisticas)
+
+
+def economia(estatisticas: Dict, prompts: int, preco_entrada: Optional[float] = None) -> Dict:
+    """Tokens, latência de prefill e custo de entrada economizados nos prompts de uma análise"""
+    tokens = (estatisticas["tokens_original"] - estatisticas["tokens_compacto"]) * prompts
+    return {
+        "tokens": tokens,
+        "segundos": tokens / PREFILL_TOKENS_POR_SEGUNDO - estatisticas["tempo_ms"] / 1000,
+        "custo": tokens * preco_entrada / 1_000_000 if preco_entrada else None,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        compacta = compactar(f.read())
+    e = compacta.estatisticas
+    print(f"Caracteres: {e['caracteres_original']:,} → {e['caracteres_compacto']:,}")
+    print(f"Tokens (estimados): {e['tokens_original']:,} → {e['tokens_compacto']:,} (-{e['reducao']:.0%})")
+    print(f"Removidos: {e['preenchimentos']} muletas, {e['duplicadas']} falas repetidas, "
+          f"{e['sistema']} linhas de sistema; {e['turnos_unidos']} turnos unidos")
+    print(f"Compactação: {e['tempo_ms']:.1f} ms; prefill economizado em 2 prompts: "
+          f"~{economia(e, 2)['segundos']:.2f} s")
+    if len(sys.argv) == 3:
+        with open(sys.argv[2], "w", encoding="utf-8") as f:
+            f.write(compacta.texto)
@@ -0,0 +1,378 @@
+"""
+Embeddings locais (CPU, determinísticos) e índice local da base de conhecimento.
+
+Usados quando a API de embeddings da OpenAI não está disponível e nos
+testes. O texto vira um vetor TF-IDF de termos, bigramas e 4-gramas de
+caracteres projetado por hashing com sinal (projeção aleatória esparsa)
+para uma dimensão fixa e normalizado em L2. O índice local guarda a matriz
+dos documentos em numpy, opcionalmente quantizada em int8 ou em 1 bit por
+dimensão, e responde buscas por produto interno.
+
+Uso:
+    python embeddings_locais.py indexar         # baixa a coleção do AstraDB e grava o índice local
+    python embeddings_locais.py avaliar [transcricao.txt ...]         # recall@k do índice local contra os embeddings da OpenAI
+    python embeddings_locais.py representacoes [transcricao.txt ...]  # recall@k x tamanho por dimensão e quantização
+
+Com transcrições, as consultas de avaliação são as mesmas da produção
+(recuperacao.gerar_consultas: uma por etapa da jornada e por objeção). Sem
+elas, usa trechos dos próprios documentos, o que mede só autorrecuperação e
+favorece o índice léxico local.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+DIMENSAO_LOCAL = int(os.getenv('DIMENSAO_EMBEDDING_LOCAL', '1024'))
+CAMINHO_INDICE_LOCAL = os.getenv('INDICE_LOCAL_PATH', os.path.join('dados', 'indice_local'))
+QUANTIZACAO_LOCAL = os.getenv('QUANTIZACAO_EMBEDDING_LOCAL', 'float32')
+
+QUANTIZACOES = ("float32", "int8", "binario")
+
+# Espaço de hashing onde as frequências de documento (IDF) são contadas
+_ESPACO_IDF = 1 << 20
+
+# Pesos relativos de cada família de atributos
+_PESOS_FAMILIA = {"t": 1.0, "b": 0.7, "c": 0.35}
+
+_STOPWORDS = frozenset("""
+a o as os de da do das dos e em no na nos nas um uma uns umas para pra por com que se ao aos
+ate sobre sua seu suas seus ele ela eles elas eu voce voces nos mas ou como mais muito ja nao sim
+isso esse essa este esta estao tem ter foi ser sao era the of and to in is for on
+""".split())
+
+
+def _tokens(texto: str) -> List[str]:
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return [t for t in re.findall(r'\w+', texto) if t not in _STOPWORDS and len(t) > 1]
+
+
+def _atributos(texto: str) -> Counter:
+    """Contagem dos atributos do texto: termos (t:), bigramas (b:) e 4-gramas de caracteres (c:)"""
+    tokens = _tokens(texto)
+    atributos = Counter()
+    for t in tokens:
+        atributos[f"t:{t}"] += 1
+        marcado = f"<{t}>"
+        for i in range(max(1, len(marcado) - 3)):
+            atributos[f"c:{marcado[i:i + 4]}"] += 1
+    for a, b in zip(tokens, tokens[1:]):
+        atributos[f"b:{a} {b}"] += 1
+    return atributos
+
+
+def _hash(atributo: str) -> int:
+    return int.from_bytes(hashlib.blake2b(atributo.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class EmbeddingLocal:
+    """Embedding por hashing com sinal de atributos TF-IDF"""
+
+    def __init__(self, dimensao: int = DIMENSAO_LOCAL, idf: Optional[np.ndarray] = None):
+        self.dimensao = dimensao
+        self.idf = idf
+
+    def ajustar(self, textos: Iterable[str]) -> "EmbeddingLocal":
+        """Calcula o IDF a partir do corpus da base de conhecimento"""
+        df = np.zeros(_ESPACO_IDF, dtype=np.float32)
+        total = 0
+        for texto in textos:
+            total += 1
+            for atributo in _atributos(texto):
+                df[_hash(atributo) % _ESPACO_IDF] += 1
+        self.idf = np.log((1 + total) / (1 + df)).astype(np.float32) + 1
+        return self
+
+    def vetor(self, texto: str) -> np.ndarray:
+        vetor = np.zeros(self.dimensao, dtype=np.float32)
+        atributos = _atributos(texto)
+        if not atributos:
+            return vetor
+        hashes = np.fromiter((_hash(a) for a in atributos), dtype=np.uint64, count=len(atributos))
+        # TF sublinear ponderado pela família do atributo
+        pesos = 1 + np.log(np.fromiter(atributos.values(), dtype=np.float32, count=len(atributos)))
+        pesos *= np.fromiter((_PESOS_FAMILIA[a[0]] for a in atributos), dtype=np.float32, count=len(atributos))
+        if self.idf is not None:
+            pesos *= self.idf[hashes % np.uint64(_ESPACO_IDF)]
+        # O bit mais alto define o sinal: colisões se cancelam em média
+        sinais = np.where(hashes >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+        np.add.at(vetor, hashes % np.uint64(self.dimensao), sinais * pesos)
+        norma = np.linalg.norm(vetor)
+        return vetor / norma if norma else vetor
+
+    def vetores(self, textos: List[str]) -> np.ndarray:
+        return np.vstack([self.vetor(t) for t in textos]) if textos else np.zeros((0, self.dimensao), np.float32)
+
+
+def texto_documento(doc: Dict) -> str:
+    """Texto de um documento da coleção, ignorando vetores e metadados internos"""
+    for campo in ("content", "text", "texto", "conteudo", "$vectorize", "page_content"):
+        if isinstance(doc.get(campo), str) and doc[campo].strip():
+            return doc[campo]
+    return ' '.join(str(v) for k, v in doc.items() if not k.startswith('$') and k != '_id')
+
+
+class MatrizQuantizada:
+    """
+    Vetores normalizados guardados em float32, int8 (escala por vetor, 4x
+    menor) ou binário (sinal de cada dimensão, 32x menor).
+    """
+
+    def __init__(self, modo: str, dados: np.ndarray, dimensao: int, escalas: Optional[np.ndarray] = None):
+        if modo not in QUANTIZACOES:
+            raise ValueError(f"Quantização inválida: {modo}")
+        self.modo = modo
+        self.dados = dados
+        self.dimensao = dimensao
+        self.escalas = escalas
+
+    @classmethod
+    def quantizar(cls, matriz: np.ndarray, modo: str = "float32") -> "MatrizQuantizada":
+        matriz = np.asarray(matriz, dtype=np.float32)
+        dimensao = matriz.shape[1]
+        if modo == "int8":
+            escalas = np.abs(matriz).max(axis=1) / 127
+            escalas[escalas == 0] = 1
+            dados = np.round(matriz / escalas[:, None]).astype(np.int8)
+            return cls(modo, dados, dimensao, escalas.astype(np.float32))
+        if modo == "binario":
+            return cls(modo, np.packbits(matriz > 0, axis=1), dimensao)
+        return cls(modo, matriz, dimensao)
+
+    def __len__(self) -> int:
+        return self.dados.shape[0]
+
+    @property
+    def bytes_por_vetor(self) -> float:
+        extra = self.escalas.itemsize if self.escalas is not None else 0
+        return self.dados.shape[1] * self.dados.itemsize + extra
+
+    def scores(self, vetor: np.ndarray) -> np.ndarray:
+        """Similaridade (aprox. cosseno) de cada vetor guardado com o vetor de consulta"""
+        if self.modo == "int8":
+            return (self.dados @ vetor.astype(np.float32)) * self.escalas
+        if self.modo == "binario":
+            # Similaridade de Hamming entre os sinais, na escala [-1, 1]
+            bits = np.packbits(vetor > 0)
+            distancias = np.bitwise_count(self.dados ^ bits).sum(axis=1, dtype=np.int32)
+            return 1 - 2 * distancias.astype(np.float32) / self.dimensao
+        return self.dados @ vetor
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {"matriz": self.dados}
+        if self.escalas is not None:
+            arrays["escalas"] = self.escalas
+        return arrays
+
+
+class IndiceLocal:
+    """Índice vetorial em memória da base de conhecimento"""
+
+    def __init__(self, embedding: EmbeddingLocal, documentos: List[Dict], matriz: MatrizQuantizada):
+        self.embedding = embedding
+        self.documentos = documentos
+        self.matriz = matriz
+
+    @classmethod
+    def construir(cls, documentos: List[Dict], dimensao: int = DIMENSAO_LOCAL,
+                  quantizacao: str = QUANTIZACAO_LOCAL) -> "IndiceLocal":
+        documentos = [{k: v for k, v in doc.items() if k != '$vector'} for doc in documentos]
+        textos = [texto_documento(doc) for doc in documentos]
+        embedding = EmbeddingLocal(dimensao).ajustar(textos)
+        return cls(embedding, documentos, MatrizQuantizada.quantizar(embedding.vetores(textos), quantizacao))
+
+    def buscar(self, texto: str, limit: int = 6) -> List[Dict]:
+        """Documentos mais similares ao texto, no mesmo formato da busca do AstraDB"""
+        if not self.documentos:
+            return []
+        scores = self.matriz.scores(self.embedding.vetor(texto))
+        limit = min(limit, len(scores))
+        melhores = np.argpartition(-scores, limit - 1)[:limit]
+        melhores = melhores[np.argsort(-scores[melhores])]
+        return [{**self.documentos[i], "$similarity": float(scores[i])} for i in melhores]
+
+    def salvar(self, caminho: str = CAMINHO_INDICE_LOCAL):
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        np.savez_compressed(f"{caminho}.npz", idf=self.embedding.idf, **self.matriz.arrays())
+        with open(f"{caminho}.json", 'w', encoding='utf-8') as f:
+            json.dump({"dimensao": self.embedding.dimensao, "quantizacao": self.matriz.modo,
+                       "documentos": self.documentos}, f, ensure_ascii=False)
+
+    @classmethod
+    def carregar(cls, caminho: str = CAMINHO_INDICE_LOCAL) -> Optional["IndiceLocal"]:
+        try:
+            with open(f"{caminho}.json", encoding='utf-8') as f:
+                meta = json.load(f)
+            arrays = np.load(f"{caminho}.npz")
+        except (OSError, ValueError):
+            return None
+        embedding = EmbeddingLocal(meta["dimensao"], arrays["idf"])
+        matriz = MatrizQuantizada(meta.get("quantizacao", "float32"), arrays["matriz"], meta["dimensao"],
+                                  arrays["escalas"] if "escalas" in arrays else None)
+        return cls(embedding, meta["documentos"], matriz)
+
+
+_indice_padrao: Optional[IndiceLocal] = None
+_indice_carregado = False
+
+
+def obter_indice_local() -> Optional[IndiceLocal]:
+    """Índice local padrão do processo, carregado do disco na primeira chamada"""
+    global _indice_padrao, _indice_carregado
+    if not _indice_carregado:
+        _indice_padrao = IndiceLocal.carregar()
+        _indice_carregado = True
+    return _indice_padrao
+
+
+def avaliar_recall(documentos: List[Dict], consultas: List[str], vetores_consultas: np.ndarray,
+                   k: int = 5, dimensao: int = DIMENSAO_LOCAL, quantizacao: str = "float32") -> Dict:
+    """
+    Recall@k do índice local tomando como referência o top-k dos embeddings da
+    OpenAI (documentos com "$vector" e vetores das consultas no mesmo espaço).
+    """
+    referencia = np.array([doc["$vector"] for doc in documentos], dtype=np.float32)
+    referencia /= np.linalg.norm(referencia, axis=1, keepdims=True)
+    vetores_consultas = vetores_consultas / np.linalg.norm(vetores_consultas, axis=1, keepdims=True)
+
+    inicio = time.perf_counter()
+    indice = IndiceLocal.construir(documentos, dimensao, quantizacao)
+    tempo_indexacao = time.perf_counter() - inicio
+
+    acertos, tempo_busca = 0, 0.0
+    for consulta, vetor in zip(consultas, vetores_consultas):
+        esperado = set(np.argsort(-(referencia @ vetor))[:k].tolist())
+        inicio = time.perf_counter()
+        scores = indice.matriz.scores(indice.embedding.vetor(consulta))
+        tempo_busca += time.perf_counter() - inicio
+        acertos += len(esperado & set(np.argsort(-scores)[:k].tolist()))
+    return {
+        "documentos": len(documentos),
+        "consultas": len(consultas),
+        "k": k,
+        "dimensao": dimensao,
+        "quantizacao": quantizacao,
+        "recall": acertos / (k * len(consultas)) if consultas else 0.0,
+        "indexacao_ms": tempo_indexacao * 1000,
+        "busca_ms_por_consulta": tempo_busca * 1000 / max(len(consultas), 1),
+    }
+
+
+def truncar(vetores: np.ndarray, dimensao: int) -> np.ndarray:
+    """
+    Primeiras `dimensao` coordenadas renormalizadas: equivale ao parâmetro
+    `dimensions` dos modelos text-embedding-3, treinados para esse corte.
+    """
+    vetores = np.asarray(vetores, dtype=np.float32)[:, :dimensao]
+    normas = np.linalg.norm(vetores, axis=1, keepdims=True)
+    normas[normas == 0] = 1
+    return vetores / normas
+
+
+def avaliar_representacoes(vetores_documentos: np.ndarray, vetores_consultas: np.ndarray, k: int = 5,
+                           dimensoes: Iterable[int] = (1536, 1024, 512, 256),
+                           quantizacoes: Iterable[str] = QUANTIZACOES) -> List[Dict]:
+    """
+    Recall@k e tamanho de cada combinação de dimensão e quantização, tomando
+    como referência o top-k dos vetores completos em float32.
+    """
+    referencia = truncar(vetores_documentos, vetores_documentos.shape[1])
+    consultas_completas = truncar(vetores_consultas, vetores_consultas.shape[1])
+    esperados = [set(np.argsort(-(referencia @ v))[:k].tolist()) for v in consultas_completas]
+
+    resultados = []
+    for dimensao in dimensoes:
+        if dimensao > vetores_documentos.shape[1]:
+            continue
+        documentos = truncar(vetores_documentos, dimensao)
+        consultas = truncar(vetores_consultas, dimensao)
+        for quantizacao in quantizacoes:
+            matriz = MatrizQuantizada.quantizar(documentos, quantizacao)
+            acertos, inicio = 0, time.perf_counter()
+            for vetor, esperado in zip(consultas, esperados):
+                acertos += len(esperado & set(np.argsort(-matriz.scores(vetor))[:k].tolist()))
+            resultados.append({
+                "dimensao": dimensao,
+                "quantizacao": quantizacao,
+                "bytes_por_vetor": matriz.bytes_por_vetor,
+                "recall": acertos / (k * len(esperados)) if esperados else 0.0,
+                "busca_ms_por_consulta": (time.perf_counter() - inicio) * 1000 / max(len(esperados), 1),
+            })
+    return resultados
+
+
+def _consultas_do_corpus(documentos: List[Dict], quantidade: int = 50, seed: int = 13) -> List[str]:
+    """Trechos dos próprios documentos usados como consultas (autorrecuperação)"""
+    rng = np.random.default_rng(seed)
+    consultas = []
+    for i in rng.choice(len(documentos), size=min(quantidade, len(documentos)), replace=False):
+        palavras = texto_documento(documentos[i]).split()
+        if len(palavras) < 8:
+            continue
+        inicio = int(rng.integers(0, max(1, len(palavras) - 30)))
+        consultas.append(' '.join(palavras[inicio:inicio + 30]))
+    return consultas
+
+
+def _consultas_avaliacao(documentos: List[Dict], caminhos: List[str]) -> Tuple[List[str], str]:
+    """Consultas de avaliação e a descrição de sua origem"""
+    if not caminhos:
+        return _consultas_do_corpus(documentos), "trechos do corpus (autorrecuperação; favorece o índice local)"
+    import recuperacao
+
+    consultas = []
+    for caminho in caminhos:
+        with open(caminho, encoding="utf-8") as f:
+            consultas.extend(c["texto"] for c in recuperacao.gerar_consultas(f.read()))
+    return consultas, f"consultas de produção de {len(caminhos)} transcrição(ões)"
+
+
+if __name__ == "__main__":
+    import cache_recuperacao
+    from base_conhecimento import ASTRA_DB_COLLECTION, AstraDBClient, embeddings_openai
+
+    comando = sys.argv[1] if len(sys.argv) > 1 else "avaliar"
+    incluir_vetor = comando in ("avaliar", "representacoes")
+    docs = AstraDBClient().listar_documentos(ASTRA_DB_COLLECTION, incluir_vetor=incluir_vetor)
+    print(f"{len(docs)} documentos na coleção {ASTRA_DB_COLLECTION}")
+
+    if comando == "indexar":
+        IndiceLocal.construir(docs).salvar()
+        # Coleção possivelmente reingerida: descarta os resultados em cache dos servidores
+        cache_recuperacao.marcar_reingestao()
+        print(f"Índice local gravado em {CAMINHO_INDICE_LOCAL}.npz/.json")
+    elif comando == "avaliar":
+        docs = [d for d in docs if d.get("$vector")]
+        consultas, origem = _consultas_avaliacao(docs, sys.argv[2:])
+        print(f"{len(consultas)} consultas: {origem}")
+        vetores = np.array(embeddings_openai(consultas), dtype=np.float32)
+        for dim in (512, 1024, 2048):
+            for quantizacao in QUANTIZACOES:
+                r = avaliar_recall(docs, consultas, vetores, k=5, dimensao=dim, quantizacao=quantizacao)
+                print(f"dim={dim} {quantizacao}: recall@5={r['recall']:.2%}, indexação {r['indexacao_ms']:.0f} ms, "
+                      f"busca {r['busca_ms_por_consulta']:.2f} ms/consulta")
+    elif comando == "representacoes":
+        from base_conhecimento import vetor_astra
+
+        docs = [d for d in docs if d.get("$vector")]
+        vetores_docs = np.array([d["$vector"] for d in docs], dtype=np.float32)
+        consultas, origem = _consultas_avaliacao(docs, sys.argv[2:])
+        print(f"{len(consultas)} consultas: {origem}")
+        vetores = np.array(embeddings_openai(consultas, dimensoes=None), dtype=np.float32)
+        print(f"{'dim':>5} {'quantização':<12} {'bytes/vetor':>11} {'recall@5':>9} {'busca':>10}  payload da busca (JSON / $binary)")
+        for r in avaliar_representacoes(vetores_docs, vetores, k=5):
+            exemplo = truncar(vetores[:1], r["dimensao"])[0].tolist()
+            payload_texto = len(json.dumps(exemplo))
+            payload_binario = len(json.dumps(vetor_astra(exemplo, binario=True)))
+            print(f"{r['dimensao']:>5} {r['quantizacao']:<12} {r['bytes_por_vetor']:>11.0f} {r['recall']:>9.2%} "
+                  f"{r['busca_ms_por_consulta']:>7.2f} ms  {payload_texto / 1024:.1f} KiB / {payload_binario / 1024:.1f} KiB")
+    else:
+        print(__doc__)
@@ -0,0 +1,286 @@
+"""
+Verificação das citações em "evidencia_transcricao".
+
+A transcrição é indexada uma única vez (texto normalizado com mapa de
+offsets + índice de bigramas de palavras). Cada citação é procurada primeiro
+de forma exata, em palavras inteiras, no texto normalizado e, se não for
+encontrada, por votação de bigramas seguida de alinhamento aproximado na
+janela candidata. Palavras da citação que ficam fora do alinhamento são
+listadas em "ausentes"; se entre elas houver uma negação, a citação inverte
+o sentido do trecho e o status é "divergente".
+"""
+import bisect
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+# Fração mínima de palavras da citação alinhadas para aceitar uma correspondência aproximada
+LIMIAR_APROXIMADA = 0.6
+
+# Número máximo de alinhamentos candidatos avaliados por citação
+MAX_CANDIDATOS = 5
+
+# Palavras (normalizadas) que, inseridas numa citação aproximada, invertem o sentido do trecho
+NEGACOES = frozenset({"nao", "nunca", "nem", "jamais", "sem", "nenhum", "nenhuma", "ninguem", "nada"})
+
+_RE_TURNO = re.compile(
+    r"^[ \t]*(?:\[?(?P<ts1>\d{1,2}:\d{2}(?::\d{2})?)\]?[ \t]*[-–]?[ \t]*)?"
+    r"(?P<falante>[^:\n\[\]]{1,60}?)"
+    r"(?:[ \t]*\(?(?P<ts2>\d{1,2}:\d{2}(?::\d{2})?)\)?)?[ \t]*:[ \t]",
+    re.MULTILINE,
+)
+
+# Campos do JSON de outputs que carregam evidências
+CAMPOS_COM_EVIDENCIA = ("acordos_combinados", "tasks", "entregaveis")
+
+_cache_caracteres: Dict[str, str] = {}
+
+
+def _normalizar_caractere(c: str) -> str:
+    """Minúscula sem acento; qualquer caractere não alfanumérico vira espaço"""
+    resultado = _cache_caracteres.get(c)
+    if resultado is None:
+        base = ''.join(x for x in unicodedata.normalize('NFKD', c) if not unicodedata.combining(x))
+        base = base.lower()
+        resultado = base if len(base) == 1 and base.isalnum() else ' '
+        _cache_caracteres[c] = resultado
+    return resultado
+
+
+def normalizar_com_mapa(texto: str) -> Tuple[str, List[int]]:
+    """
+    Normaliza o texto (sem acentos, minúsculo, sem pontuação, espaços colapsados)
+    e devolve o mapa de cada posição normalizada para a posição no original.
+    """
+    normalizado: List[str] = []
+    mapa: List[int] = []
+    espaco_pendente = False
+    for i, c in enumerate(texto):
+        n = _normalizar_caractere(c)
+        if n == ' ':
+            espaco_pendente = bool(normalizado)
+            continue
+        if espaco_pendente:
+            normalizado.append(' ')
+            mapa.append(i - 1)
+            espaco_pendente = False
+        normalizado.append(n)
+        mapa.append(i)
+    return ''.join(normalizado), mapa
+
+
+def turnos(transcricao: str) -> List[Dict]:
+    """Turnos de fala em ordem: falante, timestamp, início do turno e início da fala no original"""
+    return [{
+        "falante": match.group('falante').strip(),
+        "timestamp": match.group('ts1') or match.group('ts2'),
+        "inicio": match.start(),
+        "inicio_fala": match.end(),
+    } for match in _RE_TURNO.finditer(transcricao)]
+
+
+def normalizar(texto: str) -> str:
+    return normalizar_com_mapa(texto)[0]
+
+
+class IndiceTranscricao:
+    """
+    Índice de uma transcrição para localizar citações rapidamente. Com
+    `original` e `mapa_original` (transcrição compactada), as citações são
+    procuradas no texto indexado e os resultados referem-se ao original.
+    """
+
+    def __init__(self, transcricao: str, original: Optional[str] = None,
+                 mapa_original: Optional[List[int]] = None):
+        self.transcricao = transcricao if original is None else original
+        self._mapa_original = mapa_original
+        self.normalizado, self._mapa = normalizar_com_mapa(transcricao)
+        # Delimitado por espaços para a busca exata casar só palavras inteiras
+        self._normalizado_delimitado = f" {self.normalizado} "
+
+        # Tokens do texto normalizado e seus offsets
+        self._tokens: List[str] = []
+        self._inicios: List[int] = []
+        for match in re.finditer(r'\S+', self.normalizado):
+            self._tokens.append(match.group())
+            self._inicios.append(match.start())
+
+        self._bigramas: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        for i in range(len(self._tokens) - 1):
+            self._bigramas[(self._tokens[i], self._tokens[i + 1])].append(i)
+
+        # Turnos (falante e timestamp) ordenados por offset no original
+        self._turnos = turnos(self.transcricao)
+        self._turnos_inicio: List[int] = [t["inicio"] for t in self._turnos]
+
+    def _offset_original(self, pos_normalizada: int, fim: bool = False) -> int:
+        if not self._mapa:
+            return 0
+        pos = min(pos_normalizada, len(self._mapa) - 1)
+        return self._mapa[pos] + (1 if fim else 0)
+
+    def turno_em(self, offset: int) -> Dict:
+        """Falante e timestamp do turno que contém o offset do texto original"""
+        i = bisect.bisect_right(self._turnos_inicio, offset) - 1
+        if i < 0:
+            return {"falante": None, "timestamp": None}
+        return self._turnos[i]
+
+    def _resultado(self, status: str, score: float, ini_norm: int, fim_norm: int,
+                   ausentes: Optional[List[str]] = None) -> Dict:
+        inicio = self._offset_original(ini_norm)
+        fim = self._offset_original(fim_norm - 1, fim=True)
+        if self._mapa_original:
+            inicio = self._mapa_original[inicio]
+            fim = self._mapa_original[fim - 1] + 1
+        turno = self.turno_em(inicio)
+        return {
+            "status": status,
+            "score": round(score, 3),
+            "inicio": inicio,
+            "fim": fim,
+            "trecho": self.transcricao[inicio:fim],
+            "falante": turno["falante"],
+            "timestamp": turno["timestamp"],
+            "ausentes": ausentes or [],
+        }
+
+    def _busca_aproximada(self, tokens_citacao: List[str]) -> Optional[Dict]:
+        # Cada bigrama em comum vota no alinhamento (início da citação na transcrição)
+        votos: Dict[int, int] = defaultdict(int)
+        for j in range(len(tokens_citacao) - 1):
+            for pos in self._bigramas.get((tokens_citacao[j], tokens_citacao[j + 1]), ()):
+                votos[pos - j] += 1
+        if not votos:
+            return None
+
+        n = len(tokens_citacao)
+        melhor = None
+        for alinhamento, _ in sorted(votos.items(), key=lambda kv: -kv[1])[:MAX_CANDIDATOS]:
+            ini = max(0, alinhamento - n // 4)
+            fim = min(len(self._tokens), alinhamento + n + n // 4)
+            janela = self._tokens[ini:fim]
+            matcher = SequenceMatcher(None, tokens_citacao, janela, autojunk=False)
+            blocos = [b for b in matcher.get_matching_blocks() if b.size]
+            if not blocos:
+                continue
+            score = sum(b.size for b in blocos) / n
+            if melhor is None or score > melhor[0]:
+                primeiro = ini + blocos[0].b
+                ultimo = ini + blocos[-1].b + blocos[-1].size - 1
+                alinhados = {b.a + k for b in blocos for k in range(b.size)}
+                ausentes = [t for k, t in enumerate(tokens_citacao) if k not in alinhados]
+                melhor = (score, primeiro, ultimo, ausentes)
+
+        if melhor is None or melhor[0] < LIMIAR_APROXIMADA:
+            return None
+        score, primeiro, ultimo, ausentes = melhor
+        fim_norm = self._inicios[ultimo] + len(self._tokens[ultimo])
+        # Uma negação que não está no trecho inverte o que foi dito
+        status = "divergente" if NEGACOES.intersection(ausentes) else "aproximada"
+        return self._resultado(status, score, self._inicios[primeiro], fim_norm, ausentes)
+
+    def localizar(self, citacao: str) -> Dict:
+        """Localiza uma citação na transcrição; status exata, aproximada, divergente ou nao_encontrada"""
+        citacao_norm = normalizar(citacao or '')
+        if citacao_norm:
+            # Com os espaços, a posição no texto delimitado é a do início da citação no normalizado
+            pos = self._normalizado_delimitado.find(f" {citacao_norm} ")
+            if pos >= 0:
+                return self._resultado("exata", 1.0, pos, pos + len(citacao_norm))
+
+            tokens = citacao_norm.split()
+            if len(tokens) >= 2:
+                aproximada = self._busca_aproximada(tokens)
+                if aproximada:
+                    return aproximada
+
+        return {
+            "status": "nao_encontrada",
+            "score": 0.0,
+            "inicio": None,
+            "fim": None,
+            "trecho": None,
+            "falante": None,
+            "timestamp": None,
+            "ausentes": [],
+        }
+
+
+def verificar_evidencias(outputs_json: Dict, transcricao: str,
+                         indice: Optional[IndiceTranscricao] = None) -> Dict:
+    """
+    Verifica as evidências de acordos, tasks e entregáveis, anexando o
+    resultado em "verificacao_evidencia" de cada item. Retorna um resumo.
+    """
+    indice = indice or IndiceTranscricao(transcricao)
+    resumo = {"exata": 0, "aproximada": 0, "divergente": 0, "nao_encontrada": 0, "sem_evidencia": 0}
+    for campo in CAMPOS_COM_EVIDENCIA:
+        for item in outputs_json.get(campo, []) or []:
+            if not isinstance(item, dict):
+                continue
+            evidencia = item.get("evidencia_transcricao")
+            if not evidencia:
+                resumo["sem_evidencia"] += 1
+                continue
+            verificacao = indice.localizar(evidencia)
+            item["verificacao_evidencia"] = verificacao
+            resumo[verificacao["status"]] += 1
+    return resumo
+
+
+def _benchmark(tamanho: int = 200_000, citacoes: int = 60):
+    """Mede indexação e localização em uma transcrição sintética"""
+    import random
+
+    rng = random.Random(42)
+    vocabulario = [
+        "proposta", "contrato", "prazo", "orçamento", "diretoria", "aprovação", "piloto",
+        "integração", "equipe", "sistema", "custo", "implantação", "semana", "próxima",
+        "reunião", "você", "nós", "então", "cliente", "produto", "valor", "retorno",
+        "investimento", "decisão", "jurídico", "segurança", "dados", "licença", "suporte",
+    ]
+    falantes = ["Vendedor", "Cliente", "Diretora Financeira", "CTO"]
+    linhas, total, segundos = [], 0, 0
+    while total < tamanho:
+        segundos += rng.randint(3, 40)
+        fala = ' '.join(rng.choice(vocabulario) for _ in range(rng.randint(8, 40))).capitalize() + '.'
+        linha = f"[{segundos // 3600:02d}:{segundos // 60 % 60:02d}:{segundos % 60:02d}] {rng.choice(falantes)}: {fala}"
+        linhas.append(linha)
+        total += len(linha) + 1
+    transcricao = '\n'.join(linhas)
+
+    amostras = []
+    for i in range(citacoes):
+        linha = rng.choice(linhas).split(': ', 1)[1]
+        palavras = linha.split()
+        trecho = palavras[:rng.randint(6, len(palavras))]
+        if i % 3 == 1:
+            # Citação parafraseada: troca e remove algumas palavras
+            trecho = [p for k, p in enumerate(trecho) if k % 5 != 2]
+        elif i % 3 == 2:
+            trecho = [rng.choice(["inventado", "fictício", "nunca", "dito"]) for _ in trecho]
+        amostras.append(' '.join(trecho))
+
+    inicio = time.perf_counter()
+    indice = IndiceTranscricao(transcricao)
+    tempo_indice = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultados = [indice.localizar(c) for c in amostras]
+    tempo_busca = time.perf_counter() - inicio
+
+    contagem = defaultdict(int)
+    for r in resultados:
+        contagem[r["status"]] += 1
+    print(f"Transcrição: {len(transcricao):,} caracteres, {len(linhas):,} turnos")
+    print(f"Indexação: {tempo_indice * 1000:.1f} ms")
+    print(f"{citacoes} citações: {tempo_busca * 1000:.1f} ms ({tempo_busca * 1000 / citacoes:.2f} ms/citação)")
+    print(f"Resultados: {dict(contagem)}")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,422 @@
+"""
+Exportação da análise em DOCX, XLSX, PPTX e JSON.
+
+Os arquivos só são gerados quando o usuário clica no botão de download: cada
+formato expõe um gerador sem argumentos (aceito pelo `data` do
+st.download_button) que escreve o arquivo em partes num buffer binário. A
+transcrição é percorrida linha a linha e o JSON é codificado
+incrementalmente, sem montar cópias completas em strings intermediárias.
+
+Uso:
+    python exportacao.py <resultados.json> <transcricao.txt>   # mede tempo e tamanho de cada formato
+"""
+import datetime
+import io
+import json
+import re
+import sys
+import time
+from typing import IO, Callable, Dict, Iterator, List, Optional
+
+# Tamanho das partes escritas no arquivo ao codificar o JSON
+TAMANHO_PARTE = 64 * 1024
+
+# Linhas da transcrição agrupadas em cada parágrafo do DOCX
+LINHAS_POR_PARAGRAFO = 40
+
+ROTULOS_STATUS_EVIDENCIA = {
+    "exata": "Localizada",
+    "aproximada": "Aproximada",
+    "divergente": "Diverge da transcrição",
+    "nao_encontrada": "Não localizada",
+}
+
+
+def _linhas(texto: str) -> Iterator[str]:
+    """Linhas do texto sem criar a lista completa (splitlines duplicaria a transcrição)"""
+    inicio = 0
+    while inicio < len(texto):
+        fim = texto.find("\n", inicio)
+        if fim == -1:
+            fim = len(texto)
+        yield texto[inicio:fim].rstrip("\r")
+        inicio = fim + 1
+
+
+def _sem_markdown(texto: str) -> str:
+    return re.sub(r"\*\*|__|`", "", texto)
+
+
+def _status_evidencia(item: Dict) -> str:
+    verificacao = item.get("verificacao_evidencia") or {}
+    return ROTULOS_STATUS_EVIDENCIA.get(verificacao.get("status"), "Sem evidência")
+
+
+def _lista(valor) -> str:
+    if isinstance(valor, list):
+        return ", ".join(str(v) for v in valor if v)
+    return str(valor or "")
+
+
+def _celula(valor) -> str:
+    """Valor de célula de tabela; null do JSON vira célula vazia, pessoas e listas viram texto"""
+    if isinstance(valor, dict):
+        return _pessoa(valor)
+    if isinstance(valor, list):
+        return _lista(valor)
+    return str(valor) if valor is not None else ""
+
+
+def _valor_planilha(valor):
+    """Números ficam numéricos na planilha; o resto passa por _celula"""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return valor
+    return _celula(valor)
+
+
+def _numero(valor) -> Optional[float]:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _pessoa(valor) -> str:
+    if isinstance(valor, dict):
+        return " - ".join(str(valor[k]) for k in ("nome", "cargo") if valor.get(k))
+    return str(valor or "")
+
+
+def _data_geracao() -> str:
+    return datetime.datetime.now().strftime("%d/%m/%Y %H:%M")
+
+
+# --- JSON ---
+
+def gerar_json(resultados: Dict, transcricao: str) -> IO[bytes]:
+    """JSON compacto com a análise, os outputs estruturados e a transcrição"""
+    documento = {
+        "gerado_em": datetime.datetime.now().isoformat(timespec="seconds"),
+        "perfil": resultados.get("perfil"),
+        "analise_principal": resultados.get("analise_principal", ""),
+        "outputs": resultados.get("outputs_json", {}),
+        "verificacao_evidencias": resultados.get("verificacao_evidencias", {}),
+        "transcricao": transcricao,
+    }
+    arquivo = io.BytesIO()
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+    buffer: List[str] = []
+    tamanho = 0
+    for parte in encoder.iterencode(documento):
+        buffer.append(parte)
+        tamanho += len(parte)
+        if tamanho >= TAMANHO_PARTE:
+            arquivo.write("".join(buffer).encode("utf-8"))
+            buffer, tamanho = [], 0
+    arquivo.write("".join(buffer).encode("utf-8"))
+    arquivo.seek(0)
+    return arquivo
+
+
+# --- DOCX ---
+
+def _markdown_docx(documento, texto: str):
+    """Converte o markdown da análise em títulos, listas e parágrafos do Word"""
+    for linha in _linhas(texto):
+        linha = linha.strip()
+        if not linha or linha == "---":
+            continue
+        titulo = re.match(r"^(#{1,6})\s+(.*)", linha)
+        if titulo:
+            documento.add_heading(_sem_markdown(titulo.group(2)), level=min(len(titulo.group(1)) + 1, 4))
+        elif re.match(r"^[-*•]\s+", linha):
+            documento.add_paragraph(_sem_markdown(linha[2:].strip()), style="List Bullet")
+        elif re.match(r"^\d+[.)]\s+", linha):
+            documento.add_paragraph(_sem_markdown(re.sub(r"^\d+[.)]\s+", "", linha)), style="List Number")
+        else:
+            documento.add_paragraph(_sem_markdown(linha))
+
+
+def _tabela_docx(documento, cabecalho: List[str], linhas: List[List[str]]):
+    tabela = documento.add_table(rows=1, cols=len(cabecalho))
+    tabela.style = "Light Grid Accent 1"
+    for celula, texto in zip(tabela.rows[0].cells, cabecalho):
+        celula.text = texto
+    for linha in linhas:
+        for celula, texto in zip(tabela.add_row().cells, linha):
+            celula.text = texto
+
+
+def gerar_docx(resultados: Dict, transcricao: str) -> IO[bytes]:
+    """Relatório em Word: análise, acordos, tasks, entregáveis, próximos passos e transcrição"""
+    from docx import Document
+
+    outputs = resultados.get("outputs_json") or {}
+    documento = Document()
+    documento.add_heading("Análise de Reunião de Vendas", level=0)
+    documento.add_paragraph(f"Gerado em {_data_geracao()}")
+
+    if resultados.get("analise_principal"):
+        documento.add_heading("Análise principal", level=1)
+        _markdown_docx(documento, resultados["analise_principal"])
+
+    participantes = (outputs.get("analise_quantitativa") or {}).get("participantes") or []
+    if participantes:
+        documento.add_heading("Participação", level=1)
+        _tabela_docx(
+            documento,
+            ["Participante", "Papel", "Tempo de fala (s)", "Falas", "Perguntas", "Objeções"],
+            [[
+                _celula(p.get("nome")), _celula(p.get("papel")),
+                _celula((p.get("metricas") or {}).get("tempo_fala_segundos")),
+                _celula((p.get("metricas") or {}).get("numero_falas")),
+                _celula((p.get("metricas") or {}).get("perguntas_feitas")),
+                _celula((p.get("metricas") or {}).get("objeções_levantadas")),
+            ] for p in participantes]
+        )
+
+    if outputs.get("acordos_combinados"):
+        documento.add_heading("Acordos", level=1)
+        _tabela_docx(
+            documento,
+            ["Acordo", "Partes", "Condições", "Status", "Evidência"],
+            [[_celula(a.get("descricao")), _lista(a.get("partes_envolvidas")), _celula(a.get("condicoes")),
+              _celula(a.get("status")), _status_evidencia(a)] for a in outputs["acordos_combinados"]]
+        )
+
+    if outputs.get("tasks"):
+        documento.add_heading("Tasks", level=1)
+        _tabela_docx(
+            documento,
+            ["Task", "Responsável", "Prazo", "Prioridade", "Status", "Evidência"],
+            [[_celula(t.get("descricao")), _pessoa(t.get("responsavel")), _celula(t.get("prazo")),
+              _celula(t.get("prioridade")), _celula(t.get("status")), _status_evidencia(t)] for t in outputs["tasks"]]
+        )
+
+    if outputs.get("entregaveis"):
+        documento.add_heading("Entregáveis", level=1)
+        _tabela_docx(
+            documento,
+            ["Entregável", "Responsável", "Formato", "Prazo", "Destinatário", "Evidência"],
+            [[_celula(e.get("nome")), _pessoa(e.get("responsavel_entrega")), _celula(e.get("formato_esperado")),
+              _celula(e.get("prazo")), _celula(e.get("destinatario")), _status_evidencia(e)]
+             for e in outputs["entregaveis"]]
+        )
+
+    proximos_passos = outputs.get("proximos_passos") or {}
+    if proximos_passos:
+        documento.add_heading("Próximos passos", level=1)
+        for chave, titulo in (("acoes_imediatas", "Ações imediatas"),
+                              ("preparativos_proxima_reuniao", "Preparativos"),
+                              ("agenda_sugerida", "Agenda sugerida"),
+                              ("objetivos_proxima_reuniao", "Objetivos")):
+            if proximos_passos.get(chave):
+                documento.add_heading(titulo, level=2)
+                for item in proximos_passos[chave]:
+                    documento.add_paragraph(_celula(item), style="List Bullet")
+        if proximos_passos.get("data_sugerida"):
+            documento.add_paragraph(f"Data sugerida: {proximos_passos['data_sugerida']}")
+
+    documento.add_page_break()
+    documento.add_heading("Transcrição", level=1)
+    # Blocos de linhas com quebras em vez de um parágrafo por linha: cada
+    # add_paragraph percorre o corpo do documento e fica quadrático em transcrições longas
+    paragrafo, linhas_no_bloco = None, 0
+    for linha in _linhas(transcricao):
+        if not linha.strip():
+            continue
+        if paragrafo is None or linhas_no_bloco == LINHAS_POR_PARAGRAFO:
+            paragrafo, linhas_no_bloco = documento.add_paragraph(), 0
+        else:
+            paragrafo.add_run().add_break()
+        paragrafo.add_run(linha)
+        linhas_no_bloco += 1
+
+    arquivo = io.BytesIO()
+    documento.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+# --- XLSX ---
+
+def _planilha(workbook, nome: str, cabecalho: List[str], linhas: Iterator[List], formato_cabecalho):
+    """Escreve uma aba linha a linha (compatível com o modo de memória constante)"""
+    aba = workbook.add_worksheet(nome)
+    aba.write_row(0, 0, cabecalho, formato_cabecalho)
+    for i, linha in enumerate(linhas, start=1):
+        aba.write_row(i, 0, linha)
+    aba.set_column(0, len(cabecalho) - 1, 22)
+    aba.freeze_panes(1, 0)
+
+
+def gerar_xlsx(resultados: Dict, transcricao: str) -> IO[bytes]:
+    """Planilha com tasks, entregáveis, acordos e métricas por participante"""
+    import xlsxwriter
+
+    outputs = resultados.get("outputs_json") or {}
+    arquivo = io.BytesIO()
+    # constant_memory grava cada linha assim que a próxima começa, sem manter a aba inteira
+    workbook = xlsxwriter.Workbook(arquivo, {"constant_memory": True, "strings_to_urls": False})
+    cabecalho = workbook.add_format({"bold": True, "bg_color": "#DDE7F5"})
+
+    _planilha(workbook, "Tasks", [
+        "Descrição", "Responsável", "Prazo", "Prioridade", "Status", "Entrega final",
+        "Reportar para", "Ferramentas", "Dependências", "Evidência", "Verificação",
+    ], ([
+        _celula(t.get("descricao")), _pessoa(t.get("responsavel")), _celula(t.get("prazo")),
+        _celula(t.get("prioridade")), _celula(t.get("status")), _celula(t.get("entrega_final")),
+        _pessoa(t.get("reportar_para")), _lista(t.get("ferramentas_necessarias")), _lista(t.get("dependencias")),
+        _celula(t.get("evidencia_transcricao")), _status_evidencia(t),
+    ] for t in outputs.get("tasks") or []), cabecalho)
+
+    _planilha(workbook, "Entregáveis", [
+        "Nome", "Descrição", "Responsável", "Formato", "Prazo", "Destinatário", "Status", "Evidência", "Verificação",
+    ], ([
+        _celula(e.get("nome")), _celula(e.get("descricao")), _pessoa(e.get("responsavel_entrega")),
+        _celula(e.get("formato_esperado")), _celula(e.get("prazo")), _celula(e.get("destinatario")),
+        _celula(e.get("status")), _celula(e.get("evidencia_transcricao")), _status_evidencia(e),
+    ] for e in outputs.get("entregaveis") or []), cabecalho)
+
+    _planilha(workbook, "Acordos", [
+        "Descrição", "Partes envolvidas", "Condições", "Status", "Evidência", "Verificação",
+    ], ([
+        _celula(a.get("descricao")), _lista(a.get("partes_envolvidas")), _celula(a.get("condicoes")),
+        _celula(a.get("status")), _celula(a.get("evidencia_transcricao")), _status_evidencia(a),
+    ] for a in outputs.get("acordos_combinados") or []), cabecalho)
+
+    quantitativa = outputs.get("analise_quantitativa") or {}
+    participantes = quantitativa.get("participantes") or []
+    metricas = list(dict.fromkeys(k for p in participantes for k in p.get("metricas") or {}))
+    qualidade = list(dict.fromkeys(k for p in participantes for k in p.get("qualidade_performance") or {}))
+    _planilha(workbook, "Métricas", ["Participante", "Papel"] + metricas + qualidade, ([
+        _celula(p.get("nome")), _celula(p.get("papel")),
+        *(_valor_planilha((p.get("metricas") or {}).get(k)) for k in metricas),
+        *(_valor_planilha((p.get("qualidade_performance") or {}).get(k)) for k in qualidade),
+    ] for p in participantes), cabecalho)
+
+    gerais = quantitativa.get("estatisticas_gerais") or {}
+    _planilha(workbook, "Resumo", ["Indicador", "Valor"], (
+        [chave, _valor_planilha(valor)] for chave, valor in gerais.items()
+    ), cabecalho)
+
+    workbook.close()
+    arquivo.seek(0)
+    return arquivo
+
+
+# --- PPTX ---
+
+def _slide_topicos(apresentacao, titulo: str, topicos: List[str], limite: int = 8):
+    slide = apresentacao.slides.add_slide(apresentacao.slide_layouts[1])
+    slide.shapes.title.text = titulo
+    corpo = slide.placeholders[1].text_frame
+    topicos = topicos[:limite] or ["Nada identificado na transcrição"]
+    corpo.text = topicos[0]
+    for topico in topicos[1:]:
+        corpo.add_paragraph().text = topico
+
+
+def gerar_pptx(resultados: Dict, transcricao: str) -> IO[bytes]:
+    """Apresentação-resumo: visão geral, participação, tasks, entregáveis e próximos passos"""
+    from pptx import Presentation
+
+    outputs = resultados.get("outputs_json") or {}
+    apresentacao = Presentation()
+
+    capa = apresentacao.slides.add_slide(apresentacao.slide_layouts[0])
+    capa.shapes.title.text = "Análise de Reunião de Vendas"
+    capa.placeholders[1].text = f"Gerado em {_data_geracao()}"
+
+    tasks = outputs.get("tasks") or []
+    entregaveis = outputs.get("entregaveis") or []
+    acordos = outputs.get("acordos_combinados") or []
+    quantitativa = outputs.get("analise_quantitativa") or {}
+    gerais = quantitativa.get("estatisticas_gerais") or {}
+    visao_geral = [
+        f"{len(acordos)} acordo(s), {len(tasks)} task(s), {len(entregaveis)} entregável(is)",
+        f"{sum(1 for t in tasks if t.get('prioridade') == 'alta')} task(s) de prioridade alta",
+    ]
+    duracao = _numero(gerais.get("duracao_total_segundos"))
+    if duracao:
+        visao_geral.append(f"Duração: {duracao / 60:.0f} min • {_celula(gerais.get('total_falas')) or 0} falas")
+    if gerais.get("equilibrio_participacao") is not None:
+        visao_geral.append(f"Equilíbrio de participação: {gerais['equilibrio_participacao']}")
+    _slide_topicos(apresentacao, "Visão geral", visao_geral)
+
+    _slide_topicos(apresentacao, "Participação", [
+        f"{_celula(p.get('nome'))} ({_celula(p.get('papel'))}): "
+        f"{_celula((p.get('metricas') or {}).get('tempo_fala_segundos')) or 0}s de fala, "
+        f"{_celula((p.get('metricas') or {}).get('perguntas_feitas')) or 0} pergunta(s)"
+        for p in quantitativa.get("participantes") or []
+    ])
+    _slide_topicos(apresentacao, "Tasks", [
+        f"{_celula(t.get('descricao'))} — {_pessoa(t.get('responsavel')) or 'sem responsável'}"
+        + (f" (até {t['prazo']})" if t.get("prazo") else "")
+        for t in sorted(tasks, key=lambda t: {"alta": 0, "media": 1, "média": 1}.get(t.get("prioridade"), 2))
+    ])
+    _slide_topicos(apresentacao, "Entregáveis", [
+        f"{_celula(e.get('nome'))} → {_celula(e.get('destinatario'))}"
+        + (f" (até {e['prazo']})" if e.get("prazo") else "")
+        for e in entregaveis
+    ])
+    proximos_passos = outputs.get("proximos_passos") or {}
+    _slide_topicos(apresentacao, "Próximos passos", [
+        *(_celula(a) for a in proximos_passos.get("acoes_imediatas") or []),
+        *(f"Objetivo: {_celula(o)}" for o in proximos_passos.get("objetivos_proxima_reuniao") or []),
+    ])
+
+    arquivo = io.BytesIO()
+    apresentacao.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+FORMATOS = {
+    "docx": {
+        "rotulo": "📄 Relatório (DOCX)",
+        "mime": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "gerar": gerar_docx,
+    },
+    "xlsx": {
+        "rotulo": "📊 Tasks e métricas (XLSX)",
+        "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "gerar": gerar_xlsx,
+    },
+    "pptx": {
+        "rotulo": "📽️ Resumo (PPTX)",
+        "mime": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+        "gerar": gerar_pptx,
+    },
+    "json": {
+        "rotulo": "🧾 Dados (JSON)",
+        "mime": "application/json",
+        "gerar": gerar_json,
+    },
+}
+
+
+def gerador(formato: str, resultados: Dict, transcricao: str) -> Callable[[], IO[bytes]]:
+    """Função sem argumentos que gera o arquivo sob demanda (para o `data` do download)"""
+    gerar = FORMATOS[formato]["gerar"]
+    return lambda: gerar(resultados, transcricao)
+
+
+def nome_arquivo(formato: str) -> str:
+    return f"analise_reuniao_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.{formato}"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        resultados_exemplo = json.load(f)
+    with open(sys.argv[2], encoding="utf-8") as f:
+        transcricao_exemplo = f.read()
+    print(f"Transcrição: {len(transcricao_exemplo):,} caracteres")
+    for formato_id in FORMATOS:
+        inicio = time.perf_counter()
+        gerado = gerador(formato_id, resultados_exemplo, transcricao_exemplo)()
+        tamanho = gerado.seek(0, 2)
+        print(f"{formato_id}: {tamanho / 1024:.0f} KiB em {(time.perf_counter() - inicio) * 1000:.0f} ms")
@@ -0,0 +1,218 @@
+"""
+Gravação e reprodução (record/replay) das chamadas externas.
+
+As chamadas à OpenAI (embeddings e chat), ao AstraDB (vector_search), ao
+Gemini (generate_content) e à Anthropic (messages) passam por `chamar`, de
+modo que nenhum provedor do roteador de LLM chega à rede na reprodução. No modo "gravar" cada requisição,
+resposta (ou erro) e duração é anexada a um cassete JSONL; no modo
+"reproduzir" as respostas são servidas do cassete, sem rede, opcionalmente
+respeitando as latências gravadas.
+
+Variáveis de ambiente:
+    MODO_GRAVACAO=desligado|gravar|reproduzir
+    CASSETE_PATH=dados/cassetes/sessao.jsonl
+    REPRODUZIR_LATENCIA=1
+
+Uso:
+    python gravacao.py perfilar <cassete.jsonl> <transcricao.txt> [perfil]
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional
+
+import limitador
+
+MODOS = ("desligado", "gravar", "reproduzir")
+
+_config = {
+    "modo": os.getenv('MODO_GRAVACAO', 'desligado'),
+    "caminho": os.getenv('CASSETE_PATH', os.path.join('dados', 'cassetes', 'sessao.jsonl')),
+    "reproduzir_latencia": os.getenv('REPRODUZIR_LATENCIA', '0') in ('1', 'true', 'True'),
+}
+
+
+class ErroGravacao(Exception):
+    """Requisição ausente do cassete no modo de reprodução"""
+
+
+class ErroReproduzido(Exception):
+    """Erro gravado de uma chamada original, levantado novamente na reprodução"""
+
+
+def _resumir(valor: Any, limite_texto: int = 500, limite_lista: int = 16) -> Any:
+    """Versão legível da requisição para o cassete (textos e vetores truncados)"""
+    if isinstance(valor, str):
+        return valor if len(valor) <= limite_texto else f"{valor[:limite_texto]}... ({len(valor)} caracteres)"
+    if isinstance(valor, (list, tuple)):
+        if len(valor) > limite_lista:
+            return [_resumir(v) for v in valor[:limite_lista]] + [f"... ({len(valor)} itens)"]
+        return [_resumir(v) for v in valor]
+    if isinstance(valor, dict):
+        return {k: _resumir(v) for k, v in valor.items()}
+    return valor
+
+
+def chave_requisicao(servico: str, requisicao: Dict) -> str:
+    conteudo = json.dumps(requisicao, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{servico}\n{conteudo}".encode('utf-8')).hexdigest()
+
+
+class Cassete:
+    """Arquivo JSONL com as interações gravadas"""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._entradas: Dict[str, list] = defaultdict(list)
+        self._proxima: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        if os.path.exists(caminho):
+            with open(caminho, encoding='utf-8') as f:
+                for linha in f:
+                    if linha.strip():
+                        entrada = json.loads(linha)
+                        self._entradas[entrada["chave"]].append(entrada)
+
+    def gravar(self, entrada: Dict):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+            with open(self.caminho, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entrada, ensure_ascii=False, default=str) + '\n')
+            self._entradas[entrada["chave"]].append(entrada)
+
+    def buscar(self, chave: str) -> Optional[Dict]:
+        """Entradas repetidas da mesma requisição são servidas na ordem gravada (a última se repete)"""
+        with self._lock:
+            entradas = self._entradas.get(chave)
+            if not entradas:
+                return None
+            indice = min(self._proxima[chave], len(entradas) - 1)
+            self._proxima[chave] += 1
+            return entradas[indice]
+
+
+_cassete: Optional[Cassete] = None
+_cassete_lock = threading.Lock()
+
+
+def configurar(modo: Optional[str] = None, caminho: Optional[str] = None,
+               reproduzir_latencia: Optional[bool] = None):
+    """Altera o modo/cassete em tempo de execução (o cassete é reaberto)"""
+    global _cassete
+    if modo is not None:
+        if modo not in MODOS:
+            raise ValueError(f"Modo de gravação inválido: {modo}")
+        _config["modo"] = modo
+    if caminho is not None:
+        _config["caminho"] = caminho
+    if reproduzir_latencia is not None:
+        _config["reproduzir_latencia"] = reproduzir_latencia
+    with _cassete_lock:
+        _cassete = None
+
+
+def modo() -> str:
+    return _config["modo"]
+
+
+def _obter_cassete() -> Cassete:
+    global _cassete
+    with _cassete_lock:
+        if _cassete is None:
+            _cassete = Cassete(_config["caminho"])
+        return _cassete
+
+
+def chamar(servico: str, requisicao: Dict, executar: Callable[[], Any],
+           serializar: Callable[[Any], Any] = lambda r: r,
+           desserializar: Callable[[Any], Any] = lambda r: r) -> Any:
+    """Executa, grava ou reproduz uma chamada externa conforme o modo configurado"""
+    if _config["modo"] == "desligado":
+        return executar()
+
+    cassete = _obter_cassete()
+    chave = chave_requisicao(servico, requisicao)
+
+    if _config["modo"] == "reproduzir":
+        entrada = cassete.buscar(chave)
+        if entrada is None:
+            raise ErroGravacao(f"{servico}: requisição não encontrada no cassete {cassete.caminho}")
+        if _config["reproduzir_latencia"]:
+            time.sleep(entrada["duracao"])
+        if entrada.get("erro"):
+            raise ErroReproduzido(entrada["erro"])
+        return desserializar(entrada["resposta"])
+
+    inicio = time.perf_counter()
+    entrada = {"servico": servico, "chave": chave, "requisicao": _resumir(requisicao), "instante": time.time()}
+    try:
+        resposta = executar()
+    except (limitador.ErroLimiteTaxa, limitador.ChamadaAbandonada):
+        # A chamada não chegou ao serviço: não há resposta a gravar
+        raise
+    except Exception as e:
+        entrada.update({"erro": f"{type(e).__name__}: {e}", "duracao": time.perf_counter() - inicio})
+        cassete.gravar(entrada)
+        raise
+    entrada.update({"resposta": serializar(resposta), "duracao": time.perf_counter() - inicio})
+    cassete.gravar(entrada)
+    return resposta
+
+
+def serializar_resposta_gemini(response) -> Dict:
+    uso = getattr(response, "usage_metadata", None)
+    campos = ("prompt_token_count", "cached_content_token_count", "candidates_token_count", "total_token_count")
+    return {
+        "text": response.text,
+        "usage_metadata": {campo: getattr(uso, campo, 0) or 0 for campo in campos},
+    }
+
+
+def desserializar_resposta_gemini(dados: Dict):
+    """Objeto com a mesma interface usada de uma resposta do Gemini (.text e .usage_metadata)"""
+    return SimpleNamespace(text=dados["text"], usage_metadata=SimpleNamespace(**dados["usage_metadata"]))
+
+
+def _perfilar(caminho_cassete: str, caminho_transcricao: str, perfil_id: Optional[str] = None):
+    """Executa a análise a partir de um cassete sob cProfile, sem rede"""
+    import cProfile
+    import pstats
+
+    # Executado como script, este arquivo é __main__: a configuração vale para o módulo importado pelo app
+    import gravacao
+    gravacao.configurar(modo="reproduzir", caminho=caminho_cassete, reproduzir_latencia=False)
+    with open(caminho_transcricao, encoding='utf-8') as f:
+        transcricao = f.read()
+
+    # Importar o app fora do `streamlit run` executa a interface em modo "bare" (sem renderização)
+    import main
+    perfil_id = perfil_id or main.perfis.PERFIL_PADRAO
+
+    perfil = cProfile.Profile()
+    perfil.enable()
+    resultados = main.analisar_reuniao_com_rag(transcricao, perfil_id)
+    outputs = resultados.get("outputs_json", {})
+    main.criar_dashboard_quantitativo(outputs.get("analise_quantitativa", {}), main.sinais.detectar_sinais(transcricao))
+    for acordo in outputs.get("acordos_combinados", []):
+        main.display_acordo_card(acordo)
+    for task in outputs.get("tasks", []):
+        main.display_task_card(task)
+    for entregavel in outputs.get("entregaveis", []):
+        main.display_entregavel_card(entregavel)
+    perfil.disable()
+
+    if "erro" in outputs:
+        print(f"Aviso: {outputs['erro']}")
+    pstats.Stats(perfil).sort_stats("cumulative").print_stats(30)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "perfilar":
+        _perfilar(sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
+    else:
+        print(__doc__)
@@ -0,0 +1,408 @@
+"""
+Limites de taxa compartilhados pelo processo e controle de admissão.
+
+Cada serviço externo (Gemini, OpenAI, Anthropic, embeddings da OpenAI e
+AstraDB) tem um limitador com dois baldes de tokens: requisições por minuto
+e tokens por minuto. As chamadas de todas as sessões do Streamlit passam
+pelo mesmo limitador e esperam numa fila por sessão atendida em rodízio, de
+modo que uma sessão com muitas chamadas não bloqueia as demais. Respostas
+429 do provedor pausam o limitador pelo tempo do Retry-After (ou por backoff
+exponencial) e a chamada é repetida em vez de virar falha; erros 5xx e de
+conexão também são repetidos, com backoff, sem pausar o limitador.
+
+Quem dispara a chamada em outra thread (o roteador de LLM) pode anexar uma
+ChamadaLimitada ao contexto: ela limita a espera na fila, mede o tempo
+esperado (que não é latência do provedor) e, se a chamada for abandonada
+enquanto espera, impede que ela chegue ao provedor.
+
+Antes de iniciar uma análise, `admitir` estima a espera na fila; acima do
+SLO o usuário é avisado da espera prevista em vez de receber um erro.
+
+Variáveis de ambiente:
+    LIMITES_PROVEDORES='{"gemini": {"rpm": 150, "tpm": 1000000}}'   # sobrescreve os limites padrão
+    SLO_ESPERA_SEGUNDOS=15
+    RAJADA_SEGUNDOS=10
+
+Uso:
+    python limitador.py   # simulação de justiça entre sessões com limites baixos
+"""
+import contextvars
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Limites por minuto de cada serviço (tpm None = sem limite de tokens)
+LIMITES_PADRAO = {
+    "gemini": {"rpm": 1000, "tpm": 1_000_000},
+    "openai": {"rpm": 500, "tpm": 200_000},
+    "anthropic": {"rpm": 50, "tpm": 30_000},
+    "openai.embeddings": {"rpm": 3000, "tpm": 1_000_000},
+    "astra": {"rpm": 6000, "tpm": None},
+}
+
+SLO_ESPERA_SEGUNDOS = float(os.getenv('SLO_ESPERA_SEGUNDOS', '15'))
+
+# Rajada máxima, em segundos de taxa acumulada, que um balde ocioso permite
+RAJADA_SEGUNDOS = float(os.getenv('RAJADA_SEGUNDOS', '10'))
+
+# Tentativas de uma chamada que recebe 429 antes de propagar o erro
+TENTATIVAS_LIMITE_TAXA = 4
+
+JANELA_ESPERAS = 200
+
+SESSAO_PADRAO = "processo"
+
+_sessao_atual: contextvars.ContextVar = contextvars.ContextVar("sessao_limitador", default=SESSAO_PADRAO)
+_chamada_atual: contextvars.ContextVar = contextvars.ContextVar("chamada_limitador", default=None)
+
+
+class ErroLimiteTaxa(Exception):
+    """Espera na fila do limitador excedeu o tempo máximo"""
+
+
+class ChamadaAbandonada(Exception):
+    """Quem disparou a chamada desistiu dela antes de ela sair da fila"""
+
+
+class ChamadaLimitada:
+    """Prazo de fila, tempo de fila e abandono de uma chamada disparada por outra thread"""
+
+    def __init__(self, prazo_fila: Optional[float] = None):
+        # Instante (time.monotonic) até o qual a chamada pode esperar na fila
+        self.prazo_fila = prazo_fila
+        self.abandonada = threading.Event()
+        self.espera = 0.0
+        self._na_fila_desde: Optional[float] = None
+
+    def espera_ate(self, agora: float) -> float:
+        """Segundos de fila até agora, incluindo a espera em andamento"""
+        na_fila_desde = self._na_fila_desde
+        return self.espera + (agora - na_fila_desde if na_fila_desde is not None else 0.0)
+
+
+def definir_sessao(sessao_id: str):
+    """Identifica a sessão das chamadas feitas neste contexto (para o rodízio entre sessões)"""
+    _sessao_atual.set(sessao_id)
+
+
+def sessao_atual() -> str:
+    return _sessao_atual.get()
+
+
+def definir_chamada(chamada: Optional[ChamadaLimitada]):
+    """Anexa o prazo e o controle de abandono às chamadas feitas neste contexto"""
+    _chamada_atual.set(chamada)
+
+
+class BaldeTokens:
+    """Balde de tokens com reposição contínua; o nível pode ficar negativo ao acertar consumo real"""
+
+    def __init__(self, por_minuto: float, rajada_segundos: float = RAJADA_SEGUNDOS):
+        self.taxa = por_minuto / 60.0
+        self.capacidade = max(1.0, self.taxa * rajada_segundos)
+        self.nivel = self.capacidade
+        self._atualizado = time.monotonic()
+
+    def _repor(self, agora: float):
+        self.nivel = min(self.capacidade, self.nivel + (agora - self._atualizado) * self.taxa)
+        self._atualizado = agora
+
+    def tempo_ate(self, quantidade: float, agora: float) -> float:
+        """Segundos até o balde ter a quantidade (limitada à capacidade)"""
+        self._repor(agora)
+        falta = min(quantidade, self.capacidade) - self.nivel
+        return max(0.0, falta / self.taxa)
+
+    def consumir(self, quantidade: float, agora: float):
+        self._repor(agora)
+        self.nivel -= quantidade
+
+    def ajustar(self, delta: float):
+        self.nivel -= delta
+
+    def deficit(self, quantidade: float, agora: float) -> float:
+        self._repor(agora)
+        return max(0.0, quantidade - self.nivel)
+
+
+class _Pedido:
+    __slots__ = ("sessao", "tokens", "chegada")
+
+    def __init__(self, sessao: str, tokens: int):
+        self.sessao = sessao
+        self.tokens = tokens
+        self.chegada = time.monotonic()
+
+
+class LimitadorProvedor:
+    """Limites de requisições e tokens por minuto de um serviço, com fila justa entre sessões"""
+
+    def __init__(self, nome: str, rpm: float, tpm: Optional[float] = None):
+        self.nome = nome
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requisicoes = BaldeTokens(rpm)
+        self._tokens = BaldeTokens(tpm) if tpm else None
+        # Filas por sessão; a ordem do OrderedDict é o rodízio (a sessão atendida vai para o fim)
+        self._filas: "OrderedDict[str, deque]" = OrderedDict()
+        self._bloqueado_ate = 0.0
+        self._cond = threading.Condition()
+        self._esperas: deque = deque(maxlen=JANELA_ESPERAS)
+        self._limites_excedidos = 0
+        self._atendidos = 0
+
+    def _tempo_para(self, pedido: _Pedido, agora: float) -> float:
+        espera = max(self._bloqueado_ate - agora, self._requisicoes.tempo_ate(1, agora))
+        if self._tokens is not None:
+            espera = max(espera, self._tokens.tempo_ate(pedido.tokens, agora))
+        return espera
+
+    def adquirir(self, tokens: int = 0, sessao: Optional[str] = None, timeout: Optional[float] = None,
+                 abandonada: Optional[threading.Event] = None) -> float:
+        """Espera a vez da sessão e a capacidade nos baldes; retorna os segundos de espera"""
+        pedido = _Pedido(sessao or sessao_atual(), max(0, int(tokens)))
+        limite = pedido.chegada + timeout if timeout is not None else None
+        with self._cond:
+            self._filas.setdefault(pedido.sessao, deque()).append(pedido)
+            try:
+                while True:
+                    agora = time.monotonic()
+                    primeira = next(iter(self._filas))
+                    vez = self._filas[primeira][0] is pedido
+                    espera = self._tempo_para(pedido, agora) if vez else 1.0
+                    if vez and espera <= 0:
+                        break
+                    if abandonada is not None and abandonada.is_set():
+                        raise ChamadaAbandonada(f"{self.nome}: chamada abandonada na fila")
+                    if limite is not None and agora >= limite:
+                        raise ErroLimiteTaxa(f"{self.nome}: espera na fila excedeu {timeout:.0f}s")
+                    if limite is not None:
+                        espera = min(espera, limite - agora)
+                    self._cond.wait(timeout=min(espera, 1.0))
+            except BaseException:
+                self._remover(pedido)
+                self._cond.notify_all()
+                raise
+
+            self._requisicoes.consumir(1, agora)
+            if self._tokens is not None:
+                self._tokens.consumir(pedido.tokens, agora)
+            self._remover(pedido)
+            if pedido.sessao in self._filas:
+                self._filas.move_to_end(pedido.sessao)
+            espera_total = agora - pedido.chegada
+            self._esperas.append(espera_total)
+            self._atendidos += 1
+            self._cond.notify_all()
+            return espera_total
+
+    def _remover(self, pedido: _Pedido):
+        fila = self._filas.get(pedido.sessao)
+        if fila is None:
+            return
+        try:
+            fila.remove(pedido)
+        except ValueError:
+            pass
+        if not fila:
+            del self._filas[pedido.sessao]
+
+    def acertar_tokens(self, estimados: int, reais: int):
+        """Corrige o balde de tokens com o consumo informado pelo provedor"""
+        if self._tokens is None:
+            return
+        with self._cond:
+            self._tokens.ajustar(reais - estimados)
+
+    def penalizar(self, segundos: float):
+        """Pausa o limitador após um 429 do provedor"""
+        with self._cond:
+            self._limites_excedidos += 1
+            self._bloqueado_ate = max(self._bloqueado_ate, time.monotonic() + segundos)
+            self._cond.notify_all()
+
+    def estimar_espera(self, requisicoes: int = 1, tokens: int = 0) -> float:
+        """Espera prevista para novas chamadas, considerando tudo o que já está na fila"""
+        with self._cond:
+            agora = time.monotonic()
+            pendentes = [p for fila in self._filas.values() for p in fila]
+            espera = max(0.0, self._bloqueado_ate - agora)
+            deficit = self._requisicoes.deficit(len(pendentes) + requisicoes, agora)
+            espera = max(espera, deficit / self._requisicoes.taxa)
+            if self._tokens is not None:
+                deficit = self._tokens.deficit(sum(p.tokens for p in pendentes) + tokens, agora)
+                espera = max(espera, deficit / self._tokens.taxa)
+            return espera
+
+    def estatisticas(self) -> Dict:
+        with self._cond:
+            esperas = sorted(self._esperas)
+            return {
+                "servico": self.nome,
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "na_fila": sum(len(f) for f in self._filas.values()),
+                "sessoes_na_fila": len(self._filas),
+                "atendidas": self._atendidos,
+                "limites_excedidos": self._limites_excedidos,
+                "espera_p50": statistics.median(esperas) if esperas else 0.0,
+                "espera_p95": esperas[min(len(esperas) - 1, int(round(0.95 * (len(esperas) - 1))))] if esperas else 0.0,
+            }
+
+
+def _limites_configurados() -> Dict[str, Dict]:
+    limites = {nome: dict(valores) for nome, valores in LIMITES_PADRAO.items()}
+    extra = os.getenv('LIMITES_PROVEDORES')
+    if extra:
+        for nome, valores in json.loads(extra).items():
+            limites.setdefault(nome, {"rpm": 600, "tpm": None}).update(valores)
+    return limites
+
+
+_limitadores: Dict[str, LimitadorProvedor] = {}
+_limitadores_lock = threading.Lock()
+
+
+def obter_limitador(nome: str) -> LimitadorProvedor:
+    """Limitador compartilhado pelo processo para o serviço"""
+    with _limitadores_lock:
+        if nome not in _limitadores:
+            limites = _limites_configurados().get(nome, {"rpm": 600, "tpm": None})
+            _limitadores[nome] = LimitadorProvedor(nome, limites["rpm"], limites.get("tpm"))
+        return _limitadores[nome]
+
+
+def estimar_tokens(*textos: str) -> int:
+    """Estimativa grosseira de tokens (~4 caracteres por token)"""
+    return sum(len(t) for t in textos if t) // 4
+
+
+def limite_excedido(erro: BaseException) -> Optional[float]:
+    """
+    Se o erro é um 429 / cota esgotada do provedor, retorna os segundos
+    sugeridos pelo Retry-After (0 se ausente); senão None.
+    """
+    atual: Optional[BaseException] = erro
+    while atual is not None:
+        resposta = getattr(atual, "response", None)
+        status = getattr(atual, "status_code", None) or getattr(resposta, "status_code", None)
+        if status == 429 or type(atual).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+            cabecalhos = getattr(resposta, "headers", None) or {}
+            try:
+                return float(cabecalhos.get("retry-after") or cabecalhos.get("Retry-After") or 0)
+            except (TypeError, ValueError):
+                return 0.0
+        atual = atual.__cause__ or atual.__context__
+    return None
+
+
+def erro_transitorio(erro: BaseException) -> bool:
+    """Erro 5xx ou de conexão do provedor, que vale repetir"""
+    atual: Optional[BaseException] = erro
+    while atual is not None:
+        resposta = getattr(atual, "response", None)
+        status = getattr(atual, "status_code", None) or getattr(resposta, "status_code", None)
+        if isinstance(status, int) and status >= 500:
+            return True
+        if type(atual).__name__ in ("APIConnectionError", "InternalServerError", "ServiceUnavailable",
+                                    "ConnectionError", "ConnectionResetError", "ServerError"):
+            return True
+        atual = atual.__cause__ or atual.__context__
+    return False
+
+
+def _adquirir(limitador: LimitadorProvedor, tokens: int, chamada: Optional[ChamadaLimitada]):
+    if chamada is None:
+        limitador.adquirir(tokens)
+        return
+    timeout = max(0.0, chamada.prazo_fila - time.monotonic()) if chamada.prazo_fila is not None else None
+    chamada._na_fila_desde = time.monotonic()
+    try:
+        limitador.adquirir(tokens, timeout=timeout, abandonada=chamada.abandonada)
+    finally:
+        chamada.espera += time.monotonic() - chamada._na_fila_desde
+        chamada._na_fila_desde = None
+    # Abandonada enquanto o balde liberava a vez: não vai ao provedor
+    if chamada.abandonada.is_set():
+        raise ChamadaAbandonada(f"{limitador.nome}: chamada abandonada na fila")
+
+
+def chamar_com_limite(nome: str, tokens: int, executar: Callable[[], Any],
+                      tentativas: int = TENTATIVAS_LIMITE_TAXA) -> Any:
+    """
+    Executa a chamada dentro do limite do serviço, repetindo-a após respostas
+    429 (pausando o limitador) e após erros 5xx ou de conexão (com backoff)
+    """
+    limitador = obter_limitador(nome)
+    chamada = _chamada_atual.get()
+    for tentativa in range(tentativas):
+        _adquirir(limitador, tokens, chamada)
+        try:
+            return executar()
+        except Exception as e:
+            if tentativa == tentativas - 1:
+                raise
+            retry_after = limite_excedido(e)
+            if retry_after is not None:
+                limitador.penalizar(retry_after or min(2 ** tentativa + random.random(), 30))
+            elif erro_transitorio(e):
+                time.sleep(min(2 ** tentativa * 0.5 + random.random() * 0.5, 10))
+            else:
+                raise
+
+
+def admitir(demanda: Dict[str, Tuple[int, int]], slo: float = SLO_ESPERA_SEGUNDOS) -> Dict:
+    """
+    Estima a espera de uma análise antes de iniciá-la. `demanda` mapeia cada
+    serviço para (requisições, tokens). As etapas são sequenciais, então as
+    esperas se somam.
+    """
+    esperas = {
+        nome: obter_limitador(nome).estimar_espera(requisicoes, tokens)
+        for nome, (requisicoes, tokens) in demanda.items()
+    }
+    espera = sum(esperas.values())
+    return {"espera_segundos": espera, "dentro_slo": espera <= slo, "por_servico": esperas}
+
+
+def estatisticas() -> list:
+    with _limitadores_lock:
+        limitadores = list(_limitadores.values())
+    return [l.estatisticas() for l in limitadores]
+
+
+def _simular():
+    """
+    Três sessões disputando um serviço de 120 rpm. A sessão "pesada" dispara
+    40 chamadas em 8 threads (como buscas concorrentes); as leves, 8 chamadas
+    em sequência. Com o rodízio, as leves não esperam a fila da pesada.
+    """
+    limitador = LimitadorProvedor("simulado", rpm=120)
+    limitador._requisicoes = BaldeTokens(120, rajada_segundos=1)
+    concluidas: Dict[str, list] = {"pesada": [], "leve_1": [], "leve_2": []}
+    inicio = time.monotonic()
+
+    def chamar(nome: str, chamadas: int):
+        for _ in range(chamadas):
+            limitador.adquirir(sessao=nome)
+            concluidas[nome].append(time.monotonic() - inicio)
+
+    threads = [threading.Thread(target=chamar, args=("pesada", 5)) for _ in range(8)]
+    threads += [threading.Thread(target=chamar, args=(nome, 8)) for nome in ("leve_1", "leve_2")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for nome, tempos in concluidas.items():
+        print(f"{nome:<7} {len(tempos):>3} chamadas • última concluída em {max(tempos):.1f}s")
+    estatisticas_simulacao = limitador.estatisticas()
+    print(f"Espera p50 {estatisticas_simulacao['espera_p50']:.2f}s • p95 {estatisticas_simulacao['espera_p95']:.2f}s")
+
+
+if __name__ == "__main__":
+    _simular()
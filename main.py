@@ -1,23 +1,30 @@
 import streamlit as st
 import google.generativeai as genai
-import requests
 import datetime
 import os
-from typing import List, Dict
-import openai
+import time
+from typing import List, Dict, Optional
 import json
 import re
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from collections import Counter
+import acompanhamento
+import cache_recuperacao
+import compactacao
+import evidencias
+import exportacao
+import perfis
+import provedores
+import recuperacao
+import sinais
+import gravacao
+import limitador
+from base_conhecimento import AstraDBClient
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 # Configurações das credenciais
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-ASTRA_DB_API_ENDPOINT = os.getenv('ASTRA_DB_API_ENDPOINT')
-ASTRA_DB_APPLICATION_TOKEN = os.getenv('ASTRA_DB_APPLICATION_TOKEN')
-ASTRA_DB_NAMESPACE = os.getenv('ASTRA_DB_NAMESPACE')
-ASTRA_DB_COLLECTION = os.getenv('ASTRA_DB_COLLECTION')
 gemini_api_key = os.getenv("GEM_API_KEY")
 
 # Configuração inicial do Streamlit
@@ -27,60 +34,19 @@ st.set_page_config(
     layout="wide"
 )
 
-class AstraDBClient:
-    def __init__(self):
-        self.base_url = f"{ASTRA_DB_API_ENDPOINT}/api/json/v1/{ASTRA_DB_NAMESPACE}"
-        self.headers = {
-            "Content-Type": "application/json",
-            "x-cassandra-token": ASTRA_DB_APPLICATION_TOKEN,
-            "Accept": "application/json"
-        }
-    
-    def vector_search(self, collection: str, vector: List[float], limit: int = 6) -> List[Dict]:
-        """Realiza busca por similaridade vetorial"""
-        url = f"{self.base_url}/{collection}"
-        payload = {
-            "find": {
-                "sort": {"$vector": vector},
-                "options": {"limit": limit}
-            }
-        }
-        try:
-            response = requests.post(url, json=payload, headers=self.headers, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("data", {}).get("documents", [])
-        except:
-            return []
-
 # Inicializa o cliente AstraDB
 astra_client = AstraDBClient()
 
-def get_embedding(texto: str) -> List[float]:
-    """Obtém embedding do texto usando OpenAI"""
-    try:
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        response = client.embeddings.create(
-            input=texto,
-            model="text-embedding-3-small"
-        )
-        return response.data[0].embedding
-    except:
-        # Fallback simples
-        import hashlib
-        text_hash = hashlib.md5(texto.encode()).hexdigest()
-        vector = [float(int(text_hash[i:i+2], 16) / 255.0) for i in range(0, 32, 2)]
-        while len(vector) < 1536:
-            vector.append(0.0)
-        return vector[:1536]
+# Identifica a sessão nas filas do limitador de taxa compartilhado pelo processo
+contexto_execucao = get_script_run_ctx()
+limitador.definir_sessao(contexto_execucao.session_id if contexto_execucao else limitador.SESSAO_PADRAO)
 
 # Configuração da API do Gemini
-if not gemini_api_key:
+if not gemini_api_key and gravacao.modo() != "reproduzir":
     st.error("GEMINI_API_KEY não encontrada nas variáveis de ambiente")
     st.stop()
 
-genai.configure(api_key=gemini_api_key)
-modelo_analise = genai.GenerativeModel("gemini-2.5-flash")
+genai.configure(api_key=gemini_api_key or "reproducao")
 
 # --- SYSTEM PROMPTS ---
 SYSTEM_PROMPT_ANALISE = """
@@ -216,6 +182,7 @@ Formato JSON OBRIGATÓRIO:
             },
             "prioridade": "alta/media/baixa (inferir do contexto)",
             "dependencias": ["descrição de tarefas que dependem desta"],
+            "status": "pendente/em_andamento/concluido",
             "evidencia_transcricao": "Trecho da transcrição que menciona esta task"
         }
     ],
@@ -227,6 +194,7 @@ Formato JSON OBRIGATÓRIO:
             "formato_esperado": "Formato mencionado (PDF, documento, planilha, etc)",
             "prazo": "Prazo de entrega acordado",
             "destinatario": "Quem deve receber (nome e cargo)",
+            "status": "pendente/em_andamento/concluido",
             "evidencia_transcricao": "Trecho da transcrição que menciona este entregável"
         }
     ],
@@ -278,113 +246,166 @@ REGRAS IMPORTANTES:
 4. Entregáveis são COMBINADOS na reunião - documentos, propostas, materiais que foram acordados
 5. Seja extremamente fiel à transcrição original - não invente informações
 6. Para análise quantitativa, estime métricas com base na transcrição (tempo de fala proporcional ao número de palavras)
+7. Use status "concluido" apenas quando a transcrição disser que o item já foi cumprido (ex: "já enviei a proposta")
 """
 
-def analisar_reuniao_com_rag(transcricao: str) -> Dict[str, str]:
+def analisar_reuniao_com_rag(transcricao: str, perfil_id: str = perfis.PERFIL_PADRAO,
+                             sinais_transcricao: Optional[Dict] = None,
+                             consultas_rag: Optional[List[Dict]] = None) -> Dict[str, str]:
     """Analisa uma transcrição de reunião usando RAG e gera outputs adicionais"""
     
+    perfil = perfis.PERFIS[perfil_id]
+    inicio = time.perf_counter()
+    verificacao_evidencias = {}
     try:
-        # Gera embedding para busca na base de conhecimento
-        embedding = get_embedding(transcricao)
-        
-        # Busca documentos relevantes no AstraDB
-        relevant_docs = astra_client.vector_search(ASTRA_DB_COLLECTION, embedding, limit=5)
+        # Busca documentos relevantes com uma consulta por etapa da jornada
+        # (AstraDB ou índice local em modo degradado), fundidos por RRF
+        recuperacao_rag = recuperacao.recuperar(
+            astra_client, transcricao, perfil["limite_rag"], perfil["orcamento_tokens_rag"],
+            sinais_transcricao, consultas_rag
+        )
+        modo_rag = recuperacao_rag["modo"]
         
         # Constrói contexto dos documentos
-        rag_context = ""
-        if relevant_docs:
-            rag_context = "## CONHECIMENTO TÉCNICO RELEVANTE:\n\n"
-            for i, doc in enumerate(relevant_docs, 1):
-                doc_content = str(doc)
-                doc_clean = doc_content.replace('{', '').replace('}', '').replace("'", "").replace('"', '')
-                rag_context += f"--- Fonte {i} ---\n{doc_clean[:500]}...\n\n"
-        
-        # Construir prompt para análise principal
-        prompt_analise = f"""
-        {SYSTEM_PROMPT_ANALISE}
-        
-        {rag_context}
-        
-        ## TRANSCRIÇÃO DA REUNIÃO PARA ANÁLISE:
-        {transcricao}
-        
-        ## SUA TAREFA:
-        
-        Com base na transcrição acima e no conhecimento técnico fornecido, gere uma análise completa seguindo EXATAMENTE o formato especificado.
+        rag_context = recuperacao.montar_contexto(recuperacao_rag["documentos"])
         
-        IMPORTANTE: Seja específico, cite trechos da transcrição quando relevante, e dê feedback acionável.
-        """
+        # Os prompts recebem a transcrição compactada; as evidências voltam ao original pelo mapa de offsets
+        compacta = compactacao.compactar(transcricao) if compactacao.COMPACTAR_TRANSCRICAO else None
+        transcricao_prompt = compacta.texto if compacta else transcricao
         
-        # Gera análise principal
-        response_analise = modelo_analise.generate_content(prompt_analise)
-        analise_principal = response_analise.text
+        # Os system prompts fixos vão como system_instruction; o roteador escolhe o provedor
+        roteador = provedores.obter_roteador()
+        respostas = []
         
-        # Construir prompt para outputs adicionais em formato JSON
-        prompt_outputs = f"""
-        {SYSTEM_PROMPT_OUTPUTS_ADICIONAIS}
-        
-        ## TRANSCRIÇÃO ORIGINAL DA REUNIÃO (FONTE PRIMÁRIA):
-        {transcricao}
-        
-        ## ANÁLISE RAG DA REUNIÃO (CONTEXTO ADICIONAL):
-        {analise_principal}
-        
-        ## BASE DE CONHECIMENTO UTILIZADA NO RAG:
-        {rag_context}
-        
-        ## INSTRUÇÕES CRÍTICAS:
-        
-        1. A TRANSCRIÇÃO ORIGINAL é sua fonte primária - extraia dela todas as informações factuais
-        2. Use a análise RAG apenas como contexto para entender melhor o que foi dito
-        3. Para cada acordo, task e entregável, INCLUA O TRECHO EXATO da transcrição como evidência
-        4. Seja extremamente detalhista - a transcrição contém muitas informações que precisam ser capturadas
-        5. Identifique entregáveis como: propostas, documentos, termos, cases, budgets - tudo que foi COMBINADO entregar
-        6. Para ANÁLISE QUANTITATIVA, identifique todos os participantes e atribua notas de qualidade
-        
-        Gere agora o JSON completo com todos os outputs estruturados baseados na transcrição original.
-        """
-        
-        # Gera outputs adicionais
-        response_outputs = modelo_analise.generate_content(prompt_outputs)
-        
-        # Tenta extrair JSON da resposta
-        outputs_text = response_outputs.text
-        json_match = re.search(r'\{.*\}', outputs_text, re.DOTALL)
+        analise_principal = ""
+        if perfil["analise_narrativa"]:
+            # Construir prompt para análise principal
+            prompt_analise = f"""
+            {rag_context}
+            
+            ## TRANSCRIÇÃO DA REUNIÃO PARA ANÁLISE:
+            {transcricao_prompt}
+            
+            ## SUA TAREFA:
+            
+            Com base na transcrição acima e no conhecimento técnico fornecido, gere uma análise completa seguindo EXATAMENTE o formato especificado.
+            
+            IMPORTANTE: Seja específico, cite trechos da transcrição quando relevante, e dê feedback acionável.
+            """
+            
+            # Gera análise principal
+            resposta_analise = roteador.gerar(SYSTEM_PROMPT_ANALISE, prompt_analise, perfil, "analise")
+            resposta_analise["uso_tokens"]["etapa"] = "Análise principal"
+            analise_principal = resposta_analise["texto"]
+            respostas.append(resposta_analise)
         
-        if json_match:
-            try:
-                outputs_json = json.loads(json_match.group())
-                
-                # Validação básica - verifica se tem os campos principais
-                if not outputs_json.get("acordos_combinados"):
-                    outputs_json["acordos_combinados"] = []
-                if not outputs_json.get("tasks"):
-                    outputs_json["tasks"] = []
-                if not outputs_json.get("entregaveis"):
-                    outputs_json["entregaveis"] = []
-                if not outputs_json.get("proximos_passos"):
-                    outputs_json["proximos_passos"] = {}
-                if not outputs_json.get("analise_quantitativa"):
-                    outputs_json["analise_quantitativa"] = {
-                        "participantes": [],
-                        "estatisticas_gerais": {}
+        outputs_text = ""
+        outputs_json = {}
+        if perfil["extracao_estruturada"]:
+            # Construir prompt para outputs adicionais em formato JSON
+            prompt_outputs = f"""
+            ## TRANSCRIÇÃO ORIGINAL DA REUNIÃO (FONTE PRIMÁRIA):
+            {transcricao_prompt}
+            
+            ## ANÁLISE RAG DA REUNIÃO (CONTEXTO ADICIONAL):
+            {analise_principal or "Análise narrativa não executada neste perfil."}
+            
+            ## BASE DE CONHECIMENTO UTILIZADA NO RAG:
+            {rag_context}
+            
+            ## INSTRUÇÕES CRÍTICAS:
+            
+            1. A TRANSCRIÇÃO ORIGINAL é sua fonte primária - extraia dela todas as informações factuais
+            2. Use a análise RAG apenas como contexto para entender melhor o que foi dito
+            3. Para cada acordo, task e entregável, INCLUA O TRECHO EXATO da transcrição como evidência
+            4. Seja extremamente detalhista - a transcrição contém muitas informações que precisam ser capturadas
+            5. Identifique entregáveis como: propostas, documentos, termos, cases, budgets - tudo que foi COMBINADO entregar
+            6. Para ANÁLISE QUANTITATIVA, identifique todos os participantes e atribua notas de qualidade
+            
+            Gere agora o JSON completo com todos os outputs estruturados baseados na transcrição original.
+            """
+            
+            # Gera outputs adicionais
+            resposta_outputs = roteador.gerar(
+                SYSTEM_PROMPT_OUTPUTS_ADICIONAIS, prompt_outputs, perfil, "outputs",
+                validar=lambda r: re.search(r'\{.*\}', r["texto"] or "", re.DOTALL) is not None
+            )
+            resposta_outputs["uso_tokens"]["etapa"] = "Outputs estruturados"
+            respostas.append(resposta_outputs)
+            
+            # Tenta extrair JSON da resposta
+            outputs_text = resposta_outputs["texto"]
+            json_match = re.search(r'\{.*\}', outputs_text, re.DOTALL)
+            
+            if json_match:
+                try:
+                    outputs_json = json.loads(json_match.group())
+                except json.JSONDecodeError as e:
+                    outputs_json = {
+                        "erro": f"Falha ao parsear JSON: {str(e)}", 
+                        "texto_original": outputs_text[:1000] + "..."
                     }
-                    
-            except json.JSONDecodeError as e:
+            else:
                 outputs_json = {
-                    "erro": f"Falha ao parsear JSON: {str(e)}", 
+                    "erro": "JSON não encontrado na resposta", 
                     "texto_original": outputs_text[:1000] + "..."
                 }
-        else:
-            outputs_json = {
-                "erro": "JSON não encontrado na resposta", 
-                "texto_original": outputs_text[:1000] + "..."
+        
+        if "erro" not in outputs_json:
+            # Validação básica - verifica se tem os campos principais
+            if not outputs_json.get("acordos_combinados"):
+                outputs_json["acordos_combinados"] = []
+            if not outputs_json.get("tasks"):
+                outputs_json["tasks"] = []
+            if not outputs_json.get("entregaveis"):
+                outputs_json["entregaveis"] = []
+            if not outputs_json.get("proximos_passos"):
+                outputs_json["proximos_passos"] = {}
+            if not outputs_json.get("analise_quantitativa"):
+                outputs_json["analise_quantitativa"] = {
+                    "participantes": [],
+                    "estatisticas_gerais": {}
+                }
+            
+            # Localiza cada evidência citada na transcrição original
+            verificacao_evidencias = evidencias.verificar_evidencias(
+                outputs_json, transcricao, compacta.indice() if compacta else None
+            )
+        
+        latencia = time.perf_counter() - inicio
+        custo = sum(perfis.custo_estimado(r["modelo"], [r["uso_tokens"]]) for r in respostas)
+        perfis.registrar_execucao(perfil_id, latencia, custo)
+        
+        compactacao_transcricao = None
+        if compacta:
+            compactacao_transcricao = {
+                **compacta.estatisticas,
+                "economia": compactacao.economia(
+                    compacta.estatisticas, len(respostas),
+                    perfis.PRECOS_MODELOS.get(perfil["modelo"], {}).get("entrada")
+                ),
             }
         
         return {
             "analise_principal": analise_principal,
             "outputs_json": outputs_json,
-            "outputs_raw": outputs_text
+            "outputs_raw": outputs_text,
+            "verificacao_evidencias": verificacao_evidencias,
+            "uso_tokens": [r["uso_tokens"] for r in respostas],
+            "cache_ativo": all(r["cache_ativo"] for r in respostas),
+            "roteamento": [
+                {"etapa": r["uso_tokens"]["etapa"], "provedor": r["provedor"], "modelo": r["modelo"],
+                 "hedge": r["roteamento"]["hedge"], "failover": r["roteamento"]["failover"]}
+                for r in respostas
+            ],
+            "modo_rag": modo_rag,
+            "consultas_rag": recuperacao_rag["consultas"],
+            "documentos_rag": len(recuperacao_rag["documentos"]),
+            "tempo_rag_ms": recuperacao_rag["tempo_ms"],
+            "compactacao": compactacao_transcricao,
+            "perfil": perfil_id,
+            "latencia_segundos": latencia,
+            "custo_estimado": custo
         }
         
     except Exception as e:
@@ -394,7 +415,7 @@ def analisar_reuniao_com_rag(transcricao: str) -> Dict[str, str]:
             "outputs_raw": ""
         }
 
-def criar_dashboard_quantitativo(dados_quantitativos):
+def criar_dashboard_quantitativo(dados_quantitativos, sinais_transcricao=None):
     """Cria dashboard com gráficos e análises quantitativas"""
     
     participantes = dados_quantitativos.get("participantes", [])
@@ -693,11 +714,61 @@ def criar_dashboard_quantitativo(dados_quantitativos):
         if total_objeções > 3:
             insights.append("🔄 Muitas objeções levantadas - reunião de alta complexidade")
         
+        # Conferir as métricas do LLM com o detector local
+        conferencia = sinais.conferir_metricas(sinais_transcricao, participantes) if sinais_transcricao else []
+        for linha in conferencia:
+            if linha["divergencias"]:
+                insights.append(
+                    f"🧭 {linha['participante']}: {', '.join(linha['divergencias']).lower()} estimadas pelo LLM "
+                    "divergem do detector local — confira na transcrição"
+                )
+        
         if not insights:
             insights.append("📊 Reunião dentro dos padrões esperados")
         
         for insight in insights:
             st.markdown(insight)
+    
+    if conferencia:
+        st.markdown("---")
+        st.markdown("## 🧭 Conferência com o Detector Local")
+        st.markdown("*Métricas estimadas pelo LLM x contagens do detector de sinais na transcrição (LLM / local)*")
+        df_conferencia = pd.DataFrame([
+            {
+                "Participante": linha["participante"],
+                **{
+                    rotulo: f"{linha[metrica][0]} / {linha[metrica][1]}"
+                    for metrica, _, rotulo in sinais.METRICAS_CONFERIDAS
+                },
+                "Divergências": ", ".join(linha["divergencias"]) or "—"
+            }
+            for linha in conferencia
+        ])
+        st.dataframe(df_conferencia, hide_index=True, use_container_width=True)
+
+def exibir_verificacao_evidencia(item):
+    """Exibe onde a evidência foi localizada na transcrição, ou alerta se não foi"""
+    verificacao = item.get('verificacao_evidencia')
+    if not verificacao:
+        return
+    
+    if verificacao['status'] == 'nao_encontrada':
+        st.markdown("⚠️ **Evidência não localizada na transcrição** — verifique se o trecho foi realmente dito")
+        return
+    
+    origem = " • ".join(
+        parte for parte in (verificacao.get('falante'), verificacao.get('timestamp')) if parte
+    )
+    ausentes = ", ".join(verificacao.get('ausentes') or [])
+    if verificacao['status'] == 'exata':
+        st.markdown(f"🔎 **Localizada:** {origem or 'transcrição'} (caracteres {verificacao['inicio']}–{verificacao['fim']})")
+    elif verificacao['status'] == 'divergente':
+        st.markdown(f"⚠️ **Evidência diverge da transcrição** — palavras que não aparecem no trecho: {ausentes}")
+        st.markdown(f"> {verificacao['trecho']}")
+    else:
+        st.markdown(f"🔎 **Localizada aproximadamente ({verificacao['score']:.0%}):** {origem or 'transcrição'}"
+                    + (f" • palavras ausentes no trecho: {ausentes}" if ausentes else ""))
+        st.markdown(f"> {verificacao['trecho']}")
 
 def display_task_card(task):
     """Exibe um card de task formatado"""
@@ -741,6 +812,7 @@ def display_task_card(task):
                     st.markdown("---")
                     st.markdown("📝 **Evidência na transcrição:**")
                     st.markdown(f"> *{evidencia}*")
+                    exibir_verificacao_evidencia(task)
             
             with col2:
                 prazo = task.get('prazo', 'Não definido')
@@ -770,6 +842,7 @@ def display_entregavel_card(entregavel):
                     st.markdown("---")
                     st.markdown("📝 **Evidência:**")
                     st.markdown(f"> *{evidencia}*")
+                    exibir_verificacao_evidencia(entregavel)
             
             with col2:
                 st.markdown(f"**Formato:** {entregavel.get('formato_esperado', 'Não especificado')}")
@@ -806,6 +879,75 @@ def display_acordo_card(acordo):
                 st.markdown("---")
                 st.markdown("📝 **Evidência na transcrição:**")
                 st.markdown(f"> *{evidencia}*")
+                exibir_verificacao_evidencia(acordo)
+
+def exibir_sinais(resultado_sinais):
+    """Exibe as contagens do detector local de sinais por falante"""
+    falantes = resultado_sinais["falantes"]
+    if not falantes:
+        st.info("Nenhum turno de fala identificado na transcrição.")
+        return
+    
+    df_sinais = pd.DataFrame([
+        {
+            "Falante": falante,
+            "Turnos": contagem["turnos"],
+            "Perguntas": contagem["perguntas"],
+            "Objeções": contagem.get("objecao", 0),
+            "Compromissos": contagem.get("compromisso", 0),
+            "Preço": contagem.get("preco", 0),
+            "SPIN (S/P/I/N)": "/".join(str(contagem.get(c, 0)) for c in sinais.CATEGORIAS_SPIN)
+        }
+        for falante, contagem in falantes.items()
+    ])
+    st.dataframe(df_sinais, hide_index=True, use_container_width=True)
+    
+    objecoes = [o for o in resultado_sinais["ocorrencias"] if o["categoria"] == "objecao"]
+    if objecoes:
+        st.markdown("**Objeções detectadas:**")
+        for o in objecoes[:10]:
+            momento = f" [{o['timestamp']}]" if o["timestamp"] else ""
+            st.markdown(f"- 🚫 {o['falante']}{momento}: *\"{o['trecho']}\"*")
+    st.caption(f"Detecção local por léxico em {resultado_sinais['tempo_ms']:.0f} ms — independente do LLM.")
+
+def exibir_acompanhamento(resumo):
+    """Exibe a reconciliação dos itens da reunião com o registro da negociação"""
+    negociacao = resumo["negociacao"]
+    rotulos_tipo = {"acordo": "🤝 Acordo", "task": "✅ Task", "entregavel": "📦 Entregável"}
+    rotulos_status = {
+        "pendente": "🟡 Pendente",
+        "em_andamento": "🟠 Em Andamento",
+        "concluido": "🟢 Concluído",
+        "cancelado": "⚪ Cancelado"
+    }
+    
+    st.markdown(f"## 🔁 Acompanhamento • {negociacao['nome']}")
+    st.markdown(f"*Reunião {len(negociacao['reunioes'])} desta negociação*")
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("🆕 Itens novos", len(resumo["novos"]))
+    col2.metric("🔄 Itens retomados", len(resumo["atualizados"]))
+    col3.metric("⏳ Em aberto sem menção", len(resumo["sem_mencao"]))
+    
+    if resumo["atualizados"]:
+        st.markdown("### 🔄 Itens de reuniões anteriores retomados")
+        for item in resumo["atualizados"]:
+            mudanca = item["historico"][-1]
+            st.markdown(
+                f"- {rotulos_tipo[item['tipo']]}: {item['texto']} — "
+                f"{rotulos_status.get(mudanca['de'], mudanca['de'])} → "
+                f"**{rotulos_status.get(mudanca['para'], mudanca['para'])}**"
+            )
+    
+    if resumo["sem_mencao"]:
+        st.markdown("### ⏳ Pendências anteriores não mencionadas nesta reunião")
+        for item in resumo["sem_mencao"]:
+            st.markdown(f"- {rotulos_tipo[item['tipo']]}: {item['texto']} ({rotulos_status.get(item['status'], item['status'])})")
+    
+    if resumo["novos"]:
+        st.markdown("### 🆕 Novos itens registrados")
+        for item in resumo["novos"]:
+            st.markdown(f"- {rotulos_tipo[item['tipo']]}: {item['texto']}")
 
 # --- Interface Principal ---
 st.title("🎯 Analisador de Reuniões de Vendas")
@@ -823,31 +965,158 @@ Cliente: Temos problemas com produtividade da equipe...
     help="Cole a transcrição completa da reunião de vendas."
 )
 
+nomes_negociacoes = [n["nome"] for n in acompanhamento.listar_negociacoes()]
+conta_negociacao = st.text_input(
+    "Conta / negociação (opcional):",
+    placeholder="Ex: ACME - Expansão 2025",
+    help="Informe a conta para vincular esta reunião às anteriores e acompanhar os itens em aberto."
+    + (f" Negociações existentes: {', '.join(nomes_negociacoes)}" if nomes_negociacoes else "")
+)
+
+def descrever_perfil(perfil_id):
+    """Rótulo do perfil com a latência e o custo medidos neste servidor"""
+    perfil = perfis.PERFIS[perfil_id]
+    medidas = perfis.estatisticas(perfil_id)
+    if not medidas:
+        return f"{perfil['nome']} • sem medições ainda"
+    return f"{perfil['nome']} • ~{medidas['latencia_p50']:.0f}s • US$ {medidas['custo_medio']:.4f}/análise"
+
+perfil_analise = st.radio(
+    "Perfil de análise:",
+    options=list(perfis.PERFIS),
+    index=list(perfis.PERFIS).index(perfis.PERFIL_PADRAO),
+    format_func=descrever_perfil,
+    horizontal=True,
+    help="Rápido para triagem do vendedor, Completo para revisões gerenciais. Latência (mediana) e custo medidos nas últimas análises."
+)
+st.caption(perfis.PERFIS[perfil_analise]["descricao"])
+
 if st.button("🔍 Analisar Reunião com RAG", type="primary", use_container_width=True):
     if transcricao_texto:
-        with st.spinner("Analisando com base de conhecimento e extraindo outputs estruturados da transcrição..."):
-            resultados = analisar_reuniao_com_rag(transcricao_texto)
+        # Sinais locais aparecem de imediato, enquanto o LLM processa
+        sinais_transcricao = sinais.detectar_sinais(transcricao_texto)
+        with st.expander("⚡ Sinais da conversa (detector local)", expanded=True):
+            exibir_sinais(sinais_transcricao)
+        
+        # Admissão: estima a fila nos provedores antes de começar
+        perfil_escolhido = perfis.PERFIS[perfil_analise]
+        prompts_perfil = [
+            prompt for prompt, ativo in (
+                (SYSTEM_PROMPT_ANALISE, perfil_escolhido["analise_narrativa"]),
+                (SYSTEM_PROMPT_OUTPUTS_ADICIONAIS, perfil_escolhido["extracao_estruturada"])
+            ) if ativo
+        ]
+        consultas_rag = recuperacao.gerar_consultas(transcricao_texto, sinais_transcricao)
+        admissao = limitador.admitir({
+            "openai.embeddings": (1, limitador.estimar_tokens(*(c["texto"] for c in consultas_rag))),
+            "astra": (len(consultas_rag), 0),
+            provedores.obter_roteador().provedores[0].nome: (
+                len(prompts_perfil),
+                sum(limitador.estimar_tokens(prompt, transcricao_texto) for prompt in prompts_perfil)
+            ),
+        })
+        mensagem_espera = "Analisando com base de conhecimento e extraindo outputs estruturados da transcrição..."
+        if not admissao["dentro_slo"]:
+            st.warning(
+                f"⏳ Alta demanda no momento: sua análise entrou na fila, com espera estimada de "
+                f"~{admissao['espera_segundos']:.0f}s antes do processamento. Não é preciso clicar novamente."
+            )
+            mensagem_espera = f"Aguardando na fila (~{admissao['espera_segundos']:.0f}s) e analisando..."
+        
+        with st.spinner(mensagem_espera):
+            resultados = analisar_reuniao_com_rag(
+                transcricao_texto, perfil_analise, sinais_transcricao, consultas_rag
+            )
             
             if "Erro" not in resultados["analise_principal"]:
-                st.success("✅ Análise concluída!")
+                st.success(
+                    f"✅ Análise concluída em {resultados['latencia_segundos']:.1f}s "
+                    f"(perfil {perfis.PERFIS[perfil_analise]['nome']}, ~US$ {resultados['custo_estimado']:.4f})"
+                )
+                
+                if resultados.get("modo_rag") == "local":
+                    st.info("ℹ️ Base de conhecimento consultada pelo índice local (embeddings da OpenAI indisponíveis).")
+                elif resultados.get("modo_rag") == "indisponivel":
+                    st.warning("⚠️ Base de conhecimento indisponível: análise feita sem contexto RAG.")
+                if resultados.get("consultas_rag") and resultados.get("modo_rag") != "indisponivel":
+                    etapas = ", ".join(c["nome"] for c in resultados["consultas_rag"])
+                    st.caption(
+                        f"🔎 {len(resultados['consultas_rag'])} consultas à base de conhecimento ({etapas}) "
+                        f"fundidas em {resultados['documentos_rag']} fonte(s) em {resultados['tempo_rag_ms']:.0f} ms."
+                    )
+                
+                compactacao_transcricao = resultados.get("compactacao")
+                if compactacao_transcricao and compactacao_transcricao["reducao"] > 0:
+                    economia = compactacao_transcricao["economia"]
+                    texto_custo = f", ~US$ {economia['custo']:.4f}" if economia["custo"] else ""
+                    st.caption(
+                        f"✂️ Transcrição compactada: {compactacao_transcricao['tokens_original']:,} → "
+                        f"{compactacao_transcricao['tokens_compacto']:,} tokens por prompt "
+                        f"(-{compactacao_transcricao['reducao']:.0%}; {compactacao_transcricao['preenchimentos']} muletas, "
+                        f"{compactacao_transcricao['duplicadas']} falas repetidas, {compactacao_transcricao['sistema']} linhas de sistema "
+                        f"removidas) • economia estimada nesta análise: {economia['tokens']:,} tokens, "
+                        f"~{max(economia['segundos'], 0):.1f}s{texto_custo}."
+                    )
+                
+                verificacao_evidencias = resultados.get("verificacao_evidencias", {})
+                nao_encontradas = verificacao_evidencias.get("nao_encontrada", 0)
+                divergentes = verificacao_evidencias.get("divergente", 0)
+                if nao_encontradas:
+                    st.warning(f"⚠️ {nao_encontradas} evidência(s) citada(s) não foram localizadas na transcrição. Confira os itens sinalizados.")
+                if divergentes:
+                    st.warning(f"⚠️ {divergentes} evidência(s) citada(s) divergem da transcrição (ex.: negação inexistente no trecho). Confira os itens sinalizados.")
+                
+                resumo_acompanhamento = None
+                if conta_negociacao.strip() and "erro" not in resultados["outputs_json"]:
+                    resumo_acompanhamento = acompanhamento.registrar_reuniao(
+                        conta_negociacao, resultados["outputs_json"]
+                    )
+                
+                if resultados.get("uso_tokens"):
+                    with st.expander("🧮 Consumo de tokens"):
+                        if resultados.get("cache_ativo"):
+                            st.caption("System prompts servidos pelo cache de contexto do provedor.")
+                        else:
+                            st.caption("Cache de contexto indisponível em ao menos uma etapa: system prompts enviados sem cache.")
+                        roteamento = resultados.get("roteamento", [])
+                        if any(r["provedor"] != "gemini" or r["hedge"] or r["failover"] for r in roteamento):
+                            st.caption("Roteamento: " + "; ".join(
+                                f"{r['etapa']} → {r['provedor']} ({r['modelo']})"
+                                + (" • hedge" if r["hedge"] else "")
+                                + (" • failover" if r["failover"] else "")
+                                for r in roteamento
+                            ))
+                        df_tokens = pd.DataFrame(resultados["uso_tokens"]).rename(columns={
+                            "etapa": "Etapa",
+                            "tokens_entrada": "Entrada",
+                            "tokens_em_cache": "Entrada em cache",
+                            "tokens_saida": "Saída",
+                            "tokens_total": "Total",
+                            "economia_tokens_equivalentes": "Economia (tokens equivalentes)"
+                        })
+                        st.dataframe(df_tokens, hide_index=True, use_container_width=True)
                 
                 # Criar abas para organizar os outputs
-                tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+                tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
                     "📊 Análise Principal", 
                     "📈 Análise Quantitativa",
                     "🤝 Acordos", 
                     "✅ Tasks", 
                     "📦 Entregáveis",
-                    "⏭️ Próximos Passos"
+                    "⏭️ Próximos Passos",
+                    "🔁 Acompanhamento"
                 ])
                 
                 with tab1:
                     st.markdown("## Análise de Performance")
-                    st.markdown(resultados["analise_principal"])
+                    if resultados["analise_principal"]:
+                        st.markdown(resultados["analise_principal"])
+                    else:
+                        st.info("A análise narrativa não é executada neste perfil. Use o perfil Equilibrado ou Completo para o relatório completo.")
                 
                 with tab2:
                     dados_quantitativos = resultados.get("outputs_json", {}).get("analise_quantitativa", {})
-                    criar_dashboard_quantitativo(dados_quantitativos)
+                    criar_dashboard_quantitativo(dados_quantitativos, sinais_transcricao)
                 
                 with tab3:
                     st.markdown("## 🤝 Acordos e Combinados")
@@ -939,46 +1208,25 @@ if st.button("🔍 Analisar Reunião com RAG", type="primary", use_container_wid
                     else:
                         st.info("Nenhum próximo passo específico identificado na transcrição.")
                 
-                # Preparar conteúdo completo para download
-                conteudo_completo = f"""
-===========================================
-ANÁLISE DE REUNIÃO DE VENDAS
-Data: {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}
-===========================================
-
-===========================================
-1. TRANSCRIÇÃO ORIGINAL
-===========================================
-
-{transcricao_texto}
-
-===========================================
-2. ANÁLISE PRINCIPAL (COM RAG)
-===========================================
-
-{resultados["analise_principal"]}
-
-===========================================
-3. ANÁLISE QUANTITATIVA
-===========================================
-
-{json.dumps(resultados.get("outputs_json", {}).get("analise_quantitativa", {}), indent=2, ensure_ascii=False)}
-
-===========================================
-4. OUTPUTS ESTRUTURADOS COMPLETOS
-===========================================
-
-{json.dumps(resultados.get("outputs_json", {}), indent=2, ensure_ascii=False)}
-                """
+                with tab7:
+                    if resumo_acompanhamento:
+                        exibir_acompanhamento(resumo_acompanhamento)
+                    else:
+                        st.info("Informe a conta / negociação antes de analisar para acompanhar itens entre reuniões.")
                 
-                # Botão de download
-                st.download_button(
-                    "💾 Baixar Análise Completa",
-                    data=conteudo_completo,
-                    file_name=f"analise_completa_reuniao_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.txt",
-                    mime="text/plain",
-                    use_container_width=True
-                )
+                # Downloads gerados só no clique (sem rerun, para manter a análise na tela)
+                st.markdown("### 💾 Exportar análise")
+                colunas_exportacao = st.columns(len(exportacao.FORMATOS))
+                for coluna, (formato, config_formato) in zip(colunas_exportacao, exportacao.FORMATOS.items()):
+                    with coluna:
+                        st.download_button(
+                            config_formato["rotulo"],
+                            data=exportacao.gerador(formato, resultados, transcricao_texto),
+                            file_name=exportacao.nome_arquivo(formato),
+                            mime=config_formato["mime"],
+                            on_click="ignore",
+                            use_container_width=True
+                        )
             else:
                 st.error(resultados["analise_principal"])
     else:
@@ -1010,6 +1258,7 @@ with st.sidebar:
     4. **Tasks**: Cards detalhados com responsável e prazo
     5. **Entregáveis**: Documentos e materiais COMBINADOS
     6. **Próximos Passos**: Encaminhamentos e agenda
+    7. **Acompanhamento**: Itens em aberto reconciliados entre reuniões da mesma conta
     
     ### Diferenciais:
     - ✅ Dashboard interativo com gráficos Plotly
@@ -1017,4 +1266,55 @@ with st.sidebar:
     - ✅ Radar charts de performance individual
     - ✅ Métricas quantitativas de participação
     - ✅ Insights automáticos baseados em dados
+    - ✅ Detector local de sinais (perguntas, objeções, SPIN) para conferir as métricas do LLM
+    - ✅ Compactação da transcrição (muletas, repetições e mensagens do sistema) antes dos prompts
     """)
+    
+    with st.expander("🚦 Limites de taxa"):
+        estatisticas_limites = [e for e in limitador.estatisticas() if e["atendidas"] or e["na_fila"]]
+        if estatisticas_limites:
+            st.dataframe(pd.DataFrame(estatisticas_limites).rename(columns={
+                "servico": "Serviço",
+                "na_fila": "Na fila",
+                "sessoes_na_fila": "Sessões na fila",
+                "atendidas": "Atendidas",
+                "limites_excedidos": "429s",
+                "espera_p50": "Espera p50 (s)",
+                "espera_p95": "Espera p95 (s)"
+            }).round(2), hide_index=True)
+        else:
+            st.caption("Nenhuma chamada limitada neste servidor ainda.")
+    
+    cache_rag = cache_recuperacao.obter_cache()
+    if cache_rag:
+        with st.expander("🗃️ Cache de recuperação"):
+            estatisticas_cache = cache_rag.estatisticas()
+            st.markdown(
+                f"**Acertos:** {estatisticas_cache['acertos']}/{estatisticas_cache['consultas']} "
+                f"({estatisticas_cache['taxa_acerto']:.0%}) • "
+                f"**Entradas:** {estatisticas_cache['entradas']}/{estatisticas_cache['capacidade']}"
+            )
+            if estatisticas_cache["similaridade_media"] is not None:
+                st.markdown(f"**Similaridade média dos acertos:** {estatisticas_cache['similaridade_media']:.3f}")
+            st.caption(
+                f"Consultas com similaridade ≥ {estatisticas_cache['limiar']:.2f} reaproveitam o resultado da busca vetorial. "
+                f"Invalidações: {estatisticas_cache['invalidacoes']} • expiradas removidas: {estatisticas_cache['expiradas']}."
+            )
+            if st.button("Limpar cache de recuperação"):
+                cache_rag.invalidar()
+    
+    with st.expander("🛰️ Provedores de LLM"):
+        estatisticas_llm = provedores.obter_roteador().estatisticas()
+        st.markdown("**Circuitos:** " + ", ".join(
+            f"{nome} ({estado})" for nome, estado in estatisticas_llm["disjuntores"].items()
+        ))
+        if estatisticas_llm["requisicoes"]:
+            st.markdown(
+                f"**Requisições:** {estatisticas_llm['requisicoes']} • "
+                f"hedge {estatisticas_llm['taxa_hedge']:.0%} • "
+                f"failover {estatisticas_llm['taxa_failover']:.0%} • "
+                f"falhas {estatisticas_llm['falhas']}"
+            )
+            st.dataframe(pd.DataFrame(estatisticas_llm["latencias"]).round(2), hide_index=True)
+        else:
+            st.caption("Nenhuma requisição registrada neste servidor ainda.")
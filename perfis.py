@@ -0,0 +1,116 @@
+"""
+Perfis de latência da análise (rápido / equilibrado / completo).
+
+Cada perfil define o modelo, o limite de tokens de saída, a profundidade do
+RAG (documentos por consulta e orçamento de tokens do contexto) e quais
+gerações rodam. O orçamento de raciocínio não é configurável: o SDK fixado
+(google-generativeai 0.8.5) não envia `thinking_config`, e cada modelo usa o
+seu padrão. Nos modelos que raciocinam por padrão os tokens de raciocínio
+contam no limite de saída, então o limite do perfil não é enviado a eles. As latências e custos medidos de cada perfil são acumulados no
+processo para exibição ao lado do seletor.
+"""
+import statistics
+import threading
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+
+PERFIS = {
+    "rapido": {
+        "nome": "⚡ Rápido",
+        "descricao": "Triagem em poucos segundos para o vendedor: só a extração estruturada, com o modelo mais leve.",
+        "modelo": "gemini-2.5-flash-lite",
+        "max_output_tokens": 4096,
+        "limite_rag": 2,
+        "orcamento_tokens_rag": 400,
+        "analise_narrativa": False,
+        "extracao_estruturada": True,
+    },
+    "equilibrado": {
+        "nome": "⚖️ Equilibrado",
+        "descricao": "Análise narrativa e extração estruturada com o modelo intermediário.",
+        "modelo": "gemini-2.5-flash",
+        "max_output_tokens": 8192,
+        "limite_rag": 5,
+        "orcamento_tokens_rag": 1200,
+        "analise_narrativa": True,
+        "extracao_estruturada": True,
+    },
+    "completo": {
+        "nome": "🔬 Completo",
+        "descricao": "Revisão gerencial: modelo mais capaz, mais tokens de saída e RAG mais profundo.",
+        "modelo": "gemini-2.5-pro",
+        "max_output_tokens": 32768,
+        "limite_rag": 8,
+        "orcamento_tokens_rag": 2400,
+        "analise_narrativa": True,
+        "extracao_estruturada": True,
+    },
+}
+
+PERFIL_PADRAO = "equilibrado"
+
+# Modelos Gemini com raciocínio dinâmico por padrão: sem limite de saída, que
+# seria consumido pelo raciocínio e truncaria o JSON da extração
+MODELOS_COM_RACIOCINIO = frozenset({"gemini-2.5-flash", "gemini-2.5-pro"})
+
+# Preço por milhão de tokens (USD): entrada, entrada em cache e saída
+PRECOS_MODELOS = {
+    "gemini-2.5-flash-lite": {"entrada": 0.10, "cache": 0.025, "saida": 0.40},
+    "gemini-2.5-flash": {"entrada": 0.30, "cache": 0.075, "saida": 2.50},
+    "gemini-2.5-pro": {"entrada": 1.25, "cache": 0.31, "saida": 10.00},
+    "gpt-4.1-mini": {"entrada": 0.40, "cache": 0.10, "saida": 1.60},
+    "claude-sonnet-4-5": {"entrada": 3.00, "cache": 0.30, "saida": 15.00},
+}
+
+# Número de execuções recentes consideradas nas estatísticas de cada perfil
+JANELA_MEDICOES = 50
+
+_medicoes: Dict[str, deque] = defaultdict(lambda: deque(maxlen=JANELA_MEDICOES))
+_lock = threading.Lock()
+
+
+def configuracao_geracao(perfil: Dict) -> Dict:
+    """
+    Configuração de geração do Gemini para o perfil. O google-generativeai
+    fixado não aceita `thinking_config`; nos modelos que raciocinam, o limite
+    de saída fica no padrão do modelo (o do perfil vale para os demais e para
+    os provedores de failover).
+    """
+    if perfil["modelo"] in MODELOS_COM_RACIOCINIO:
+        return {}
+    return {"max_output_tokens": perfil["max_output_tokens"]}
+
+
+def custo_estimado(modelo: str, uso_tokens: List[Dict]) -> float:
+    """Custo em USD das chamadas de uma análise, a partir do consumo de tokens"""
+    precos = PRECOS_MODELOS.get(modelo)
+    if not precos:
+        return 0.0
+    custo = 0.0
+    for uso in uso_tokens:
+        em_cache = uso.get("tokens_em_cache", 0)
+        sem_cache = max(uso.get("tokens_entrada", 0) - em_cache, 0)
+        saida = max(uso.get("tokens_total", 0) - uso.get("tokens_entrada", 0), uso.get("tokens_saida", 0))
+        custo += (sem_cache * precos["entrada"] + em_cache * precos["cache"] + saida * precos["saida"]) / 1_000_000
+    return custo
+
+
+def registrar_execucao(perfil_id: str, segundos: float, custo: float):
+    """Registra latência e custo medidos de uma análise"""
+    with _lock:
+        _medicoes[perfil_id].append((segundos, custo))
+
+
+def estatisticas(perfil_id: str) -> Optional[Dict]:
+    """Latência mediana/p95 e custo médio das execuções recentes do perfil"""
+    with _lock:
+        medicoes = list(_medicoes.get(perfil_id, ()))
+    if not medicoes:
+        return None
+    latencias = sorted(m[0] for m in medicoes)
+    return {
+        "execucoes": len(medicoes),
+        "latencia_p50": statistics.median(latencias),
+        "latencia_p95": latencias[min(len(latencias) - 1, int(round(0.95 * (len(latencias) - 1))))],
+        "custo_medio": statistics.fmean(m[1] for m in medicoes),
+    }
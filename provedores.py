@@ -0,0 +1,653 @@
+"""
+Abstração de provedores de LLM com timeouts, circuit breakers, hedging e failover.
+
+Cada provedor (Gemini, OpenAI, Anthropic ou um stub local) implementa
+`gerar(system_instruction, prompt, perfil, nome_prompt)` e devolve um dict com
+o texto, o consumo de tokens e o modelo usado. O RoteadorLLM escolhe o
+primeiro provedor com o circuito fechado e, se ele não responder até o p95
+das suas latências recentes, dispara uma requisição de reserva no próximo
+provedor; vale a primeira resposta válida. Decisões de roteamento e
+latências de cauda ficam registradas para consulta.
+
+O tempo de espera na fila do limitador de taxa não conta como latência do
+provedor: não entra nas amostras do hedge nem no timeout da chamada, e uma
+espera além do timeout do provedor (limitador.ErroLimiteTaxa) leva ao
+failover sem abrir o circuito. Chamadas abandonadas ainda na fila não chegam
+ao provedor.
+
+Chamadas abandonadas (perdedoras do hedge ou expiradas) continuam ocupando
+uma vaga do seu provedor até terminarem. Cada provedor tem um número limitado
+de vagas: um provedor lento só esgota as próprias e passa a ser pulado como
+se estivesse com o circuito aberto, hedges só saem com vagas de sobra e, sem
+vaga em nenhum provedor dentro do timeout, a geração falha em vez de
+enfileirar atrás de chamadas presas.
+"""
+import contextvars
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Union
+
+import cache_gemini
+import gravacao
+import limitador
+import perfis
+
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
+
+# Ordem de preferência dos provedores e hedging (desligável por variável de ambiente)
+PROVEDORES_LLM = os.getenv('PROVEDORES_LLM', 'gemini,openai,anthropic')
+HEDGE_LLM = os.getenv('HEDGE_LLM', '1') not in ('0', 'false', 'False')
+
+# Amostras mínimas antes de usar o p95 medido como prazo de hedge
+MIN_AMOSTRAS_HEDGE = 10
+JANELA_LATENCIAS = 200
+
+# Circuit breaker: falhas consecutivas para abrir e tempo até permitir nova tentativa
+FALHAS_PARA_ABRIR = 3
+SEGUNDOS_CIRCUITO_ABERTO = 60
+
+# Fração das vagas do provedor que um hedge precisa deixar livre para chamadas primárias
+FRACAO_RESERVA_PRIMARIAS = 0.25
+
+
+class ErroProvedores(Exception):
+    """Nenhum provedor conseguiu produzir uma resposta válida"""
+
+
+class Provedor:
+    """Interface comum dos provedores de LLM"""
+
+    nome = "base"
+    # Tempo máximo de espera por uma resposta deste provedor
+    timeout = 120.0
+    # Prazo de hedge usado enquanto não há amostras suficientes de latência
+    prazo_hedge_padrao = 30.0
+
+    def chave(self, perfil: Dict, nome_prompt: str) -> str:
+        """Identifica a série de latências (provedor + modelo + tipo de prompt)"""
+        return f"{self.nome}:{self.modelo_para(perfil)}:{nome_prompt}"
+
+    def modelo_para(self, perfil: Dict) -> str:
+        raise NotImplementedError
+
+    def gerar(self, system_instruction: str, prompt: str, perfil: Dict, nome_prompt: str) -> Dict:
+        raise NotImplementedError
+
+
+class ProvedorGemini(Provedor):
+    nome = "gemini"
+    timeout = float(os.getenv('TIMEOUT_GEMINI', '180'))
+
+    def modelo_para(self, perfil: Dict) -> str:
+        return perfil["modelo"]
+
+    def gerar(self, system_instruction, prompt, perfil, nome_prompt):
+        prompt_cache = cache_gemini.obter_prompt_em_cache(perfil["modelo"], system_instruction, nome_prompt)
+        tokens = limitador.estimar_tokens(system_instruction, prompt)
+
+        def executar():
+            response = limitador.chamar_com_limite(self.nome, tokens, lambda: prompt_cache.modelo().generate_content(
+                prompt,
+                generation_config=perfis.configuracao_geracao(perfil),
+                request_options={"timeout": self.timeout},
+            ))
+            uso = cache_gemini.uso_tokens(response, nome_prompt)
+            limitador.obter_limitador(self.nome).acertar_tokens(tokens, uso["tokens_total"])
+            return response
+
+        response = gravacao.chamar(
+            "gemini.generate_content",
+            {
+                "modelo": perfil["modelo"],
+                "system_instruction": system_instruction,
+                "prompt": prompt,
+                "max_output_tokens": perfil["max_output_tokens"],
+            },
+            executar,
+            serializar=gravacao.serializar_resposta_gemini,
+            desserializar=gravacao.desserializar_resposta_gemini,
+        )
+        return {
+            "texto": response.text,
+            "uso_tokens": cache_gemini.uso_tokens(response, nome_prompt),
+            "modelo": perfil["modelo"],
+            "cache_ativo": prompt_cache.ativo,
+        }
+
+
+class ProvedorOpenAI(Provedor):
+    nome = "openai"
+    timeout = float(os.getenv('TIMEOUT_OPENAI', '120'))
+
+    def __init__(self, modelo: str = os.getenv('MODELO_OPENAI', 'gpt-4.1-mini')):
+        import openai
+        self.modelo = modelo
+        # Sem repetições do SDK: o limitador repete 429, 5xx e erros de conexão e contabiliza cada tentativa
+        self._client = openai.OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+
+    def modelo_para(self, perfil):
+        return self.modelo
+
+    def gerar(self, system_instruction, prompt, perfil, nome_prompt):
+        tokens = limitador.estimar_tokens(system_instruction, prompt)
+
+        def executar():
+            response = limitador.chamar_com_limite(self.nome, tokens, lambda: self._client.chat.completions.create(
+                model=self.modelo,
+                messages=[
+                    {"role": "system", "content": system_instruction},
+                    {"role": "user", "content": prompt},
+                ],
+                max_completion_tokens=perfil["max_output_tokens"],
+                timeout=self.timeout,
+            ))
+            uso = response.usage
+            limitador.obter_limitador(self.nome).acertar_tokens(tokens, uso.total_tokens)
+            detalhes = getattr(uso, "prompt_tokens_details", None)
+            em_cache = getattr(detalhes, "cached_tokens", 0) or 0
+            return {
+                "texto": response.choices[0].message.content or "",
+                "uso_tokens": {
+                    "etapa": nome_prompt,
+                    "tokens_entrada": uso.prompt_tokens,
+                    "tokens_em_cache": em_cache,
+                    "tokens_saida": uso.completion_tokens,
+                    "tokens_total": uso.total_tokens,
+                    "economia_tokens_equivalentes": round(em_cache * 0.75),
+                },
+                "modelo": self.modelo,
+                "cache_ativo": False,
+            }
+
+        return gravacao.chamar("openai.chat", {
+            "modelo": self.modelo,
+            "system_instruction": system_instruction,
+            "prompt": prompt,
+            "max_output_tokens": perfil["max_output_tokens"],
+        }, executar)
+
+
+class ProvedorAnthropic(Provedor):
+    nome = "anthropic"
+    timeout = float(os.getenv('TIMEOUT_ANTHROPIC', '120'))
+
+    def __init__(self, modelo: str = os.getenv('MODELO_ANTHROPIC', 'claude-sonnet-4-5')):
+        import anthropic
+        self.modelo = modelo
+        # Sem repetições do SDK: o limitador repete 429, 5xx e erros de conexão e contabiliza cada tentativa
+        self._client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY, max_retries=0)
+
+    def modelo_para(self, perfil):
+        return self.modelo
+
+    def gerar(self, system_instruction, prompt, perfil, nome_prompt):
+        tokens = limitador.estimar_tokens(system_instruction, prompt)
+
+        def executar():
+            response = limitador.chamar_com_limite(self.nome, tokens, lambda: self._client.messages.create(
+                model=self.modelo,
+                max_tokens=perfil["max_output_tokens"],
+                # O system prompt fixo é marcado para o cache de prompt da Anthropic
+                system=[{"type": "text", "text": system_instruction, "cache_control": {"type": "ephemeral"}}],
+                messages=[{"role": "user", "content": prompt}],
+                timeout=self.timeout,
+            ))
+            uso = response.usage
+            em_cache = getattr(uso, "cache_read_input_tokens", 0) or 0
+            entrada = uso.input_tokens + em_cache + (getattr(uso, "cache_creation_input_tokens", 0) or 0)
+            limitador.obter_limitador(self.nome).acertar_tokens(tokens, entrada + uso.output_tokens)
+            return {
+                "texto": "".join(bloco.text for bloco in response.content if bloco.type == "text"),
+                "uso_tokens": {
+                    "etapa": nome_prompt,
+                    "tokens_entrada": entrada,
+                    "tokens_em_cache": em_cache,
+                    "tokens_saida": uso.output_tokens,
+                    "tokens_total": entrada + uso.output_tokens,
+                    "economia_tokens_equivalentes": round(em_cache * 0.9),
+                },
+                "modelo": self.modelo,
+                "cache_ativo": em_cache > 0,
+            }
+
+        return gravacao.chamar("anthropic.messages", {
+            "modelo": self.modelo,
+            "system_instruction": system_instruction,
+            "prompt": prompt,
+            "max_output_tokens": perfil["max_output_tokens"],
+        }, executar)
+
+
+class ProvedorStub(Provedor):
+    """
+    Provedor local para testes: latência e falhas configuráveis, sem rede. Com
+    `limitar`, passa pelo limitador de taxa do serviço `nome` como os provedores reais.
+    """
+
+    def __init__(self, nome: str, latencia: Callable[[], float] = lambda: 0.05,
+                 texto: Union[str, Dict[str, str]] = "{}", taxa_falha: float = 0.0, timeout: float = 10.0,
+                 prazo_hedge_padrao: float = 1.0, seed: Optional[int] = None, limitar: bool = False):
+        self.nome = nome
+        self.limitar = limitar
+        self.latencia = latencia
+        self.texto = texto
+        self.taxa_falha = taxa_falha
+        self.timeout = timeout
+        self.prazo_hedge_padrao = prazo_hedge_padrao
+        self._rng = random.Random(seed)
+
+    def modelo_para(self, perfil):
+        return "stub"
+
+    def gerar(self, system_instruction, prompt, perfil, nome_prompt):
+        if self.limitar:
+            limitador.chamar_com_limite(self.nome, limitador.estimar_tokens(system_instruction, prompt),
+                                        lambda: time.sleep(self.latencia()), tentativas=1)
+        else:
+            time.sleep(self.latencia())
+        if self._rng.random() < self.taxa_falha:
+            raise RuntimeError(f"Falha simulada em {self.nome}")
+        # O texto pode variar por tipo de prompt ("analise", "outputs", ...)
+        texto = self.texto.get(nome_prompt, "") if isinstance(self.texto, dict) else self.texto
+        return {
+            "texto": texto,
+            "uso_tokens": {
+                "etapa": nome_prompt,
+                "tokens_entrada": len(prompt) // 4,
+                "tokens_em_cache": 0,
+                "tokens_saida": len(texto) // 4,
+                "tokens_total": (len(prompt) + len(texto)) // 4,
+                "economia_tokens_equivalentes": 0,
+            },
+            "modelo": "stub",
+            "cache_ativo": False,
+        }
+
+
+class CircuitBreaker:
+    """Abre após falhas consecutivas e libera uma única tentativa depois do tempo de espera"""
+
+    def __init__(self, falhas_para_abrir: int = FALHAS_PARA_ABRIR,
+                 segundos_aberto: float = SEGUNDOS_CIRCUITO_ABERTO):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.segundos_aberto = segundos_aberto
+        self.falhas_consecutivas = 0
+        self._aberto_em: Optional[float] = None
+        # Meio aberto: a tentativa de teste em andamento (as demais são recusadas)
+        self._sonda = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            if self._aberto_em is None:
+                return "fechado"
+            if time.monotonic() - self._aberto_em >= self.segundos_aberto:
+                return "meio_aberto"
+            return "aberto"
+
+    def permite(self) -> bool:
+        """Aceitaria uma chamada agora (sem reservá-la)"""
+        estado = self.estado
+        return estado == "fechado" or (estado == "meio_aberto" and not self._sonda)
+
+    def reservar(self) -> Optional[str]:
+        """
+        Autoriza uma chamada: "fechado", "sonda" (meio aberto, só a primeira até
+        o resultado dela) ou None se recusada
+        """
+        with self._lock:
+            if self._aberto_em is None:
+                return "fechado"
+            if time.monotonic() - self._aberto_em < self.segundos_aberto or self._sonda:
+                return None
+            self._sonda = True
+            return "sonda"
+
+    def liberar(self, reserva: Optional[str]):
+        """Devolve a reserva de uma chamada que não chegou ao provedor"""
+        if reserva == "sonda":
+            with self._lock:
+                self._sonda = False
+
+    def sucesso(self):
+        with self._lock:
+            self.falhas_consecutivas = 0
+            self._aberto_em = None
+            self._sonda = False
+
+    def falha(self):
+        with self._lock:
+            self._sonda = False
+            self.falhas_consecutivas += 1
+            if self.falhas_consecutivas >= self.falhas_para_abrir:
+                self._aberto_em = time.monotonic()
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))]
+
+
+class RoteadorLLM:
+    """Roteia cada geração entre os provedores com failover e hedging"""
+
+    def __init__(self, provedores: List[Provedor], hedge: bool = True, max_workers: int = 16):
+        if not provedores:
+            raise ValueError("Informe ao menos um provedor")
+        self.provedores = provedores
+        self.hedge = hedge
+        self.disjuntores = {p.nome: CircuitBreaker() for p in provedores}
+        self._latencias: Dict[str, deque] = defaultdict(lambda: deque(maxlen=JANELA_LATENCIAS))
+        self.decisoes: deque = deque(maxlen=JANELA_LATENCIAS)
+        # max_workers vagas por provedor, uma por chamada em execução, inclusive as abandonadas
+        self._executor = ThreadPoolExecutor(max_workers=max_workers * len(provedores), thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._capacidade = max_workers
+        self._reserva_primarias = max(1, int(max_workers * FRACAO_RESERVA_PRIMARIAS))
+        self._em_execucao: Counter = Counter()
+        self._vagas = threading.Condition()
+        self.rejeitadas = 0
+
+    def _reservar_vaga(self, nomes: List[str], prazo: Optional[float], reserva: int = 0) -> Optional[str]:
+        """
+        Ocupa uma vaga do primeiro dos provedores que tiver uma livre, esperando
+        até `prazo` (None: não espera). Devolve o nome do provedor ou None.
+        """
+        with self._vagas:
+            while True:
+                for nome in nomes:
+                    if self._em_execucao[nome] + reserva < self._capacidade:
+                        self._em_execucao[nome] += 1
+                        return nome
+                restante = prazo - time.monotonic() if prazo is not None else 0
+                if restante <= 0:
+                    return None
+                self._vagas.wait(restante)
+
+    def _liberar_vaga(self, nome: str):
+        with self._vagas:
+            self._em_execucao[nome] -= 1
+            self._vagas.notify_all()
+
+    def prazo_hedge(self, provedor: Provedor, chave: str) -> float:
+        """p95 das latências recentes do provedor, ou o prazo padrão sem amostras suficientes"""
+        with self._lock:
+            amostras = list(self._latencias.get(chave, ()))
+        if len(amostras) < MIN_AMOSTRAS_HEDGE:
+            return provedor.prazo_hedge_padrao
+        return _percentil(amostras, 0.95)
+
+    def _executar(self, provedor: Provedor, chave: str, expirado: threading.Event,
+                  chamada: limitador.ChamadaLimitada, reserva_disjuntor: str,
+                  validar: Callable[[Dict], bool], args) -> Dict:
+        inicio = time.monotonic()
+        limitador.definir_chamada(chamada)
+        try:
+            resposta = provedor.gerar(*args)
+            if not validar(resposta):
+                raise ValueError("Resposta inválida")
+        except (limitador.ErroLimiteTaxa, limitador.ChamadaAbandonada, gravacao.ErroGravacao):
+            # Não chegou ao provedor (fila cheia, abandonada ou ausente do cassete): não conta como falha dele
+            self.disjuntores[provedor.nome].liberar(reserva_disjuntor)
+            raise
+        except Exception:
+            if not expirado.is_set():
+                self.disjuntores[provedor.nome].falha()
+            raise
+        # O tempo na fila do limitador não é latência do provedor
+        latencia = time.monotonic() - inicio - chamada.espera
+        # A latência é registrada mesmo para respostas que perderam a corrida: é a cauda real
+        with self._lock:
+            self._latencias[chave].append(latencia)
+        if not expirado.is_set():
+            self.disjuntores[provedor.nome].sucesso()
+        resposta["latencia"] = latencia
+        return resposta
+
+    def gerar(self, system_instruction: str, prompt: str, perfil: Dict, nome_prompt: str,
+              validar: Optional[Callable[[Dict], bool]] = None) -> Dict:
+        """Gera a resposta com o primeiro provedor disponível, com hedge e failover"""
+        validar = validar or (lambda r: bool((r.get("texto") or "").strip()))
+        fila = [p for p in self.provedores if self.disjuntores[p.nome].permite()]
+        if not fila:
+            raise ErroProvedores("Todos os provedores de LLM estão com o circuito aberto")
+
+        inicio = time.monotonic()
+        pendentes = {}
+        tentativas = []
+        decisao = {"nome_prompt": nome_prompt, "hedge": False, "failover": False, "tentativas": tentativas}
+
+        def disparar(motivo: str):
+            lotados = []
+            while fila:
+                provedor = fila.pop(0)
+                disjuntor = self.disjuntores[provedor.nome]
+                # Meio aberto, só uma requisição de teste passa; as demais seguem para o próximo
+                reserva_disjuntor = disjuntor.reservar()
+                if reserva_disjuntor is None:
+                    tentativas.append({"provedor": provedor.nome, "motivo": motivo,
+                                       "status": "circuito_aberto", "latencia": 0.0})
+                    continue
+                reserva = self._reserva_primarias if motivo == "hedge" else 0
+                if not self._reservar_vaga([provedor.nome], None, reserva):
+                    # Vagas tomadas por chamadas lentas ou abandonadas: tenta o próximo provedor
+                    disjuntor.liberar(reserva_disjuntor)
+                    lotados.append(provedor)
+                    continue
+                return submeter(provedor, motivo, reserva_disjuntor)
+            if motivo == "hedge":
+                # Hedge sem vaga não sai; os provedores lotados continuam valendo para o failover
+                fila[:0] = lotados
+                return None
+            # Nenhum provedor com vaga livre: espera a primeira que abrir, até o timeout do preferido
+            prazo = time.monotonic() + lotados[0].timeout if lotados else None
+            while lotados:
+                nome = self._reservar_vaga([p.nome for p in lotados], prazo)
+                if nome is None:
+                    break
+                provedor = next(p for p in lotados if p.nome == nome)
+                reserva_disjuntor = self.disjuntores[nome].reservar()
+                if reserva_disjuntor is not None:
+                    return submeter(provedor, motivo, reserva_disjuntor)
+                # O circuito abriu durante a espera
+                self._liberar_vaga(nome)
+                lotados.remove(provedor)
+            with self._vagas:
+                self.rejeitadas += bool(lotados)
+            for provedor in lotados:
+                tentativas.append({"provedor": provedor.nome, "motivo": motivo,
+                                   "status": "sem_capacidade", "latencia": 0.0})
+            return None
+
+        def submeter(provedor: Provedor, motivo: str, reserva_disjuntor: str):
+            chave = provedor.chave(perfil, nome_prompt)
+            expirado = threading.Event()
+            disparo = time.monotonic()
+            # A espera na fila do limitador vai até o timeout do provedor; o timeout
+            # da chamada só corre depois que ela sai da fila
+            chamada = limitador.ChamadaLimitada(prazo_fila=disparo + provedor.timeout)
+            # O contexto leva a sessão do Streamlit para o limitador de taxa na thread do executor
+            futuro = self._executor.submit(
+                contextvars.copy_context().run, self._executar, provedor, chave, expirado, chamada,
+                reserva_disjuntor, validar, (system_instruction, prompt, perfil, nome_prompt),
+            )
+            # A vaga só volta quando a chamada termina, mesmo que seja abandonada antes
+            futuro.add_done_callback(lambda _futuro, nome=provedor.nome: self._liberar_vaga(nome))
+            pendentes[futuro] = (provedor, disparo, expirado, motivo, chamada)
+            return provedor, chave
+
+        disparado = disparar("primario")
+        if disparado is None:
+            decisao.update({"vencedor": None, "latencia_total": time.monotonic() - inicio, "instante": time.time()})
+            self.decisoes.append(decisao)
+            resumo = "; ".join(f"{t['provedor']}: {t['status']}" for t in tentativas)
+            raise ErroProvedores(f"Nenhum provedor disponível ({resumo})")
+        primario, chave_primaria = disparado
+        chamada_primaria = next(iter(pendentes.values()))[4]
+        prazo_hedge = None
+        if self.hedge and fila:
+            prazo_hedge = inicio + self.prazo_hedge(primario, chave_primaria)
+
+        def tempo_provedor(ini: float, chamada: limitador.ChamadaLimitada, agora: float) -> float:
+            """Tempo da chamada fora da fila do limitador"""
+            return agora - ini - chamada.espera_ate(agora)
+
+        while pendentes:
+            agora = time.monotonic()
+            limites = [agora + p.timeout - tempo_provedor(ini, chamada, agora)
+                       for p, ini, _, _, chamada in pendentes.values()]
+            if prazo_hedge is not None:
+                # O hedge espera o p95 do provedor, sem contar a fila do limitador
+                limites.append(prazo_hedge + chamada_primaria.espera_ate(agora))
+            # Acorda ao menos a cada segundo: o tempo de fila só é conhecido aos poucos
+            feitos, _ = wait(list(pendentes), timeout=min(max(0.0, min(limites) - agora), 1.0),
+                             return_when=FIRST_COMPLETED)
+
+            for futuro in feitos:
+                provedor, ini, _, motivo, chamada = pendentes.pop(futuro)
+                try:
+                    resposta = futuro.result()
+                except Exception as e:
+                    status = "fila" if isinstance(e, limitador.ErroLimiteTaxa) else "erro"
+                    tentativas.append({"provedor": provedor.nome, "motivo": motivo, "status": status,
+                                       "erro": str(e)[:200], "latencia": time.monotonic() - ini})
+                    if fila and not pendentes:
+                        decisao["failover"] = True
+                        disparar("failover")
+                    continue
+
+                tentativas.append({"provedor": provedor.nome, "motivo": motivo, "status": "ok",
+                                   "latencia": resposta["latencia"]})
+                for _, (outro, outro_ini, _, outro_motivo, outra_chamada) in pendentes.items():
+                    # Perdedoras ainda na fila do limitador não chegam ao provedor
+                    outra_chamada.abandonada.set()
+                    tentativas.append({"provedor": outro.nome, "motivo": outro_motivo,
+                                       "status": "descartado", "latencia": time.monotonic() - outro_ini})
+                decisao.update({
+                    "vencedor": provedor.nome,
+                    "latencia_total": time.monotonic() - inicio,
+                    "instante": time.time(),
+                })
+                self.decisoes.append(decisao)
+                resposta["provedor"] = provedor.nome
+                resposta["roteamento"] = decisao
+                return resposta
+
+            agora = time.monotonic()
+            for futuro, (provedor, ini, expirado, motivo, chamada) in list(pendentes.items()):
+                if tempo_provedor(ini, chamada, agora) >= provedor.timeout:
+                    del pendentes[futuro]
+                    expirado.set()
+                    chamada.abandonada.set()
+                    futuro.cancel()
+                    self.disjuntores[provedor.nome].falha()
+                    tentativas.append({"provedor": provedor.nome, "motivo": motivo,
+                                       "status": "timeout", "latencia": agora - ini})
+            if prazo_hedge is not None and agora >= prazo_hedge + chamada_primaria.espera_ate(agora):
+                prazo_hedge = None
+                if fila and pendentes and disparar("hedge") is not None:
+                    decisao["hedge"] = True
+            if fila and not pendentes:
+                decisao["failover"] = True
+                disparar("failover")
+
+        decisao.update({"vencedor": None, "latencia_total": time.monotonic() - inicio, "instante": time.time()})
+        self.decisoes.append(decisao)
+        resumo = "; ".join(f"{t['provedor']}: {t['status']}" for t in tentativas)
+        raise ErroProvedores(f"Nenhum provedor respondeu ({resumo})")
+
+    def estatisticas(self) -> Dict:
+        """Latências de cauda por série e resumo das decisões de roteamento"""
+        with self._lock:
+            series = {chave: list(valores) for chave, valores in self._latencias.items()}
+            decisoes = list(self.decisoes)
+        latencias = [
+            {
+                "serie": chave,
+                "amostras": len(valores),
+                "p50": statistics.median(valores),
+                "p95": _percentil(valores, 0.95),
+                "p99": _percentil(valores, 0.99),
+            }
+            for chave, valores in sorted(series.items()) if valores
+        ]
+        totais = [d["latencia_total"] for d in decisoes]
+        return {
+            "latencias": latencias,
+            "disjuntores": {nome: d.estado for nome, d in self.disjuntores.items()},
+            "requisicoes": len(decisoes),
+            "taxa_hedge": sum(d["hedge"] for d in decisoes) / len(decisoes) if decisoes else 0.0,
+            "taxa_failover": sum(d["failover"] for d in decisoes) / len(decisoes) if decisoes else 0.0,
+            "falhas": sum(d["vencedor"] is None for d in decisoes),
+            "vitorias": dict(Counter(d["vencedor"] for d in decisoes if d["vencedor"])),
+            "p50_total": statistics.median(totais) if totais else None,
+            "p99_total": _percentil(totais, 0.99) if totais else None,
+            "em_execucao": dict(self._em_execucao),
+            "rejeitadas": self.rejeitadas,
+        }
+
+
+_roteador: Optional[RoteadorLLM] = None
+_roteador_lock = threading.Lock()
+
+
+def criar_provedores(nomes: str = PROVEDORES_LLM) -> List[Provedor]:
+    """Instancia os provedores configurados, ignorando os que não têm credencial"""
+    fabricas = {
+        "gemini": lambda: ProvedorGemini(),
+        "openai": lambda: ProvedorOpenAI() if OPENAI_API_KEY else None,
+        "anthropic": lambda: ProvedorAnthropic() if ANTHROPIC_API_KEY else None,
+    }
+    provedores = []
+    for nome in (n.strip() for n in nomes.split(',')):
+        fabrica = fabricas.get(nome)
+        if fabrica is None:
+            continue
+        try:
+            provedor = fabrica()
+        except ImportError:
+            provedor = None
+        if provedor is not None:
+            provedores.append(provedor)
+    return provedores
+
+
+def obter_roteador() -> RoteadorLLM:
+    """Roteador compartilhado pelo processo (estado dos circuitos e latências entre sessões)"""
+    global _roteador
+    with _roteador_lock:
+        if _roteador is None:
+            _roteador = RoteadorLLM(criar_provedores(), hedge=HEDGE_LLM)
+        return _roteador
+
+
+def _simular(requisicoes: int = 200):
+    """Compara latências de cauda com e sem hedge usando provedores stub"""
+    rng = random.Random(7)
+
+    def latencia_com_cauda():
+        # 97% rápidas, 3% muito lentas: o p95 fica fora da cauda e o hedge a corta
+        return rng.uniform(0.01, 0.03) if rng.random() > 0.03 else rng.uniform(0.3, 0.5)
+
+    perfil = {"modelo": "stub", "max_output_tokens": 100}
+    for hedge in (False, True):
+        roteador = RoteadorLLM([
+            ProvedorStub("primario", latencia_com_cauda, texto="ok", prazo_hedge_padrao=0.05, seed=1),
+            ProvedorStub("reserva", lambda: rng.uniform(0.02, 0.04), texto="ok", seed=2),
+        ], hedge=hedge)
+        for _ in range(requisicoes):
+            roteador.gerar("sistema", "prompt", perfil, "teste")
+        est = roteador.estatisticas()
+        print(f"hedge={hedge}: p50={est['p50_total'] * 1000:.0f} ms, p99={est['p99_total'] * 1000:.0f} ms, "
+              f"taxa de hedge={est['taxa_hedge']:.0%}, vitórias={est['vitorias']}")
+
+
+if __name__ == "__main__":
+    _simular()
@@ -0,0 +1,250 @@
+"""
+Recuperação multiconsulta por etapa da jornada de vendas.
+
+Em vez de um único embedding da transcrição inteira, deriva consultas focadas
+para cada etapa da jornada avaliada na análise (abertura, descoberta,
+stakeholders, solução, objeções, fechamento) a partir dos trechos em que o
+detector de sinais encontrou evidência daquela etapa, mais uma consulta por
+objeção detectada. Todas as consultas são embedadas em uma única chamada à
+OpenAI e as buscas no AstraDB rodam em paralelo, de modo que a latência da
+recuperação fica próxima à de uma consulta só. Os resultados são fundidos por
+reciprocal rank fusion (RRF) e cortados por um orçamento de tokens do perfil.
+
+Variáveis de ambiente:
+    RAG_MAX_CONSULTAS=8
+    RAG_MAX_OBJECOES=2
+    RAG_RRF_K=60
+
+Uso:
+    python recuperacao.py <transcricao.txt>   # consultas geradas e, com credenciais, latência simples x multiconsulta
+"""
+import contextvars
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import base_conhecimento
+import embeddings_locais
+import limitador
+import sinais
+
+MAX_CONSULTAS = int(os.getenv('RAG_MAX_CONSULTAS', '8'))
+MAX_CONSULTAS_OBJECAO = int(os.getenv('RAG_MAX_OBJECOES', '2'))
+RRF_K = int(os.getenv('RAG_RRF_K', '60'))
+
+# Tamanho do trecho de cada documento no contexto do prompt
+TAMANHO_TRECHO = 500
+# Trechos da transcrição por consulta e caracteres ao redor de cada sinal
+TRECHOS_POR_ETAPA = 3
+JANELA_TRECHO = 160
+# A consulta geral usa o início da transcrição (limite de entrada do modelo de embedding)
+MAX_CARACTERES_GERAL = 6000
+
+# Etapas da jornada do SYSTEM_PROMPT_ANALISE e as categorias de sinais que as evidenciam
+ETAPAS_JORNADA = [
+    {
+        "id": "abertura",
+        "nome": "Abertura e conexão inicial",
+        "consulta": "Abertura de reunião de vendas: rapport, agenda e alinhamento de expectativas.",
+        "categorias": (),
+    },
+    {
+        "id": "descoberta",
+        "nome": "Exploração e diagnóstico",
+        "consulta": "Perguntas de descoberta SPIN e Challenger para diagnosticar dor, impacto e urgência do cliente.",
+        "categorias": sinais.CATEGORIAS_SPIN,
+    },
+    {
+        "id": "stakeholders",
+        "nome": "Mapeamento de stakeholders",
+        "consulta": "Mapeamento de decisores, influenciadores e processo de aprovação da compra.",
+        "categorias": ("decisao",),
+    },
+    {
+        "id": "solucao",
+        "nome": "Apresentação de solução e valor",
+        "consulta": "Apresentação de solução com storytelling de valor, ROI e proposta personalizada.",
+        "categorias": ("preco",),
+    },
+    {
+        "id": "objecoes",
+        "nome": "Gestão de objeções",
+        "consulta": "Técnicas de tratamento de objeções: isolar, reverter e reancorar valor.",
+        "categorias": ("objecao",),
+    },
+    {
+        "id": "fechamento",
+        "nome": "Fechamento",
+        "consulta": "Fechamento da reunião com próximo passo concreto, compromisso e prazo definidos.",
+        "categorias": ("compromisso",),
+    },
+]
+
+def _trecho(transcricao: str, ocorrencia: Dict) -> str:
+    inicio = max(ocorrencia["inicio"] - JANELA_TRECHO, 0)
+    return ' '.join(transcricao[inicio:ocorrencia["fim"] + JANELA_TRECHO].split())
+
+
+def gerar_consultas(transcricao: str, sinais_transcricao: Optional[Dict] = None) -> List[Dict]:
+    """Consultas focadas por etapa da jornada e por objeção detectada"""
+    if sinais_transcricao is None:
+        sinais_transcricao = sinais.detectar_sinais(transcricao)
+    ocorrencias = sinais_transcricao.get("ocorrencias", [])
+
+    consultas = [{"etapa": "geral", "nome": "Reunião completa", "texto": transcricao[:MAX_CARACTERES_GERAL]}]
+    for etapa in ETAPAS_JORNADA:
+        if etapa["id"] == "abertura":
+            trechos = [' '.join(transcricao[:2 * JANELA_TRECHO].split())]
+        else:
+            trechos = []
+            for ocorrencia in ocorrencias:
+                if ocorrencia["categoria"] in etapa["categorias"]:
+                    trecho = _trecho(transcricao, ocorrencia)
+                    if trecho not in trechos:
+                        trechos.append(trecho)
+                if len(trechos) >= TRECHOS_POR_ETAPA:
+                    break
+        # Etapa sem evidência na reunião não vira consulta
+        if trechos and any(trechos):
+            consultas.append({
+                "etapa": etapa["id"], "nome": etapa["nome"],
+                "texto": etapa["consulta"] + "\n" + "\n".join(trechos),
+            })
+
+    vistos = set()
+    for ocorrencia in ocorrencias:
+        if len(vistos) >= MAX_CONSULTAS_OBJECAO:
+            break
+        if ocorrencia["categoria"] != "objecao" or ocorrencia["termo"] in vistos:
+            continue
+        vistos.add(ocorrencia["termo"])
+        consultas.append({
+            "etapa": "objecao", "nome": f"Objeção: {ocorrencia['trecho']}",
+            "texto": "Como responder à objeção do cliente: " + _trecho(transcricao, ocorrencia),
+        })
+    return consultas[:MAX_CONSULTAS]
+
+
+def _chave_documento(doc: Dict) -> str:
+    return str(doc.get("_id") or embeddings_locais.texto_documento(doc))
+
+
+def fundir_rrf(listas: List[List[Dict]], k: int = RRF_K) -> List[Dict]:
+    """Reciprocal rank fusion: soma 1/(k + posição) de cada documento nas listas"""
+    pontuacoes: Dict[str, float] = {}
+    documentos: Dict[str, Dict] = {}
+    for lista in listas:
+        for posicao, doc in enumerate(lista, 1):
+            chave = _chave_documento(doc)
+            pontuacoes[chave] = pontuacoes.get(chave, 0.0) + 1.0 / (k + posicao)
+            documentos.setdefault(chave, doc)
+    ordem = sorted(pontuacoes, key=pontuacoes.get, reverse=True)
+    return [{**documentos[chave], "$rrf": pontuacoes[chave]} for chave in ordem]
+
+
+def trecho_documento(doc: Dict) -> str:
+    """Trecho do documento como entra no contexto do prompt"""
+    doc_content = str({k: v for k, v in doc.items() if k != "$rrf"})
+    doc_clean = doc_content.replace('{', '').replace('}', '').replace("'", "").replace('"', '')
+    return doc_clean[:TAMANHO_TRECHO]
+
+
+def selecionar_por_orcamento(documentos: List[Dict], orcamento_tokens: int) -> List[Dict]:
+    """Documentos na ordem da fusão enquanto couberem no orçamento de tokens"""
+    selecionados = []
+    usado = 0
+    for doc in documentos:
+        custo = limitador.estimar_tokens(trecho_documento(doc))
+        if usado + custo > orcamento_tokens:
+            continue
+        selecionados.append(doc)
+        usado += custo
+    return selecionados
+
+
+def montar_contexto(documentos: List[Dict]) -> str:
+    """Seção de conhecimento técnico do prompt"""
+    if not documentos:
+        return ""
+    rag_context = "## CONHECIMENTO TÉCNICO RELEVANTE:\n\n"
+    for i, doc in enumerate(documentos, 1):
+        rag_context += f"--- Fonte {i} ---\n{trecho_documento(doc)}...\n\n"
+    return rag_context
+
+
+def _buscar_listas(astra_client, consultas: List[Dict], limit: int) -> Tuple[List[List[Dict]], str]:
+    """
+    Resultados de cada consulta e o modo usado: "openai" (AstraDB em paralelo),
+    "local" (índice local) ou "indisponivel".
+    """
+    textos = [c["texto"] for c in consultas]
+    if not base_conhecimento.EMBEDDINGS_LOCAIS:
+        try:
+            # Um único pedido de embeddings para todas as consultas
+            vetores = base_conhecimento.embeddings_openai(textos)
+            # Pool próprio da chamada, com uma thread por consulta: as threads ficam
+            # bloqueadas no limitador de taxa e não podem atrasar as buscas de
+            # outras sessões. O contexto leva a sessão do Streamlit para o limitador.
+            with ThreadPoolExecutor(max_workers=len(vetores), thread_name_prefix="rag") as executor:
+                futuros = [
+                    executor.submit(contextvars.copy_context().run,
+                                    base_conhecimento.buscar_por_vetor, astra_client, vetor, limit)
+                    for vetor in vetores
+                ]
+                return [f.result() for f in futuros], "openai"
+        except Exception:
+            pass
+    indice = embeddings_locais.obter_indice_local()
+    if indice is None:
+        return [[] for _ in consultas], "indisponivel"
+    return [indice.buscar(texto, limit=limit) for texto in textos], "local"
+
+
+def recuperar(astra_client, transcricao: str, limit: int, orcamento_tokens: int,
+              sinais_transcricao: Optional[Dict] = None, consultas: Optional[List[Dict]] = None) -> Dict:
+    """
+    Recuperação multiconsulta: documentos fundidos, modo e resumo das consultas.
+    `consultas` reaproveita as já geradas por gerar_consultas (ex.: na admissão).
+    """
+    inicio = time.perf_counter()
+    if consultas is None:
+        consultas = gerar_consultas(transcricao, sinais_transcricao)
+    listas, modo = _buscar_listas(astra_client, consultas, limit)
+    fundidos = fundir_rrf(listas)
+    documentos = selecionar_por_orcamento(fundidos, orcamento_tokens)
+    return {
+        "documentos": documentos,
+        "modo": modo,
+        "consultas": [
+            {"etapa": c["etapa"], "nome": c["nome"], "documentos": len(lista)}
+            for c, lista in zip(consultas, listas)
+        ],
+        "candidatos": len(fundidos),
+        "tokens_contexto": limitador.estimar_tokens(*(trecho_documento(d) for d in documentos)),
+        "tempo_ms": (time.perf_counter() - inicio) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        texto_transcricao = f.read()
+
+    for consulta in gerar_consultas(texto_transcricao):
+        print(f"[{consulta['etapa']}] {consulta['nome']}: {len(consulta['texto'])} caracteres")
+
+    if base_conhecimento.ASTRA_DB_API_ENDPOINT and base_conhecimento.OPENAI_API_KEY:
+        cliente = base_conhecimento.AstraDBClient()
+        # Sem cache para medir as idas ao AstraDB
+        base_conhecimento.cache_recuperacao.CACHE_RAG = False
+        t0 = time.perf_counter()
+        simples, _ = base_conhecimento.buscar_conhecimento(cliente, texto_transcricao[:MAX_CARACTERES_GERAL], 5)
+        t1 = time.perf_counter()
+        resultado = recuperar(cliente, texto_transcricao, 5, 1500)
+        print(f"\nConsulta única:  {(t1 - t0) * 1000:.0f} ms, {len(simples)} documentos")
+        print(f"Multiconsulta:   {resultado['tempo_ms']:.0f} ms, {resultado['candidatos']} candidatos, "
+              f"{len(resultado['documentos'])} no contexto (~{resultado['tokens_contexto']} tokens)")
@@ -0,0 +1,321 @@
+"""
+Detector local de sinais conversacionais: perguntas, objeções, compromissos,
+menções a preço e perguntas SPIN.
+
+As frases do léxico são compiladas uma única vez em um autômato Aho-Corasick
+que percorre a transcrição normalizada (sem acentos, minúscula, sem
+pontuação) em uma só passada linear. Cada ocorrência é atribuída ao turno de
+fala que a contém, gerando contagens e posições por falante em milissegundos,
+antes de a análise do LLM terminar, e servindo de conferência para as
+métricas estimadas pelo LLM.
+
+O léxico padrão pode ser substituído por categoria com um JSON
+{"categoria": ["frase", ...]} indicado em SINAIS_LEXICO_PATH.
+
+Uso:
+    python sinais.py <transcricao.txt>   # contagens por falante e tempo de detecção
+"""
+import bisect
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from evidencias import normalizar, normalizar_com_mapa, turnos
+
+LEXICO_PADRAO: Dict[str, List[str]] = {
+    "objecao": [
+        "caro", "muito caro", "fora do orcamento", "sem orcamento", "nao temos orcamento",
+        "nao tenho orcamento", "nao e prioridade", "nao e o momento", "me preocupa", "preocupado",
+        "preocupada", "nao sei se", "ja temos", "ja usamos", "concorrente", "complicado",
+        "nao vejo valor", "nao faz sentido", "vou pensar", "preciso pensar", "receio", "arriscado",
+        "nao convence", "nao tenho certeza", "nao estou convencido",
+    ],
+    "compromisso": [
+        "combinado", "fechado", "fechamos", "vou enviar", "vou mandar", "te mando", "te envio",
+        "vamos agendar", "podemos agendar", "fica acertado", "de acordo", "pode contar",
+        "me comprometo", "vou providenciar", "vou verificar", "vou levar", "vamos seguir",
+        "aprovado", "aprovamos", "vamos fazer", "vou preparar", "ate sexta", "ate segunda",
+    ],
+    "preco": [
+        "preco", "precos", "valor", "custo", "custa", "orcamento", "desconto", "investimento",
+        "proposta comercial", "licenca", "licencas", "mensalidade", "reais", "roi", "retorno",
+        "pagamento", "parcelar",
+    ],
+    "decisao": [
+        "decisor", "quem decide", "diretor", "diretora", "diretoria", "cfo", "ceo", "aprovacao",
+        "aprovar", "comite", "conselho", "juridico", "compras", "patrocinador",
+    ],
+    "spin_situacao": [
+        "como funciona hoje", "como e feito hoje", "atualmente", "hoje voces", "qual o processo",
+        "qual e o processo", "quantas pessoas", "que ferramenta", "qual ferramenta", "quem cuida",
+        "como voces fazem",
+    ],
+    "spin_problema": [
+        "problema", "problemas", "dificuldade", "dificuldades", "desafio", "desafios", "gargalo",
+        "atraso", "atrasos", "insatisfeito", "insatisfeitos", "reclamacao", "reclamacoes",
+        "retrabalho", "o que mais incomoda",
+    ],
+    "spin_implicacao": [
+        "quanto isso custa", "qual o impacto", "qual e o impacto", "o que acontece quando",
+        "o que acontece se", "consequencia", "consequencias", "isso afeta", "isso impacta",
+        "perdemos", "prejuizo", "multa", "multas",
+    ],
+    "spin_necessidade": [
+        "seria util", "ajudaria", "e se voces pudessem", "quanto valeria", "qual seria o valor",
+        "faria diferenca", "se resolvesse", "o ideal seria", "como seria se", "que beneficio",
+    ],
+}
+
+# Inícios de frase que indicam pergunta mesmo sem "?" (transcrições automáticas costumam omitir)
+INICIOS_PERGUNTA = (
+    "como", "qual", "quais", "quando", "onde", "por que", "quanto", "quantos", "quantas", "quem",
+    "o que", "voce pode", "voces podem", "voce poderia", "voces poderiam", "poderia", "sera que",
+    "e se", "tem como",
+)
+
+CATEGORIAS_SPIN = ("spin_situacao", "spin_problema", "spin_implicacao", "spin_necessidade")
+
+# Métricas do LLM conferidas com as contagens locais
+METRICAS_CONFERIDAS = (
+    ("perguntas_feitas", "perguntas", "Perguntas"),
+    ("objeções_levantadas", "objecao", "Objeções"),
+    ("acordos_propostos", "compromisso", "Acordos"),
+)
+
+SEM_FALANTE = "Transcrição"
+
+_RE_FRASE = re.compile(r"[^.!?\n]+[.!?]*")
+
+
+class AutomatoAhoCorasick:
+    """Autômato de múltiplos padrões: encontra todas as frases do léxico em uma passada"""
+
+    def __init__(self, padroes: List[Tuple[str, str]]):
+        # Cada estado: transições, estado de falha e saídas (categoria, padrão)
+        self._transicoes: List[Dict[str, int]] = [{}]
+        self._falha: List[int] = [0]
+        self._saidas: List[List[Tuple[str, str]]] = [[]]
+        for categoria, padrao in padroes:
+            self._inserir(padrao, categoria)
+        self._construir_falhas()
+
+    def _inserir(self, padrao: str, categoria: str):
+        estado = 0
+        for c in padrao:
+            proximo = self._transicoes[estado].get(c)
+            if proximo is None:
+                proximo = len(self._transicoes)
+                self._transicoes.append({})
+                self._falha.append(0)
+                self._saidas.append([])
+                self._transicoes[estado][c] = proximo
+            estado = proximo
+        self._saidas[estado].append((categoria, padrao))
+
+    def _construir_falhas(self):
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for c, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                if estado == 0:
+                    continue
+                falha = self._falha[estado]
+                while falha and c not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                self._falha[proximo] = self._transicoes[falha].get(c, 0)
+                self._saidas[proximo] = self._saidas[proximo] + self._saidas[self._falha[proximo]]
+
+    def buscar(self, texto: str) -> Iterator[Tuple[int, int, str, str]]:
+        """Ocorrências (início, fim, categoria, padrão) em palavras inteiras do texto"""
+        transicoes, falha, saidas = self._transicoes, self._falha, self._saidas
+        estado = 0
+        tamanho = len(texto)
+        for i, c in enumerate(texto):
+            while estado and c not in transicoes[estado]:
+                estado = falha[estado]
+            estado = transicoes[estado].get(c, 0)
+            if saidas[estado] and (i + 1 == tamanho or texto[i + 1] == ' '):
+                for categoria, padrao in saidas[estado]:
+                    inicio = i + 1 - len(padrao)
+                    if inicio == 0 or texto[inicio - 1] == ' ':
+                        yield inicio, i + 1, categoria, padrao
+
+
+def _sem_aninhadas(ocorrencias: List[Tuple[int, int, str, str]]) -> List[Tuple[int, int, str, str]]:
+    """
+    Descarta ocorrências contidas em outra mais longa da mesma categoria
+    ("muito caro" conta uma objeção, não duas), em ordem de início.
+    """
+    resultado = []
+    fim_por_categoria: Dict[str, int] = {}
+    for ocorrencia in sorted(ocorrencias, key=lambda o: (o[0], -o[1])):
+        inicio, fim, categoria, _ = ocorrencia
+        if fim <= fim_por_categoria.get(categoria, -1):
+            continue
+        fim_por_categoria[categoria] = fim
+        resultado.append(ocorrencia)
+    return resultado
+
+
+def carregar_lexico(caminho: Optional[str] = None) -> Dict[str, List[str]]:
+    """Léxico padrão com as categorias do JSON informado substituídas"""
+    lexico = {categoria: list(frases) for categoria, frases in LEXICO_PADRAO.items()}
+    caminho = caminho or os.getenv('SINAIS_LEXICO_PATH')
+    if caminho:
+        with open(caminho, encoding='utf-8') as f:
+            lexico.update(json.load(f))
+    return lexico
+
+
+class DetectorSinais:
+    """Léxico compilado uma vez; `detectar` pode ser chamado por várias sessões"""
+
+    def __init__(self, lexico: Optional[Dict[str, List[str]]] = None):
+        self.lexico = lexico if lexico is not None else carregar_lexico()
+        self.categorias = list(self.lexico)
+        padroes = sorted({(categoria, normalizar(frase)) for categoria, frases in self.lexico.items()
+                          for frase in frases if normalizar(frase)})
+        self._automato = AutomatoAhoCorasick(padroes)
+        self._inicios_pergunta = tuple(f"{normalizar(p)} " for p in INICIOS_PERGUNTA)
+
+    def _eh_pergunta(self, frase: str) -> bool:
+        frase = frase.rstrip()
+        if frase.endswith("?"):
+            return True
+        if frase.endswith((".", "!")):
+            return False
+        # Sem pontuação final: decide pela palavra interrogativa no início
+        return f"{normalizar(frase[:40])} ".startswith(self._inicios_pergunta)
+
+    def detectar(self, transcricao: str) -> Dict:
+        """Contagens e posições dos sinais por falante"""
+        inicio_deteccao = time.perf_counter()
+        lista_turnos = turnos(transcricao) or [
+            {"falante": SEM_FALANTE, "timestamp": None, "inicio": 0, "inicio_fala": 0}
+        ]
+        inicios = [t["inicio"] for t in lista_turnos]
+
+        falantes: Dict[str, Dict[str, int]] = {}
+
+        def contagens(falante: str) -> Dict[str, int]:
+            if falante not in falantes:
+                falantes[falante] = {"turnos": 0, "perguntas": 0, **{c: 0 for c in self.categorias}}
+            return falantes[falante]
+
+        ocorrencias: List[Dict] = []
+        for i, turno in enumerate(lista_turnos):
+            fim = lista_turnos[i + 1]["inicio"] if i + 1 < len(lista_turnos) else len(transcricao)
+            contador = contagens(turno["falante"])
+            contador["turnos"] += 1
+            for match in _RE_FRASE.finditer(transcricao, turno["inicio_fala"], fim):
+                if match.group().strip() and self._eh_pergunta(match.group()):
+                    contador["perguntas"] += 1
+                    ocorrencias.append({
+                        "categoria": "pergunta", "termo": "?", "trecho": match.group().strip(),
+                        "falante": turno["falante"], "timestamp": turno["timestamp"],
+                        "inicio": match.start(), "fim": match.end(),
+                    })
+
+        normalizado, mapa = normalizar_com_mapa(transcricao)
+        for ini_norm, fim_norm, categoria, padrao in _sem_aninhadas(list(self._automato.buscar(normalizado))):
+            inicio = mapa[ini_norm]
+            turno = lista_turnos[max(bisect.bisect_right(inicios, inicio) - 1, 0)]
+            # Ignora o rótulo do falante ("Vendedor (Preço):" não é menção a preço)
+            if inicio < turno["inicio_fala"]:
+                continue
+            fim = mapa[fim_norm - 1] + 1
+            contagens(turno["falante"])[categoria] += 1
+            ocorrencias.append({
+                "categoria": categoria, "termo": padrao, "trecho": transcricao[inicio:fim],
+                "falante": turno["falante"], "timestamp": turno["timestamp"], "inicio": inicio, "fim": fim,
+            })
+
+        ocorrencias.sort(key=lambda o: o["inicio"])
+        return {
+            "falantes": falantes,
+            "ocorrencias": ocorrencias,
+            "tempo_ms": (time.perf_counter() - inicio_deteccao) * 1000,
+        }
+
+
+_detector: Optional[DetectorSinais] = None
+
+
+def obter_detector() -> DetectorSinais:
+    """Detector padrão do processo (léxico compilado na primeira chamada)"""
+    global _detector
+    if _detector is None:
+        _detector = DetectorSinais()
+    return _detector
+
+
+def detectar_sinais(transcricao: str) -> Dict:
+    return obter_detector().detectar(transcricao)
+
+
+def _nome_base(nome: str) -> str:
+    """Nome do falante sem o cargo entre parênteses, normalizado"""
+    return normalizar(re.sub(r"\(.*?\)", "", nome or ""))
+
+
+def falante_correspondente(nome: str, falantes: Dict[str, Dict]) -> Optional[str]:
+    """Falante da transcrição que corresponde ao nome de um participante citado pelo LLM"""
+    alvo = _nome_base(nome)
+    if not alvo:
+        return None
+    for falante in falantes:
+        base = _nome_base(falante)
+        if base == alvo:
+            return falante
+    for falante in falantes:
+        base = _nome_base(falante)
+        if base and (base.startswith(alvo) or alvo.startswith(base) or alvo.split()[0] == base.split()[0]):
+            return falante
+    return None
+
+
+def conferir_metricas(sinais: Dict, participantes: List[Dict]) -> List[Dict]:
+    """
+    Compara as métricas do LLM com as contagens locais por participante. Uma
+    métrica diverge quando a diferença passa de 2 e de metade do maior valor.
+    """
+    linhas = []
+    for participante in participantes:
+        falante = falante_correspondente(participante.get("nome", ""), sinais["falantes"])
+        if falante is None:
+            continue
+        local = sinais["falantes"][falante]
+        linha = {"participante": participante.get("nome", ""), "falante": falante, "divergencias": []}
+        for metrica_llm, categoria, rotulo in METRICAS_CONFERIDAS:
+            valor_llm = participante.get("metricas", {}).get(metrica_llm, 0) or 0
+            valor_local = local.get(categoria, 0)
+            linha[metrica_llm] = (valor_llm, valor_local)
+            diferenca = abs(valor_llm - valor_local)
+            if diferenca > 2 and diferenca > 0.5 * max(valor_llm, valor_local):
+                linha["divergencias"].append(rotulo)
+        linhas.append(linha)
+    return linhas
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1], encoding='utf-8') as f:
+        texto = f.read()
+    inicio_compilacao = time.perf_counter()
+    detector = DetectorSinais()
+    tempo_compilacao = (time.perf_counter() - inicio_compilacao) * 1000
+    resultado = detector.detectar(texto)
+    print(f"Léxico compilado em {tempo_compilacao:.1f} ms; "
+          f"{len(texto):,} caracteres analisados em {resultado['tempo_ms']:.1f} ms "
+          f"({len(resultado['ocorrencias'])} ocorrências)")
+    colunas = ["turnos", "perguntas"] + detector.categorias
+    print(f"{'falante':<30} " + " ".join(f"{c[:12]:>12}" for c in colunas))
+    for nome_falante, contagem in resultado["falantes"].items():
+        print(f"{nome_falante[:30]:<30} " + " ".join(f"{contagem[c]:>12}" for c in colunas))
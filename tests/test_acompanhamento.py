@@ -0,0 +1,30 @@
+import pytest
+
+import acompanhamento
+
+
+@pytest.mark.parametrize("evidencia", [
+    "Já enviei a proposta ontem.",
+    "O contrato foi assinado na terça.",
+    "Os materiais já foram entregues.",
+])
+def test_forma_concluida_marca_concluido(evidencia):
+    item = {"status": "pendente", "evidencia_transcricao": evidencia}
+    assert acompanhamento._novo_status(item) == "concluido"
+
+
+@pytest.mark.parametrize("evidencia", [
+    "A proposta será entregue na sexta.",
+    "O relatório precisa estar finalizado até sexta.",
+    "Entregamos amanhã o piloto.",
+    "A proposta ainda não foi enviada.",
+    "Vamos confirmar se foi aprovado.",
+])
+def test_futuro_ou_obrigacao_mantem_em_aberto(evidencia):
+    item = {"status": "pendente", "evidencia_transcricao": evidencia}
+    assert acompanhamento._novo_status(item) == "em_andamento"
+
+
+def test_status_da_extracao_prevalece():
+    item = {"status": "concluido", "evidencia_transcricao": "Será entregue na sexta."}
+    assert acompanhamento._novo_status(item) == "concluido"
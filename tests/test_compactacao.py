@@ -0,0 +1,45 @@
+import pytest
+
+import compactacao
+
+
+def _fala(transcricao):
+    return compactacao.compactar(transcricao).texto.split(": ", 1)[1]
+
+
+def test_negacao_repetida_nao_e_colapsada():
+    assert _fala("Cliente: Não não, muito muito caro.") == "Não não, muito caro."
+    assert _fala("Cliente: nunca nunca fechamos") == "nunca nunca fechamos"
+
+
+def test_repeticao_com_pontuacao_e_mantida():
+    assert _fala("Cliente: Caro, caro demais.") == "Caro, caro demais."
+    assert _fala("Vendedor: eu eu vou mandar.") == "eu vou mandar."
+
+
+@pytest.mark.parametrize("transcricao, esperado", [
+    ("Cliente: Qual o tipo, exatamente, de contrato?", "Qual o tipo, exatamente, de contrato?"),
+    ("Cliente: Tipo de contrato anual.", "Tipo de contrato anual."),
+    ("Vendedor: É, tipo, a gente faz assim.", "É, a gente faz assim."),
+    ("Vendedor: Tipo assim, eu vou mandar.", "eu vou mandar."),
+])
+def test_tipo_so_e_muleta_abrindo_a_oracao(transcricao, esperado):
+    assert _fala(transcricao) == esperado
+
+
+def test_mapa_aponta_para_os_caracteres_originais():
+    transcricao = (
+        "[00:01] VENDEDOR: Bom dia, né, tudo bem?\n"
+        "[00:05] Cliente: Não não, muito muito caro.\n"
+        "[00:09] Cliente: Qual o tipo, exatamente, de contrato?\n"
+    )
+    compacta = compactacao.compactar(transcricao)
+    assert len(compacta.mapa) == len(compacta.texto)
+    for linha in compacta.texto.split("\n"):
+        inicio = compacta.texto.index(linha) + linha.index(": ") + 2
+        for i in range(inicio, inicio + len(linha) - linha.index(": ") - 2):
+            if compacta.texto[i] != " ":
+                assert transcricao[compacta.mapa[i]] == compacta.texto[i]
+    # A citação no texto compactado é localizada no original
+    inicio = compacta.texto.index("muito caro")
+    assert transcricao[compacta.mapa[inicio]:].startswith("muito")
@@ -0,0 +1,41 @@
+import evidencias
+
+TRANSCRICAO = (
+    "[00:01] Vendedor: Assim fica melhor para vocês?\n"
+    "[00:05] Cliente: Prefiro pagar à vista, com desconto.\n"
+    "[00:09] Vendedor: Sim, fechado.\n"
+)
+
+
+def test_exata_casa_so_palavras_inteiras():
+    indice = evidencias.IndiceTranscricao(TRANSCRICAO)
+    sim = indice.localizar("sim")
+    assert sim["status"] == "exata"
+    assert TRANSCRICAO[sim["inicio"]:sim["fim"]] == "Sim"
+    assert sim["falante"] == "Vendedor" and sim["timestamp"] == "00:09"
+    assert indice.localizar("ista")["status"] == "nao_encontrada"
+
+
+def test_negacao_inserida_na_citacao_e_divergente():
+    indice = evidencias.IndiceTranscricao(TRANSCRICAO)
+    resultado = indice.localizar("Prefiro não pagar à vista")
+    assert resultado["status"] == "divergente"
+    assert resultado["ausentes"] == ["nao"]
+    assert resultado["trecho"] == "Prefiro pagar à vista"
+
+
+def test_aproximada_lista_palavras_ausentes():
+    indice = evidencias.IndiceTranscricao(TRANSCRICAO)
+    resultado = indice.localizar("Prefiro pagar à vista com um desconto")
+    assert resultado["status"] == "aproximada"
+    assert resultado["ausentes"] == ["um"]
+
+
+def test_resumo_conta_divergentes():
+    outputs = {"tasks": [
+        {"evidencia_transcricao": "Sim, fechado"},
+        {"evidencia_transcricao": "Prefiro não pagar à vista"},
+        {"evidencia_transcricao": ""},
+    ]}
+    resumo = evidencias.verificar_evidencias(outputs, TRANSCRICAO)
+    assert resumo == {"exata": 1, "aproximada": 0, "divergente": 1, "nao_encontrada": 0, "sem_evidencia": 1}
@@ -0,0 +1,35 @@
+import pytest
+
+import exportacao
+
+# Saída do LLM com nulls e tipos fora do esquema
+RESULTADOS_IRREGULARES = {
+    "analise_principal": "## Resumo\n- ponto",
+    "outputs_json": {
+        "analise_quantitativa": {
+            "participantes": [
+                {"nome": "Ana", "papel": None, "metricas": None},
+                {"nome": "Bruno", "papel": "cliente", "metricas": {"tempo_fala_segundos": 120, "perguntas_feitas": None}},
+            ],
+            "estatisticas_gerais": {"duracao_total_segundos": "1800", "total_falas": None},
+        },
+        "tasks": [{"descricao": "Enviar proposta", "responsavel": {"nome": "Ana", "cargo": "AE"}, "prazo": None}],
+        "entregaveis": [{"nome": "Proposta", "responsavel_entrega": {"nome": "Ana", "cargo": "AE"}, "prazo": None}],
+        "acordos_combinados": None,
+        "proximos_passos": {"acoes_imediatas": None, "objetivos_proxima_reuniao": ["Fechar escopo"]},
+    },
+}
+
+
+@pytest.mark.parametrize("formato", sorted(exportacao.FORMATOS))
+def test_exporta_saida_irregular_do_llm(formato):
+    arquivo = exportacao.gerador(formato, RESULTADOS_IRREGULARES, "Vendedor: Olá\nCliente: Oi")()
+    assert arquivo.read()
+
+
+def test_celula_normaliza_pessoas_listas_e_nulls():
+    assert exportacao._celula(None) == ""
+    assert exportacao._celula({"nome": "Ana", "cargo": "AE"}) == "Ana - AE"
+    assert exportacao._celula(["a", None, "b"]) == "a, b"
+    assert exportacao._valor_planilha(3) == 3
+    assert exportacao._valor_planilha(None) == ""
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+
+import base_conhecimento
+import gravacao
+import provedores
+
+PERFIL = {"id": "teste", "modelo": "stub", "max_output_tokens": 100}
+
+
+class _ClienteOpenAI:
+    """Cliente falso: responde quando `resposta` é dada, senão falha como se fosse à rede"""
+
+    def __init__(self, resposta=None):
+        self.chamadas = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._criar))
+        self._resposta = resposta
+
+    def _criar(self, **parametros):
+        self.chamadas += 1
+        if self._resposta is None:
+            raise AssertionError("chamada de rede durante a reprodução")
+        return self._resposta
+
+
+def _provedor_openai(cliente) -> provedores.ProvedorOpenAI:
+    provedor = provedores.ProvedorOpenAI.__new__(provedores.ProvedorOpenAI)
+    provedor.modelo = "gpt-teste"
+    provedor._client = cliente
+    return provedor
+
+
+@pytest.fixture
+def cassete(tmp_path, monkeypatch):
+    for chave, valor in gravacao._config.items():
+        monkeypatch.setitem(gravacao._config, chave, valor)
+    caminho = str(tmp_path / "cassete.jsonl")
+    yield caminho
+    gravacao.configurar(modo="desligado")
+
+
+def test_openai_gravado_e_reproduzido_sem_rede(cassete):
+    resposta = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="resposta gravada"))],
+        usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15, prompt_tokens_details=None),
+    )
+    gravacao.configurar(modo="gravar", caminho=cassete)
+    gravado = _provedor_openai(_ClienteOpenAI(resposta)).gerar("sistema", "prompt", PERFIL, "analise")
+
+    gravacao.configurar(modo="reproduzir", caminho=cassete)
+    cliente = _ClienteOpenAI()
+    reproduzido = _provedor_openai(cliente).gerar("sistema", "prompt", PERFIL, "analise")
+    assert reproduzido == gravado and reproduzido["texto"] == "resposta gravada"
+    assert cliente.chamadas == 0
+
+
+def test_falta_no_cassete_nao_vai_a_rede_nem_abre_o_circuito(cassete):
+    gravacao.configurar(modo="reproduzir", caminho=cassete)
+    cliente = _ClienteOpenAI()
+    roteador = provedores.RoteadorLLM([_provedor_openai(cliente)], hedge=False)
+    with pytest.raises(provedores.ErroProvedores):
+        roteador.gerar("sistema", "prompt", PERFIL, "analise")
+    assert cliente.chamadas == 0
+    assert roteador.disjuntores["openai"].falhas_consecutivas == 0
+
+
+def test_gravacao_nao_usa_o_cache_semantico(cassete):
+    buscas = []
+
+    class Astra:
+        def vector_search(self, colecao, embedding, limit):
+            buscas.append(embedding)
+            return [{"_id": "doc"}]
+
+    gravacao.configurar(modo="gravar", caminho=cassete)
+    vetor = [0.1] * 8
+    base_conhecimento.buscar_por_vetor(Astra(), vetor, 3)
+    base_conhecimento.buscar_por_vetor(Astra(), vetor, 3)
+    # As duas buscas chegam ao AstraDB e ao cassete, como numa reprodução sem o cache
+    assert len(buscas) == 2
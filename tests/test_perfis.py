@@ -0,0 +1,11 @@
+import perfis
+
+
+def test_modelos_que_raciocinam_ficam_sem_limite_de_saida():
+    assert perfis.configuracao_geracao(perfis.PERFIS["equilibrado"]) == {}
+    assert perfis.configuracao_geracao(perfis.PERFIS["completo"]) == {}
+
+
+def test_modelo_sem_raciocinio_usa_o_limite_do_perfil():
+    rapido = perfis.PERFIS["rapido"]
+    assert perfis.configuracao_geracao(rapido) == {"max_output_tokens": rapido["max_output_tokens"]}
@@ -0,0 +1,172 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import limitador
+import provedores
+
+PERFIL = {"id": "teste", "modelo": "stub", "max_output_tokens": 100}
+
+
+def _limitador_lento(monkeypatch, nome: str) -> limitador.LimitadorProvedor:
+    """Limitador de 60 rpm sem rajada: cada chamada depois da primeira espera ~1s na fila"""
+    lento = limitador.LimitadorProvedor(nome, rpm=60)
+    lento._requisicoes = limitador.BaldeTokens(60, rajada_segundos=1 / 60)
+    monkeypatch.setitem(limitador._limitadores, nome, lento)
+    return lento
+
+
+def test_espera_na_fila_nao_e_latencia_nem_falha(monkeypatch):
+    _limitador_lento(monkeypatch, "fila").adquirir()
+    stub = provedores.ProvedorStub("fila", latencia=lambda: 0.05, texto="ok", timeout=0.5, limitar=True)
+    roteador = provedores.RoteadorLLM([stub], hedge=False)
+
+    # ~1s na fila, além do timeout de 0,5s do provedor: erro da fila, não do provedor
+    with pytest.raises(provedores.ErroProvedores, match="fila: fila"):
+        roteador.gerar("s", "p", PERFIL, "analise")
+    assert roteador.disjuntores["fila"].falhas_consecutivas == 0
+
+    stub.timeout = 3.0
+    resposta = roteador.gerar("s", "p", PERFIL, "analise")
+    assert resposta["latencia"] < 0.5
+
+
+def test_chamada_abandonada_na_fila_nao_chega_ao_provedor(monkeypatch):
+    _limitador_lento(monkeypatch, "reserva").adquirir()
+    chamadas = []
+    primario = provedores.ProvedorStub("primario", latencia=lambda: 0.3, texto="ok", prazo_hedge_padrao=0.1)
+    reserva = provedores.ProvedorStub("reserva", latencia=lambda: chamadas.append(1) or 0.01, texto="ok",
+                                      limitar=True)
+    roteador = provedores.RoteadorLLM([primario, reserva])
+
+    resposta = roteador.gerar("s", "p", PERFIL, "analise")
+    assert resposta["provedor"] == "primario" and resposta["roteamento"]["hedge"]
+    time.sleep(1.5)
+    assert chamadas == []
+    assert roteador.estatisticas()["em_execucao"]["reserva"] == 0
+
+
+def test_limitador_repete_erros_5xx(monkeypatch):
+    monkeypatch.setitem(limitador._limitadores, "instavel", limitador.LimitadorProvedor("instavel", rpm=6000))
+    monkeypatch.setattr(limitador.time, "sleep", lambda segundos: None)
+
+    class Erro503(Exception):
+        status_code = 503
+
+    respostas = iter([Erro503(), Erro503(), "ok"])
+
+    def executar():
+        resposta = next(respostas)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    assert limitador.chamar_com_limite("instavel", 0, executar) == "ok"
+
+    def erro_do_cliente():
+        raise ValueError("400")
+
+    with pytest.raises(ValueError):
+        limitador.chamar_com_limite("instavel", 0, erro_do_cliente)
+
+
+def test_meio_aberto_admite_uma_unica_sonda():
+    disjuntor = provedores.CircuitBreaker(falhas_para_abrir=1, segundos_aberto=0)
+    disjuntor.falha()
+    assert disjuntor.estado == "meio_aberto"
+    assert disjuntor.reservar() == "sonda"
+    assert disjuntor.reservar() is None
+    assert not disjuntor.permite()
+
+    # A sonda que não chegou ao provedor devolve a vez
+    disjuntor.liberar("sonda")
+    assert disjuntor.reservar() == "sonda"
+    disjuntor.sucesso()
+    assert disjuntor.estado == "fechado"
+    assert disjuntor.reservar() == disjuntor.reservar() == "fechado"
+
+
+def test_meio_aberto_nao_recebe_rajada_do_roteador():
+    chamadas = []
+    instavel = provedores.ProvedorStub("instavel", latencia=lambda: chamadas.append(1) or 0.3, texto="ok")
+    reserva = provedores.ProvedorStub("reserva", latencia=lambda: 0.01, texto="ok")
+    roteador = provedores.RoteadorLLM([instavel, reserva], hedge=False)
+    roteador.disjuntores["instavel"] = provedores.CircuitBreaker(falhas_para_abrir=1, segundos_aberto=0)
+    roteador.disjuntores["instavel"].falha()
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        respostas = list(executor.map(lambda _: roteador.gerar("s", "p", PERFIL, "analise"), range(5)))
+    assert len(chamadas) == 1
+    assert sorted(r["provedor"] for r in respostas).count("instavel") == 1
+
+
+def test_failover_apos_erro():
+    falho = provedores.ProvedorStub("falho", taxa_falha=1.0, texto="ok")
+    reserva = provedores.ProvedorStub("reserva", latencia=lambda: 0.01, texto="ok")
+    roteador = provedores.RoteadorLLM([falho, reserva], hedge=False)
+    resposta = roteador.gerar("s", "p", PERFIL, "analise")
+    assert resposta["provedor"] == "reserva"
+    assert resposta["roteamento"]["failover"]
+    assert [t["status"] for t in resposta["roteamento"]["tentativas"]] == ["erro", "ok"]
+    assert roteador.disjuntores["falho"].falhas_consecutivas == 1
+
+
+def test_failover_apos_timeout():
+    lento = provedores.ProvedorStub("lento", latencia=lambda: 1.0, texto="ok", timeout=0.2)
+    reserva = provedores.ProvedorStub("reserva", latencia=lambda: 0.01, texto="ok")
+    roteador = provedores.RoteadorLLM([lento, reserva], hedge=False)
+    inicio = time.monotonic()
+    resposta = roteador.gerar("s", "p", PERFIL, "analise")
+    assert resposta["provedor"] == "reserva"
+    assert time.monotonic() - inicio < 0.8
+    assert [t["status"] for t in resposta["roteamento"]["tentativas"]] == ["timeout", "ok"]
+    assert roteador.disjuntores["lento"].falhas_consecutivas == 1
+
+
+def test_hedge_dispara_no_prazo():
+    lento = provedores.ProvedorStub("lento", latencia=lambda: 0.6, texto="ok", prazo_hedge_padrao=0.1)
+    rapido = provedores.ProvedorStub("rapido", latencia=lambda: 0.01, texto="ok")
+    roteador = provedores.RoteadorLLM([lento, rapido])
+    inicio = time.monotonic()
+    resposta = roteador.gerar("s", "p", PERFIL, "analise")
+    total = time.monotonic() - inicio
+    assert resposta["provedor"] == "rapido" and resposta["roteamento"]["hedge"]
+    assert 0.1 <= total < 0.5
+    assert {t["motivo"]: t["status"] for t in resposta["roteamento"]["tentativas"]} == {
+        "hedge": "ok", "primario": "descartado",
+    }
+
+    # Sem atraso do primário, o hedge não sai
+    lento.latencia = lambda: 0.01
+    resposta = roteador.gerar("s", "p", PERFIL, "analise")
+    assert resposta["provedor"] == "lento" and not resposta["roteamento"]["hedge"]
+
+
+def test_sem_capacidade_quando_as_vagas_estao_presas():
+    preso = provedores.ProvedorStub("preso", latencia=lambda: 0.8, texto="ok", timeout=0.1)
+    roteador = provedores.RoteadorLLM([preso], hedge=False, max_workers=1)
+    # A primeira chamada expira e é abandonada, mas segue ocupando a única vaga
+    with pytest.raises(provedores.ErroProvedores, match="timeout"):
+        roteador.gerar("s", "p", PERFIL, "analise")
+    assert roteador.estatisticas()["em_execucao"]["preso"] == 1
+
+    with pytest.raises(provedores.ErroProvedores, match="preso: sem_capacidade"):
+        roteador.gerar("s", "p", PERFIL, "analise")
+    assert roteador.rejeitadas == 1
+
+    time.sleep(0.8)
+    assert roteador.estatisticas()["em_execucao"]["preso"] == 0
+
+
+def test_provedor_lotado_e_pulado_no_failover():
+    preso = provedores.ProvedorStub("preso", latencia=lambda: 0.8, texto="ok", timeout=0.1)
+    reserva = provedores.ProvedorStub("reserva", latencia=lambda: 0.01, texto="ok")
+    roteador = provedores.RoteadorLLM([preso, reserva], hedge=False, max_workers=1)
+    assert roteador.gerar("s", "p", PERFIL, "analise")["provedor"] == "reserva"
+    # A vaga do provedor lento continua presa: a próxima vai direto para a reserva
+    resposta = roteador.gerar("s", "p", PERFIL, "analise")
+    assert resposta["provedor"] == "reserva"
+    assert resposta["roteamento"]["tentativas"] == [
+        {"provedor": "reserva", "motivo": "primario", "status": "ok", "latencia": resposta["latencia"]},
+    ]
@@ -0,0 +1,20 @@
+import sinais
+
+
+def test_frase_aninhada_conta_uma_vez():
+    resultado = sinais.detectar_sinais("Cliente: Achei muito caro.")
+    assert resultado["falantes"]["Cliente"]["objecao"] == 1
+    objecoes = [o for o in resultado["ocorrencias"] if o["categoria"] == "objecao"]
+    assert [o["termo"] for o in objecoes] == ["muito caro"]
+
+
+def test_frases_separadas_contam_individualmente():
+    resultado = sinais.detectar_sinais("Cliente: Está caro. E também não é prioridade agora.")
+    assert resultado["falantes"]["Cliente"]["objecao"] == 2
+
+
+def test_aninhada_em_outra_categoria_e_mantida():
+    detector = sinais.DetectorSinais({"objecao": ["sem orcamento"], "preco": ["orcamento"]})
+    resultado = detector.detectar("Cliente: Estamos sem orçamento.")
+    assert resultado["falantes"]["Cliente"]["objecao"] == 1
+    assert resultado["falantes"]["Cliente"]["preco"] == 1